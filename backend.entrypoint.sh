@@ -14,7 +14,14 @@ echo "PostgreSQL ist bereit - fahre fort..."
 
 if [ "$RUN" = "worker" ]; then
     echo "🎯 Starting RQ Worker..."
-    exec python manage.py rqworker default
+    # --with-scheduler: failed pipeline stages are retried with an interval
+    # (Retry(interval=...)), which only a scheduler puts back on the queue.
+    exec python manage.py rqworker default hls_background --with-scheduler
+elif [ "$RUN" = "email_worker" ]; then
+    # SimpleWorker runs jobs in-process, so the SMTP connection is reused across emails.
+    # --with-scheduler puts failed sends back on the queue after EMAIL_RETRY_INTERVALS.
+    echo "✉️ Starting RQ Email Worker..."
+    exec python manage.py rqworker email --worker-class rq.worker.SimpleWorker --with-scheduler
 else
     echo "📦 Running migrations for backend..."
     python manage.py collectstatic --noinput
@@ -41,12 +48,21 @@ else:
     print(f"Superuser '{username}' already exists.")
 EOF
 
+    if [ "$WEB_SERVER" = "uvicorn" ]; then
+        echo "🚀 Starting Uvicorn (ASGI) Server..."
+        exec uvicorn core.asgi:application \
+            --host 0.0.0.0 \
+            --port 8000 \
+            --workers "${WEB_WORKERS:-3}" \
+            --log-level debug
+    fi
+
     echo "🚀 Starting Gunicorn Server..."
     # exec gunicorn core.wsgi:application --bind 0.0.0.0:8000
 
     exec gunicorn core.wsgi:application \
         --bind 0.0.0.0:8000 \
-        --workers 3 \
+        --workers "${WEB_WORKERS:-3}" \
         --log-level debug \
         --timeout 120
     
@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Small thread-safe per-process LRU cache.
+    Bounded by the number of entries and, if `sizeof` is given, by the total
+    size of the cached values.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_size: int | None = None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda value: 0)
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if self.max_size is not None and size > self.max_size:
+            return
+        with self._lock:
+            if key in self._data:
+                self.size -= self.sizeof(self._data.pop(key))
+            self._data[key] = value
+            self.size += size
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_size is not None and self.size > self.max_size)
+            ):
+                _, evicted = self._data.popitem(last=False)
+                self.size -= self.sizeof(evicted)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self.size -= self.sizeof(self._data.pop(key))
+
+    def delete_where(self, predicate):
+        """Remove every entry whose key matches `predicate`."""
+
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self.size -= self.sizeof(self._data.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
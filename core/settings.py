@@ -145,8 +145,131 @@ RQ_QUEUES = {
         'DEFAULT_TIMEOUT': 900,
         'REDIS_CLIENT_KWARGS': {},
     },
+    'email': {
+        'HOST': REDIS_HOST,
+        'PORT': REDIS_PORT,
+        'DB': REDIS_DB,
+        'DEFAULT_TIMEOUT': 120,
+        'REDIS_CLIENT_KWARGS': {},
+    },
+    # Background re-encodes; workers only take these when "default" is empty.
+    'hls_background': {
+        'HOST': REDIS_HOST,
+        'PORT': REDIS_PORT,
+        'DB': REDIS_DB,
+        'DEFAULT_TIMEOUT': 7200,
+        'REDIS_CLIENT_KWARGS': {},
+    },
 }
 
+# HLS pipeline
+# "single_pass" decodes the source once and encodes all renditions in one
+# ffmpeg process, "per_rendition" runs one ffmpeg process per rendition and
+# "chunked" splits sources longer than HLS_CHUNK_MIN_DURATION seconds at
+# keyframes into HLS_CHUNK_COUNT time ranges that are encoded independently.
+HLS_ENCODE_MODE = os.getenv("HLS_ENCODE_MODE", "single_pass")
+HLS_CHUNK_COUNT = int(os.getenv("HLS_CHUNK_COUNT", 0)) or os.cpu_count()
+HLS_CHUNK_MIN_DURATION = int(os.getenv("HLS_CHUNK_MIN_DURATION", 600))
+# Renditions, trailer and thumbnail run concurrently on up to this many
+# threads (one ffmpeg process each). Defaults to the CPU count, 1 disables it.
+HLS_MAX_PARALLEL_JOBS = int(os.getenv("HLS_MAX_PARALLEL_JOBS", 0)) or os.cpu_count()
+# Publish the lowest rendition as soon as it is encoded and add the higher
+# ones to the master playlist as they finish.
+HLS_PROGRESSIVE_PUBLISH = os.getenv("HLS_PROGRESSIVE_PUBLISH", "False").lower() in ("1", "true", "yes")
+# Split each upload into per-rendition/trailer/thumbnail RQ jobs plus a
+# finalize job, so several workers can share the work of one upload.
+HLS_PIPELINE_FANOUT = os.getenv("HLS_PIPELINE_FANOUT", "False").lower() in ("1", "true", "yes")
+HLS_QUEUE = os.getenv("HLS_QUEUE", "default")
+HLS_JOB_TIMEOUT = int(os.getenv("HLS_JOB_TIMEOUT", 3600))
+HLS_JOB_RETRIES = int(os.getenv("HLS_JOB_RETRIES", 2))
+# Encoding profile of new uploads ("fast-publish" or "archive", see
+# videoflix_app.tasks.ENCODING_PROFILES) and the queue per profile
+# ("profile=queue,..."), e.g. archive re-encodes on the background queue.
+HLS_ENCODING_PROFILE = os.getenv("HLS_ENCODING_PROFILE", "fast-publish")
+HLS_PROFILE_QUEUES = dict(
+    item.split("=", 1) for item in os.getenv("HLS_PROFILE_QUEUES", "archive=hls_background").split(",") if "=" in item
+)
+# Segment container of new encodes: "ts", "fmp4" (CMAF, init.mp4 + .m4s) or
+# "fmp4-single" (CMAF, one byte-range addressed .m4s per rendition).
+HLS_SEGMENT_FORMAT = os.getenv("HLS_SEGMENT_FORMAT", "ts")
+# Seek preview sprite sheets (hls/<id>/sprites/ + thumbnails.vtt): one
+# thumbnail of HLS_SPRITE_WIDTH px every HLS_SPRITE_INTERVAL seconds, tiled
+# "<columns>x<rows>" per sheet, sheets stored as "webp" or "jpg".
+HLS_SPRITES = os.getenv("HLS_SPRITES", "True").lower() in ("1", "true", "yes")
+HLS_SPRITE_INTERVAL = float(os.getenv("HLS_SPRITE_INTERVAL", 10))
+HLS_SPRITE_WIDTH = int(os.getenv("HLS_SPRITE_WIDTH", 160))
+HLS_SPRITE_GRID = os.getenv("HLS_SPRITE_GRID", "10x10")
+HLS_SPRITE_FORMAT = os.getenv("HLS_SPRITE_FORMAT", "webp")
+# Catalog thumbnail variants generated by the pipeline (widths in px, formats
+# in order of preference; formats Pillow cannot write are skipped), and the
+# disk cache of on-demand resizes (MEDIA_ROOT/cache/thumbnails) with the width
+# step requested sizes are rounded up to.
+THUMBNAIL_WIDTHS = [int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "320,640,1280").split(",") if w.strip()]
+THUMBNAIL_FORMATS = [f.strip() for f in os.getenv("THUMBNAIL_FORMATS", "avif,webp").split(",") if f.strip()]
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+THUMBNAIL_RESIZE_STEP = int(os.getenv("THUMBNAIL_RESIZE_STEP", 40))
+# Seconds between progress updates of a running TranscodeJob.
+HLS_PROGRESS_INTERVAL = float(os.getenv("HLS_PROGRESS_INTERVAL", 5))
+# ffmpeg processes: max. runtime in seconds (0 = unlimited), seconds between
+# SIGTERM and SIGKILL, niceness, CPU list (e.g. "2-7", empty = all) and how
+# much of the log is kept for error reports.
+HLS_FFMPEG_TIMEOUT = int(os.getenv("HLS_FFMPEG_TIMEOUT", 0))
+HLS_FFMPEG_KILL_GRACE = int(os.getenv("HLS_FFMPEG_KILL_GRACE", 10))
+HLS_FFMPEG_NICE = int(os.getenv("HLS_FFMPEG_NICE", 10))
+HLS_FFMPEG_CPUS = os.getenv("HLS_FFMPEG_CPUS", "")
+HLS_FFMPEG_LOG_BYTES = int(os.getenv("HLS_FFMPEG_LOG_BYTES", 64 * 1024))
+# Bearer token for the Prometheus endpoint /api/video/metrics/ (disabled if empty).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Days finished TranscodeJob rows are kept before prune_transcode_jobs folds
+# them into the per-stage metric totals.
+TRANSCODE_JOB_RETENTION_DAYS = int(os.getenv("TRANSCODE_JOB_RETENTION_DAYS", 30))
+# Choose renditions per source: no upscaling, more bits for > 30 fps and
+# HLS_STATIC_BITRATE_FACTOR of the bits for sources with fewer than
+# HLS_STATIC_BPP bits per pixel (slides, screen recordings).
+HLS_ADAPTIVE_LADDER = os.getenv("HLS_ADAPTIVE_LADDER", "True").lower() in ("1", "true", "yes")
+HLS_STATIC_BPP = float(os.getenv("HLS_STATIC_BPP", 0.03))
+HLS_STATIC_BITRATE_FACTOR = float(os.getenv("HLS_STATIC_BITRATE_FACTOR", 0.6))
+
+# Re-uploads of a source that is already encoded (same SHA-256) hardlink the
+# existing HLS output instead of encoding it again.
+HLS_DEDUPLICATE_SOURCES = os.getenv("HLS_DEDUPLICATE_SOURCES", "True").lower() in ("1", "true", "yes")
+# Media playlists are cached per process (bounded LRU, revalidated by file
+# mtime) and optionally in the shared Redis cache; clients revalidate via ETag.
+HLS_PLAYLIST_CACHE = os.getenv("HLS_PLAYLIST_CACHE", "True").lower() in ("1", "true", "yes")
+HLS_PLAYLIST_CACHE_BYTES = int(os.getenv("HLS_PLAYLIST_CACHE_BYTES", 8 * 1024 * 1024))
+HLS_PLAYLIST_SHARED_CACHE = os.getenv("HLS_PLAYLIST_SHARED_CACHE", "False").lower() in ("1", "true", "yes")
+HLS_PLAYLIST_MAX_AGE = int(os.getenv("HLS_PLAYLIST_MAX_AGE", 60))
+# Who sends playlist/segment bytes after auth: "django" streams them from the
+# worker, "x-accel" (nginx) and "x-sendfile" hand the transfer to the proxy.
+HLS_DELIVERY_BACKEND = os.getenv("HLS_DELIVERY_BACKEND", "django")
+HLS_ACCEL_REDIRECT_PREFIX = os.getenv("HLS_ACCEL_REDIRECT_PREFIX", "/protected-media/")
+# Rewrite media playlists so each segment URI carries an HMAC signature bound
+# to user, video, rendition and expiry; segment requests are then verified by
+# that signature alone. The key defaults to SECRET_KEY.
+HLS_SIGNED_SEGMENTS = os.getenv("HLS_SIGNED_SEGMENTS", "False").lower() in ("1", "true", "yes")
+HLS_SIGNING_KEY = os.getenv("HLS_SIGNING_KEY", "")
+HLS_SIGNED_URL_TTL = int(os.getenv("HLS_SIGNED_URL_TTL", 3600))
+# Route the HLS endpoints to async views; use together with WEB_SERVER=uvicorn.
+HLS_ASYNC_VIEWS = os.getenv("HLS_ASYNC_VIEWS", "False").lower() in ("1", "true", "yes")
+HLS_ASYNC_CHUNK_SIZE = int(os.getenv("HLS_ASYNC_CHUNK_SIZE", 64 * 1024))
+
+# Video catalog: keyset pages on (created_at, id) when ?limit=/?cursor= is
+# given (always with VIDEO_CATALOG_PAGINATE), responses cached in Redis.
+VIDEO_CATALOG_PAGINATE = os.getenv("VIDEO_CATALOG_PAGINATE", "False").lower() in ("1", "true", "yes")
+VIDEO_CATALOG_PAGE_SIZE = int(os.getenv("VIDEO_CATALOG_PAGE_SIZE", 50))
+VIDEO_CATALOG_MAX_PAGE_SIZE = int(os.getenv("VIDEO_CATALOG_MAX_PAGE_SIZE", 200))
+VIDEO_CATALOG_CACHE = os.getenv("VIDEO_CATALOG_CACHE", "True").lower() in ("1", "true", "yes")
+VIDEO_CATALOG_CACHE_TIMEOUT = int(os.getenv("VIDEO_CATALOG_CACHE_TIMEOUT", 300))
+VIDEO_BROWSE_ROW_SIZE = int(os.getenv("VIDEO_BROWSE_ROW_SIZE", 10))
+# Text search configuration of the PostgreSQL search index ("simple" does no
+# stemming and works for mixed-language titles, e.g. "german" or "english").
+VIDEO_SEARCH_CONFIG = os.getenv("VIDEO_SEARCH_CONFIG", "simple")
+VIDEO_SEARCH_MAX_RESULTS = int(os.getenv("VIDEO_SEARCH_MAX_RESULTS", 50))
+
+# Resumable uploads (/api/video/uploads/): max. declared file size in bytes.
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", 50 * 1024 ** 3))
+UPLOAD_READ_BLOCK_SIZE = 1024 * 1024
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -208,6 +331,11 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True") == "True"
 EMAIL_USE_SSL = os.getenv("EMAIL_USE_SSL", "False") == "True"
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", EMAIL_HOST_USER)
+# Activation and password reset emails are sent by the "email" RQ worker;
+# without Redis they fall back to being sent within the request.
+EMAIL_ASYNC = os.getenv("EMAIL_ASYNC", "True").lower() in ("1", "true", "yes")
+EMAIL_QUEUE = os.getenv("EMAIL_QUEUE", "email")
+EMAIL_RETRY_INTERVALS = [10, 60, 300]
 EMAIL_LOGO_URL = os.getenv(
     "EMAIL_LOGO_URL",
     "https://videoflix.developer-anja-schwab.de/assets/img/logo.png"  
@@ -229,6 +357,14 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# Users resolved from access tokens are cached for AUTH_USER_CACHE_TTL
+# seconds per process and, optionally, in Redis until the token expires.
+# AUTH_STATELESS_MEDIA trusts the token claims on the HLS endpoints only.
+AUTH_USER_CACHE = os.getenv("AUTH_USER_CACHE", "True").lower() in ("1", "true", "yes")
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", 30))
+AUTH_USER_SHARED_CACHE = os.getenv("AUTH_USER_SHARED_CACHE", "False").lower() in ("1", "true", "yes")
+AUTH_STATELESS_MEDIA = os.getenv("AUTH_STATELESS_MEDIA", "False").lower() in ("1", "true", "yes")
+
 
 LOGGING = {
     "version": 1,
@@ -1,13 +1,17 @@
+from django.conf import settings
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
 from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
+from .cache import aget_cached_user, get_cached_user
 
 User = get_user_model()
 
 class CookieJWTAuthentication(BaseAuthentication):
     """
     Custom authentication class that authenticates users. Using a JWT stored in an HTTP cookie.
+    Users are resolved through the user cache (see user_auth_app.cache).
     """
     def authenticate(self, request):
         token = request.COOKIES.get("access_token")
@@ -15,9 +19,49 @@ class CookieJWTAuthentication(BaseAuthentication):
             return None
         try:
             access = AccessToken(token)
-            user = User.objects.get(id=access["user_id"])
+            user = self.get_user(access)
+            if not user.is_active:
+                raise AuthenticationFailed("User is inactive")
             return (user, None)
         except Exception:
             raise AuthenticationFailed("Invalid or expired token")
 
+    async def aauthenticate(self, request):
+        """
+        Async variant of authenticate() for plain Django async views.
+        """
+        token = request.COOKIES.get("access_token")
+        if not token:
+            return None
+        try:
+            access = AccessToken(token)
+            user = await self.aget_user(access)
+            if not user.is_active:
+                raise AuthenticationFailed("User is inactive")
+            return (user, None)
+        except Exception:
+            raise AuthenticationFailed("Invalid or expired token")
+
+    def get_user(self, access):
+        return get_cached_user(access["user_id"], access["exp"])
+
+    async def aget_user(self, access):
+        return await aget_cached_user(access["user_id"], access["exp"])
+
+
+class MediaCookieJWTAuthentication(CookieJWTAuthentication):
+    """
+    Authentication for the HLS media endpoints.
+    With AUTH_STATELESS_MEDIA the signed token claims are trusted as they are
+    (simplejwt TokenUser, no user lookup at all); a logout or deactivation
+    then only takes effect for media once the access token expires.
+    """
+    def get_user(self, access):
+        if getattr(settings, "AUTH_STATELESS_MEDIA", False):
+            return TokenUser(access)
+        return super().get_user(access)
 
+    async def aget_user(self, access):
+        if getattr(settings, "AUTH_STATELESS_MEDIA", False):
+            return TokenUser(access)
+        return await super().aget_user(access)
@@ -0,0 +1,87 @@
+import copy
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from core.cache import LRUCache
+
+User = get_user_model()
+
+# str(user id) -> (user, expires_at); token claims carry the id as a string
+_users = LRUCache(max_entries=getattr(settings, "AUTH_USER_CACHE_ENTRIES", 10000))
+
+
+def _shared_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def _shared_get(user_id):
+    if not getattr(settings, "AUTH_USER_SHARED_CACHE", False):
+        return None
+    try:
+        return cache.get(_shared_key(user_id))
+    except Exception as e:
+        print(f"Shared user cache unavailable: {e}")
+        return None
+
+
+def _shared_set(user_id, user, timeout: float):
+    if not getattr(settings, "AUTH_USER_SHARED_CACHE", False):
+        return
+    try:
+        cache.set(_shared_key(user_id), user, max(int(timeout), 1))
+    except Exception as e:
+        print(f"Shared user cache unavailable: {e}")
+
+
+def get_cached_user(user_id, token_exp: float):
+    """
+    Return the user of an access token without a DB query while cached.
+
+    Entries live in this process for AUTH_USER_CACHE_TTL seconds and in the
+    shared Redis tier (if enabled) until the token expires, never longer.
+    Raises User.DoesNotExist like User.objects.get.
+    """
+    user_id = str(user_id)
+    now = time.time()
+    ttl = min(getattr(settings, "AUTH_USER_CACHE_TTL", 30), token_exp - now)
+    if ttl <= 0 or not getattr(settings, "AUTH_USER_CACHE", True):
+        return User.objects.get(id=user_id)
+
+    entry = _users.get(user_id)
+    if entry and entry[1] > now:
+        return copy.copy(entry[0])
+
+    user = _shared_get(user_id)
+    if user is None:
+        user = User.objects.get(id=user_id)
+        _shared_set(user_id, user, token_exp - now)
+    _users.set(user_id, (user, now + ttl))
+    return copy.copy(user)
+
+
+async def aget_cached_user(user_id, token_exp: float):
+    """
+    Async variant of get_cached_user: a valid local entry is returned right
+    away, only a miss (DB or Redis) is run in a thread.
+    """
+    entry = _users.get(str(user_id))
+    if entry and entry[1] > time.time() and getattr(settings, "AUTH_USER_CACHE", True):
+        return copy.copy(entry[0])
+    return await sync_to_async(get_cached_user)(user_id, token_exp)
+
+
+def invalidate_user(user_id):
+    """
+    Forget a cached user, e.g. after a password change, deactivation or logout.
+    Other processes drop their local copy after at most AUTH_USER_CACHE_TTL.
+    """
+    user_id = str(user_id)
+    _users.delete(user_id)
+    if not getattr(settings, "AUTH_USER_SHARED_CACHE", False):
+        return
+    try:
+        cache.delete(_shared_key(user_id))
+    except Exception as e:
+        print(f"Shared user cache unavailable: {e}")
@@ -0,0 +1,130 @@
+import django_rq
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import get_connection
+from rq import Retry, get_current_job
+from .utils import build_activation_email, build_password_reset_email
+
+User = get_user_model()
+
+EMAIL_BUILDERS = {
+    "activation": build_activation_email,
+    "password_reset": build_password_reset_email,
+}
+
+# SMTP connection kept open between jobs. Only effective in a non-forking
+# worker (rqworker email --worker-class rq.worker.SimpleWorker), where one
+# process runs all email jobs.
+_connection = None
+
+
+def _is_alive(connection) -> bool:
+    """False if the server dropped an open SMTP session (idle timeout)."""
+
+    smtp = getattr(connection, "connection", None)
+    if smtp is None:
+        return True  # not opened yet, open() connects
+    try:
+        return smtp.noop()[0] == 250
+    except Exception:
+        return False
+
+
+def _smtp_connection():
+    global _connection
+    if _connection is not None and not _is_alive(_connection):
+        # open() is a no-op on a backend that still holds a socket, dead or not.
+        _reset_connection()
+    if _connection is None:
+        _connection = get_connection()
+    return _connection
+
+
+def _reset_connection():
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+    _connection = None
+
+
+def _build_messages(items: list[tuple[str, int]]) -> list[tuple[int, object]]:
+    """(position in items, message) for every user that still exists."""
+
+    messages = []
+    users = User.objects.in_bulk([user_id for _, user_id in items])
+    for index, (kind, user_id) in enumerate(items):
+        user = users.get(user_id)
+        if user is None:
+            print(f"Skipping {kind} email: user {user_id} no longer exists")
+            continue
+        messages.append((index, EMAIL_BUILDERS[kind](user)))
+    return messages
+
+
+def deliver_emails(items: list[tuple[str, int]]) -> int:
+    """
+    RQ job: build and send transactional emails ((kind, user_id) pairs) over
+    one SMTP connection. Templates come from Django's cached template loader.
+    On an SMTP error the connection is dropped and the error re-raised, so RQ
+    retries the job with backoff on a fresh connection. Messages that already
+    went out are recorded in the job meta and skipped by the retry.
+    """
+    job = get_current_job()
+    sent = set(job.meta.get("sent", [])) if job else set()
+    messages = [(index, message) for index, message in _build_messages(items) if index not in sent]
+    if not messages:
+        return 0
+
+    connection = _smtp_connection()
+    count = 0
+    try:
+        connection.open()
+        for index, message in messages:
+            count += connection.send_messages([message]) or 0
+            sent.add(index)
+    except Exception:
+        _reset_connection()
+        raise
+    finally:
+        if job:
+            job.meta["sent"] = sorted(sent)
+            job.save_meta()
+    return count
+
+
+def enqueue_emails(items: list[tuple[str, int]]):
+    """
+    Queue emails on the EMAIL_QUEUE. Sends them right away if async sending
+    is disabled or Redis cannot be reached, so no email is ever lost.
+    """
+    if getattr(settings, "EMAIL_ASYNC", True):
+        try:
+            queue = django_rq.get_queue(getattr(settings, "EMAIL_QUEUE", "email"))
+            return queue.enqueue(
+                deliver_emails, items,
+                retry=Retry(max=len(getattr(settings, "EMAIL_RETRY_INTERVALS", [10, 60, 300])),
+                            interval=getattr(settings, "EMAIL_RETRY_INTERVALS", [10, 60, 300])),
+            )
+        except Exception as e:
+            print(f"Email queue unavailable, sending synchronously: {e}")
+
+    messages = _build_messages(items)
+    get_connection().send_messages([message for _, message in messages])
+    return None
+
+
+def send_activation_email(user):
+    """
+    Sends the account activation email through the RQ email queue.
+    """
+    return enqueue_emails([("activation", user.pk)])
+
+
+def send_password_reset_email(user):
+    """
+    Sends the password reset email through the RQ email queue.
+    """
+    return enqueue_emails([("password_reset", user.pk)])
@@ -1,10 +1,17 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 import pytest
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
+from django.core import mail
 from django.urls import reverse
 from django.utils.http import urlsafe_base64_encode
-from rest_framework.test import APIClient
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import AccessToken
+from user_auth_app.authentication import CookieJWTAuthentication, MediaCookieJWTAuthentication
+from user_auth_app.cache import invalidate_user
+from user_auth_app import tasks
 from user_auth_app.serializers import LoginSerializer
 
 User = get_user_model()
@@ -294,6 +301,123 @@ def test_cookie_jwt_auth_invalid_cookie(client):
     assert response.status_code == 401
 
 
+def test_register_user_enqueues_activation_email(client):
+    queue = MagicMock()
+    with patch("user_auth_app.tasks.django_rq.get_queue", return_value=queue):
+        response = client.post(reverse("register"), {
+            "email": "queued@example.com", "password": "securepassword", "confirmed_password": "securepassword",
+        }, format="json")
+
+    assert response.status_code == 201
+    assert mail.outbox == []
+    func, items = queue.enqueue.call_args.args
+    user = User.objects.get(email="queued@example.com")
+    assert func is tasks.deliver_emails and items == [("activation", user.pk)]
+
+
+def test_emails_sent_synchronously_without_queue():
+    user = User.objects.create_user(email="sync@example.com", password="pass1234")
+    with patch("user_auth_app.tasks.django_rq.get_queue", side_effect=ConnectionError("no redis")):
+        tasks.send_password_reset_email(user)
+
+    assert len(mail.outbox) == 1
+    assert mail.outbox[0].to == ["sync@example.com"]
+
+
+def test_deliver_emails_reuses_one_connection():
+    users = [User.objects.create_user(email=f"bulk{i}@example.com", password="pass1234") for i in range(3)]
+    tasks._reset_connection()
+
+    with patch("user_auth_app.tasks.get_connection", wraps=tasks.get_connection) as get_connection:
+        sent = tasks.deliver_emails([("activation", u.pk) for u in users] + [("activation", 999999)])
+        tasks.deliver_emails([("password_reset", users[0].pk)])
+
+    assert sent == 3
+    assert get_connection.call_count == 1
+    assert len(mail.outbox) == 4
+
+
+def test_deliver_emails_reopens_dropped_connection():
+    user = User.objects.create_user(email="idle@example.com", password="pass1234")
+    tasks._reset_connection()
+    tasks.deliver_emails([("activation", user.pk)])
+    stale = tasks._connection
+    stale.connection = MagicMock()
+    stale.connection.noop.side_effect = OSError("server closed the connection")
+
+    tasks.deliver_emails([("password_reset", user.pk)])
+
+    assert tasks._connection is not stale
+    assert len(mail.outbox) == 2
+
+
+def test_deliver_emails_retry_skips_messages_already_sent():
+    users = [User.objects.create_user(email=f"retry{i}@example.com", password="pass1234") for i in range(3)]
+    items = [("activation", u.pk) for u in users]
+    job = MagicMock(meta={})
+    tasks._reset_connection()
+    send = tasks.get_connection().send_messages
+    outcomes = iter([1, ConnectionError("timeout"), 1, 1])
+
+    def flaky_send(messages):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return send(messages)
+
+    with patch("user_auth_app.tasks.get_current_job", return_value=job), \
+         patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=flaky_send):
+        with pytest.raises(ConnectionError):
+            tasks.deliver_emails(items)
+        assert job.meta["sent"] == [0]
+        assert tasks.deliver_emails(items) == 2
+
+    assert [m.to for m in mail.outbox] == [[u.email] for u in users]
+    assert job.meta["sent"] == [0, 1, 2]
+
+
+def _cookie_request(user):
+    request = APIRequestFactory().get("/")
+    request.COOKIES["access_token"] = str(AccessToken.for_user(user))
+    return request
+
+
+def test_cookie_jwt_auth_caches_user(django_assert_num_queries):
+    user = User.objects.create_user(email="cached@example.com", password="pass1234", is_active=True)
+    invalidate_user(user.pk)
+    request = _cookie_request(user)
+
+    with django_assert_num_queries(1):
+        CookieJWTAuthentication().authenticate(request)
+        authenticated, _ = CookieJWTAuthentication().authenticate(request)
+
+    assert authenticated.pk == user.pk
+
+
+def test_cookie_jwt_auth_cache_invalidated_on_deactivation():
+    user = User.objects.create_user(email="deactivate@example.com", password="pass1234", is_active=True)
+    request = _cookie_request(user)
+    CookieJWTAuthentication().authenticate(request)
+
+    user.is_active = False
+    user.save()
+
+    with pytest.raises(AuthenticationFailed):
+        CookieJWTAuthentication().authenticate(request)
+
+
+def test_media_auth_stateless_mode_skips_lookup(settings, django_assert_num_queries):
+    settings.AUTH_STATELESS_MEDIA = True
+    user = User.objects.create_user(email="stateless@example.com", password="pass1234", is_active=True)
+    request = _cookie_request(user)
+
+    with django_assert_num_queries(0):
+        authenticated, _ = MediaCookieJWTAuthentication().authenticate(request)
+
+    assert isinstance(authenticated, TokenUser)
+    assert str(authenticated.id) == str(user.pk)
+
+
 def test_activate_view_invalid_token_but_valid_uid(client):
     user = User.objects.create_user(
         email="user@example.com",
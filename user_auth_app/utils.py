@@ -10,9 +10,9 @@ from django.utils.http import urlsafe_base64_encode
 from django.utils.timezone import now
 
 
-def send_activation_email(user):
+def build_activation_email(user):
     """
-    Sends an account activation email to the given user. Generates uidb64 + token automatically.
+    Builds the account activation email for the given user. Generates uidb64 + token automatically.
     """
 
     uidb64 = urlsafe_base64_encode(str(user.pk).encode())
@@ -33,13 +33,13 @@ def send_activation_email(user):
 
     msg = EmailMultiAlternatives(subject, text_content, from_email, to)
     msg.attach_alternative(html_content, "text/html")
-    msg.send()
+    return msg
 
 
-def send_password_reset_email(user):
+def build_password_reset_email(user):
     """
-    Sends an email for password resetting.
-    Generates uidb64 + token automatically and sends email.
+    Builds the email for password resetting.
+    Generates uidb64 + token automatically.
     """
 
     uid = urlsafe_base64_encode(str(user.pk).encode())
@@ -65,7 +65,7 @@ def send_password_reset_email(user):
         to=[user.email],
     )
     email.attach_alternative(html_content, "text/html")
-    email.send()
+    return email
 
 
 def create_tokens_for_user(user):
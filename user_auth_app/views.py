@@ -15,12 +15,12 @@ from rest_framework_simplejwt.token_blacklist.models import (
     OutstandingToken,
 )
 from rest_framework_simplejwt.tokens import RefreshToken
+from .cache import invalidate_user
 from .serializers import LoginSerializer, RegistrationSerializer, UserSerializer
+from .tasks import send_activation_email, send_password_reset_email
 from .utils import (
     create_tokens_for_user,
     get_jwt_max_ages,
-    send_activation_email,
-    send_password_reset_email,
     set_auth_cookies,
 )
 
@@ -154,6 +154,7 @@ class LogoutView(APIView):
 
             token = RefreshToken(refresh_token)
             token.blacklist() 
+            invalidate_user(request.user.pk)
 
             response = Response(
                 {"detail": "Logout successful! All tokens will be deleted. Refresh token is now invalid."},
@@ -1,8 +1,26 @@
 from django.contrib import admin
-from .models import Video
+from .models import TranscodeJob, UploadSession, Video
 
 # admin.site.register(Video)
 @admin.register(Video)
 class VideoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'created_at')
+    list_display = ('id', 'title', 'created_at', 'processing_status')
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'filename', 'user', 'offset', 'size', 'status', 'created_at')
+
+
+@admin.register(TranscodeJob)
+class TranscodeJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'video', 'stage', 'status', 'progress', 'speed', 'wall_seconds', 'cpu_seconds',
+                    'max_rss_bytes', 'bytes_written', 'started_at')
+    list_filter = ('status', 'stage')
+    actions = ['cancel']
+
+    @admin.action(description="Cancel selected running stages")
+    def cancel(self, request, queryset):
+        count = queryset.filter(status=TranscodeJob.Status.RUNNING).update(status=TranscodeJob.Status.CANCELLED)
+        self.message_user(request, f"Cancelled {count} stages; ffmpeg stops at its next progress update.")
 
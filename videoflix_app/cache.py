@@ -0,0 +1,136 @@
+import hashlib
+import os
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from core.cache import LRUCache
+from .utils import safe_media_path
+
+
+# (media root, video id, resolution) -> (path, mtime_ns, body, etag)
+_playlists = LRUCache(
+    max_entries=getattr(settings, "HLS_PLAYLIST_CACHE_ENTRIES", 2048),
+    max_size=getattr(settings, "HLS_PLAYLIST_CACHE_BYTES", 8 * 1024 * 1024),
+    sizeof=lambda entry: len(entry[2]),
+)
+
+
+def _etag(body: bytes) -> str:
+    return '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def _shared_get(key: str):
+    if not getattr(settings, "HLS_PLAYLIST_SHARED_CACHE", False):
+        return None
+    try:
+        return cache.get(key)
+    except Exception as e:
+        print(f"Shared playlist cache unavailable: {e}")
+        return None
+
+
+def _shared_set(key: str, value):
+    if not getattr(settings, "HLS_PLAYLIST_SHARED_CACHE", False):
+        return
+    try:
+        cache.set(key, value, getattr(settings, "HLS_PLAYLIST_CACHE_TIMEOUT", 24 * 3600))
+    except Exception as e:
+        print(f"Shared playlist cache unavailable: {e}")
+
+
+def get_playlist(video_id: int, resolution: str) -> tuple[bytes, str]:
+    """
+    Return (body, etag) of a media playlist.
+
+    A cached playlist is revalidated with a single stat() of its file; the
+    path checks and the read only happen on a miss. Entries are keyed on the
+    file's mtime, so a re-encoded playlist is never served stale, also not
+    by processes that missed the explicit invalidation.
+    Raises Http404 if the playlist does not exist.
+    """
+    enabled = getattr(settings, "HLS_PLAYLIST_CACHE", True)
+    key = (str(settings.MEDIA_ROOT), video_id, resolution)
+
+    entry = _playlists.get(key) if enabled else None
+    if entry:
+        path, mtime_ns, body, etag = entry
+        try:
+            if os.stat(path).st_mtime_ns == mtime_ns:
+                return body, etag
+        except OSError:
+            _playlists.delete(key)
+            raise Http404("Playlist not found")
+
+    path = safe_media_path("hls", str(video_id), resolution, "index.m3u8")
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        raise Http404("Playlist not found")
+
+    shared_key = f"hls:playlist:{video_id}:{resolution}:{mtime_ns}"
+    cached = _shared_get(shared_key) if enabled else None
+    if cached:
+        body, etag = cached
+    else:
+        try:
+            body = path.read_bytes()
+        except OSError:
+            raise Http404("Playlist not found")
+        etag = _etag(body)
+        if enabled:
+            _shared_set(shared_key, (body, etag))
+
+    if enabled:
+        _playlists.set(key, (str(path), mtime_ns, body, etag))
+    return body, etag
+
+
+def invalidate_playlists(video_id: int):
+    """
+    Drop the cached playlists of a video from this process.
+    Shared entries are keyed on the file mtime and expire on their own.
+    """
+    _playlists.delete_where(lambda key: key[1] == video_id)
+
+
+CATALOG_GENERATION_KEY = "videos:catalog:generation"
+
+
+def catalog_generation() -> int:
+    """
+    Current catalog generation; bumped on every Video change so cached
+    catalog pages and their ETags become stale at once. 0 if Redis is down.
+    """
+    try:
+        return cache.get_or_set(CATALOG_GENERATION_KEY, 1, None)
+    except Exception as e:
+        print(f"Catalog cache unavailable: {e}")
+        return 0
+
+
+def invalidate_catalog():
+    """Invalidate all cached catalog pages (Video post_save/post_delete, status updates)."""
+
+    if not getattr(settings, "VIDEO_CATALOG_CACHE", True):
+        return
+    try:
+        cache.incr(CATALOG_GENERATION_KEY)
+    except ValueError:
+        cache.set(CATALOG_GENERATION_KEY, 1, None)
+    except Exception as e:
+        print(f"Catalog cache unavailable: {e}")
+
+
+def get_catalog_page(key: str):
+    try:
+        return cache.get(key)
+    except Exception as e:
+        print(f"Catalog cache unavailable: {e}")
+        return None
+
+
+def set_catalog_page(key: str, data):
+    try:
+        cache.set(key, data, getattr(settings, "VIDEO_CATALOG_CACHE_TIMEOUT", 300))
+    except Exception as e:
+        print(f"Catalog cache unavailable: {e}")
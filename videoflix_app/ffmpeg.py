@@ -0,0 +1,211 @@
+import os
+import signal
+import subprocess
+import threading
+from collections import deque
+from django.conf import settings
+
+# Runs ffmpeg with flat memory, however long the encode: progress
+# (-progress pipe:1) is parsed line by line from stdout and the log on stderr
+# is drained into a ring buffer holding only its last HLS_FFMPEG_LOG_BYTES.
+# Every process gets a lowered priority (HLS_FFMPEG_NICE) and optionally a
+# CPU set (HLS_FFMPEG_CPUS), and is stopped with SIGTERM, then SIGKILL, on
+# timeout, cancellation or an exception. It stays in the process group of the
+# RQ work horse, so the worker's kill_horse (killpg) takes it down as well.
+
+
+class FFmpegError(RuntimeError):
+    """A failed, timed out or cancelled ffmpeg run with the tail of its log."""
+
+    def __init__(self, returncode: int | None, log: str, reason: str | None = None, usage=None):
+        self.returncode = returncode
+        self.log = log
+        self.reason = reason
+        self.usage = usage
+        if reason:
+            message = f"FFmpeg {reason}"
+        else:
+            message = f"FFmpeg exited with code {returncode}"
+        tail = log.strip().splitlines()[-3:]
+        super().__init__(f"{message}: {' | '.join(tail)}" if tail else message)
+
+
+class LogTail:
+    """The last `limit` bytes of a stream, kept as whole lines where possible."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.lines = deque()
+        self.size = 0
+
+    def append(self, line: bytes):
+        line = line[-self.limit:]
+        self.lines.append(line)
+        self.size += len(line)
+        while self.size > self.limit:
+            self.size -= len(self.lines.popleft())
+
+    def drain(self, stream):
+        for line in iter(lambda: stream.readline(8192), b""):
+            self.append(line)
+        stream.close()
+
+    def text(self) -> str:
+        return b"".join(self.lines).decode(errors="replace")
+
+
+def parse_cpu_list(value: str) -> set[int]:
+    """Parse a CPU list like "0-3,6" (taskset -c syntax)."""
+
+    cpus = set()
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def _lower_priority(pid: int):
+    """
+    Apply HLS_FFMPEG_NICE and HLS_FFMPEG_CPUS to a freshly started process.
+    Set from the parent rather than a preexec_fn (unsafe with the pipeline's
+    thread pool); ffmpeg creates its encoder threads later, and they inherit both.
+    """
+    niceness = getattr(settings, "HLS_FFMPEG_NICE", 0)
+    cpus = getattr(settings, "HLS_FFMPEG_CPUS", "")
+    try:
+        if niceness and hasattr(os, "setpriority"):
+            os.setpriority(os.PRIO_PROCESS, pid, max(niceness, os.getpriority(os.PRIO_PROCESS, pid)))
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(pid, parse_cpu_list(cpus))
+    except (OSError, ValueError) as e:
+        print(f"Could not lower ffmpeg priority: {e}")
+
+
+class _Stopper:
+    """Stops a process: SIGTERM first, SIGKILL after HLS_FFMPEG_KILL_GRACE seconds."""
+
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+        self.reason = None
+        self.exited = threading.Event()
+
+    def stop(self, reason: str):
+        if self.reason or self.exited.is_set():
+            return
+        self.reason = reason
+        self._signal(signal.SIGTERM)
+        escalate = threading.Timer(getattr(settings, "HLS_FFMPEG_KILL_GRACE", 10), self._kill)
+        escalate.daemon = True
+        escalate.start()
+
+    def _kill(self):
+        if not self.exited.is_set():
+            self._signal(getattr(signal, "SIGKILL", signal.SIGTERM))
+
+    def _signal(self, sig):
+        try:
+            if os.name == "posix":
+                os.kill(self.process.pid, sig)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class _Running:
+    """
+    The ffmpeg processes of this worker. RQ raises its job timeout in the main
+    thread only, so the pipeline's pool threads would keep waiting on theirs;
+    stop_all() stops every one of them, and any started until clear_stop().
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stoppers = set()
+        self.reason = None
+
+    def add(self, stopper: _Stopper):
+        with self.lock:
+            self.stoppers.add(stopper)
+            reason = self.reason
+        if reason:
+            stopper.stop(reason)
+
+    def discard(self, stopper: _Stopper):
+        with self.lock:
+            self.stoppers.discard(stopper)
+
+    def stop_all(self, reason: str):
+        with self.lock:
+            self.reason = reason
+            stoppers = list(self.stoppers)
+        for stopper in stoppers:
+            stopper.stop(reason)
+
+    def clear_stop(self):
+        with self.lock:
+            self.reason = None
+
+
+_running = _Running()
+stop_all = _running.stop_all
+clear_stop = _running.clear_stop
+
+
+def _reap(process: subprocess.Popen):
+    """Wait for the process; returns its exit code and rusage (None where os.wait4 is missing)."""
+
+    if hasattr(os, "wait4"):
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return process.returncode, usage
+    return process.wait(), None
+
+
+def run(command: list[str], on_progress=None):
+    """
+    Run an ffmpeg command that writes `-progress pipe:1`. `on_progress(dict)`
+    gets every progress block and can return False to cancel the run.
+    Returns the rusage of the process; raises FFmpegError if ffmpeg failed,
+    exceeded HLS_FFMPEG_TIMEOUT seconds or was cancelled.
+    """
+    tail = LogTail(getattr(settings, "HLS_FFMPEG_LOG_BYTES", 64 * 1024))
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    _lower_priority(process.pid)
+
+    stopper = _Stopper(process)
+    _running.add(stopper)
+    drain = threading.Thread(target=tail.drain, args=(process.stderr,), daemon=True)
+    drain.start()
+    timeout = getattr(settings, "HLS_FFMPEG_TIMEOUT", 0)
+    watchdog = None
+    if timeout:
+        watchdog = threading.Timer(timeout, stopper.stop, [f"timed out after {timeout}s"])
+        watchdog.daemon = True
+        watchdog.start()
+
+    try:
+        progress = {}
+        for line in process.stdout:
+            key, _, value = line.decode(errors="replace").strip().partition("=")
+            progress[key] = value
+            if key == "progress" and on_progress is not None and on_progress(progress) is False:
+                stopper.stop("cancelled")
+    except BaseException:
+        # Includes RQ's job timeout when ffmpeg runs in the main thread; in a
+        # pool thread it arrives through stop_all() instead.
+        stopper.stop("interrupted")
+        raise
+    finally:
+        process.stdout.close()
+        returncode, usage = _reap(process)
+        stopper.exited.set()
+        _running.discard(stopper)
+        if watchdog:
+            watchdog.cancel()
+        drain.join(timeout=5)
+
+    if stopper.reason or returncode != 0:
+        raise FFmpegError(returncode, tail.text(), stopper.reason, usage)
+    return usage
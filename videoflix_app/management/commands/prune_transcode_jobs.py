@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from videoflix_app.metrics import prune_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold finished transcode stage records older than TRANSCODE_JOB_RETENTION_DAYS "
+        "into per-stage totals and delete them (run it daily, e.g. from cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=None,
+            help="Keep records of this many days instead of TRANSCODE_JOB_RETENTION_DAYS.",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days is None:
+            days = getattr(settings, "TRANSCODE_JOB_RETENTION_DAYS", 30)
+        deleted = prune_jobs(days)
+        self.stdout.write(self.style.SUCCESS(f"✅ Pruned {deleted} transcode stage records older than {days} days"))
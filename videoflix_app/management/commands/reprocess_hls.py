@@ -1,21 +1,102 @@
 # videoflix_app/management/commands/reprocess_hls.py
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from videoflix_app.models import Video
-import django_rq
-from videoflix_app.tasks import run_hls_pipeline
+from videoflix_app.tasks import (
+    ENCODING_PROFILES,
+    RENDITIONS,
+    SEGMENT_FORMATS,
+    _probe_duration,
+    _video_ladder,
+    _video_source_path,
+    enqueue_hls_pipeline,
+    missing_renditions,
+    stale_renditions,
+)
 
 class Command(BaseCommand):
-    help = "Re-generate HLS for all videos"
+    help = (
+        "Re-generate HLS for videos whose renditions are missing or were encoded "
+        "from a different source file or encoder configuration"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--only-missing", action="store_true",
+            help="Only encode renditions without output on disk (skips source hashing).",
+        )
+        parser.add_argument(
+            "--rendition", action="append", dest="renditions", metavar="NAME",
+            help="Only consider this rendition (e.g. 1080p). Can be given several times.",
+        )
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Re-encode the selected renditions even if they are up to date.",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Report what would be encoded and the estimated encode minutes without enqueuing.",
+        )
+        parser.add_argument(
+            "--profile", choices=sorted(ENCODING_PROFILES),
+            help="Switch the videos to this encoding profile, e.g. archive for popular titles.",
+        )
+        parser.add_argument(
+            "--segment-format", choices=SEGMENT_FORMATS,
+            help="Switch the videos to this segment format, e.g. fmp4-single for CMAF in one file per rendition.",
+        )
+        parser.add_argument(
+            "--video", action="append", dest="videos", type=int, metavar="ID",
+            help="Only consider this video. Can be given several times.",
+        )
 
     def handle(self, *args, **options):
-        queue = django_rq.get_queue("default")
+        names = [r["name"] for r in RENDITIONS]
+        selected = options["renditions"] or names
+        unknown = set(selected) - set(names)
+        if unknown:
+            raise CommandError(f"Unknown rendition(s): {', '.join(sorted(unknown))}")
 
         count = 0
-        for video in Video.objects.all():
-            queue.enqueue(run_hls_pipeline, video.id)
-            self.stdout.write(f"🔄 Enqueued HLS processing for: {video.title}")
+        encode_minutes = 0.0
+        videos = Video.objects.all().order_by("id")
+        if options["videos"]:
+            videos = videos.filter(pk__in=options["videos"])
+        switch = {key: options[key] for key in ("profile", "segment_format") if options[key]}
+        for video in videos:
+            if options["profile"]:
+                video.encoding_profile = options["profile"]
+            if options["segment_format"]:
+                video.segment_format = options["segment_format"]
+            source = _video_source_path(video)
+            if source is None or not source.exists():
+                self.stdout.write(self.style.WARNING(f"⚠️ Skipping {video.title}: source file missing"))
+                continue
+
+            ladder = [r["name"] for r in _video_ladder(video)]
+            if options["force"]:
+                todo = [name for name in selected if name in ladder]
+            elif options["only_missing"]:
+                todo = [name for name in missing_renditions(video) if name in selected]
+            else:
+                todo = [name for name in stale_renditions(video) if name in selected]
+            if not todo:
+                continue
+
             count += 1
+            if options["dry_run"]:
+                duration = _probe_duration(source) or 0
+                encode_minutes += duration / 60 * len(todo)
+                self.stdout.write(f"🔎 Would encode {', '.join(todo)} for: {video.title}")
+                continue
 
-        self.stdout.write(self.style.SUCCESS(f"\n✅ Enqueued HLS pipeline for {count} videos!"))
+            renditions = None if set(todo) == set(ladder) else todo
+            enqueue_hls_pipeline(video.id, str(source), renditions, **switch)
+            self.stdout.write(f"🔄 Enqueued HLS processing ({', '.join(todo)}) for: {video.title}")
 
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(
+                f"\n✅ {count} videos need re-encoding, about {encode_minutes:.1f} encode minutes"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"\n✅ Enqueued HLS pipeline for {count} videos!"))
@@ -0,0 +1,121 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from .models import TranscodeJob, TranscodeStageTotal
+
+# Prometheus text exposition of the TranscodeJob records. The numbers come
+# from the database rather than in-process counters, so every RQ worker's
+# stages are included no matter which process serves the scrape. Old rows
+# are folded into TranscodeStageTotal (prune_jobs), which keeps the table a
+# scrape aggregates small and the counters monotonic.
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def _number(value) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else f"{value:.6f}"
+
+
+def _rendition(stage: str) -> str:
+    """Chunks are reported under their rendition ("720p/chunk_003" -> "720p")."""
+
+    return stage.split("/", 1)[0]
+
+
+def _aggregate(queryset):
+    return (queryset.values("stage", "status")
+            .annotate(count=Count("id"), wall=Sum("wall_seconds"), cpu=Sum("cpu_seconds"),
+                      out_time=Sum("out_time_seconds"), rss=Max("max_rss_bytes"), bytes=Sum("bytes_written")))
+
+
+def prune_jobs(days: int) -> int:
+    """
+    Fold finished TranscodeJob rows older than `days` into TranscodeStageTotal
+    and delete them. Returns the number of deleted rows.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    old = TranscodeJob.objects.filter(finished_at__lt=cutoff).exclude(status=TranscodeJob.Status.RUNNING)
+    with transaction.atomic():
+        for row in _aggregate(old):
+            total, _ = TranscodeStageTotal.objects.select_for_update().get_or_create(
+                stage=_rendition(row["stage"]), status=row["status"])
+            total.count += row["count"]
+            total.wall_seconds += row["wall"] or 0
+            total.cpu_seconds += row["cpu"] or 0
+            total.out_time_seconds += row["out_time"] or 0
+            total.bytes_written += row["bytes"] or 0
+            total.max_rss_bytes = max(total.max_rss_bytes, row["rss"] or 0)
+            total.save()
+        deleted, _ = old.delete()
+    return deleted
+
+
+def render_metrics() -> str:
+    finished = defaultdict(lambda: defaultdict(float))
+    counts = defaultdict(int)
+    rows = list(_aggregate(TranscodeJob.objects.exclude(status=TranscodeJob.Status.RUNNING)))
+    rows += [{"stage": total.stage, "status": total.status, "count": total.count, "wall": total.wall_seconds,
+              "cpu": total.cpu_seconds, "out_time": total.out_time_seconds, "rss": total.max_rss_bytes,
+              "bytes": total.bytes_written}
+             for total in TranscodeStageTotal.objects.all()]
+    for row in rows:
+        stage = _rendition(row["stage"])
+        counts[(stage, row["status"])] += row["count"]
+        totals = finished[stage]
+        totals["count"] += row["count"]
+        totals["wall"] += row["wall"] or 0
+        totals["cpu"] += row["cpu"] or 0
+        totals["out_time"] += row["out_time"] or 0
+        totals["bytes"] += row["bytes"] or 0
+        totals["rss"] = max(totals["rss"], row["rss"] or 0)
+
+    running = list(TranscodeJob.objects.filter(status=TranscodeJob.Status.RUNNING).order_by("video_id", "stage"))
+    in_flight = defaultdict(int)
+    for job in running:
+        in_flight[_rendition(job.stage)] += 1
+
+    lines = [
+        "# HELP videoflix_transcode_stages_total Finished pipeline stages by stage and status.",
+        "# TYPE videoflix_transcode_stages_total counter",
+    ]
+    lines += [f"videoflix_transcode_stages_total{_labels(stage=stage, status=status)} {count}"
+              for (stage, status), count in sorted(counts.items())]
+    lines += [
+        "# HELP videoflix_transcode_stages_running Pipeline stages running right now.",
+        "# TYPE videoflix_transcode_stages_running gauge",
+    ]
+    lines += [f"videoflix_transcode_stages_running{_labels(stage=stage)} {count}"
+              for stage, count in sorted(in_flight.items())]
+
+    metrics = [
+        ("wall_seconds_total", "counter", "Wall time of finished stages.", "wall"),
+        ("cpu_seconds_total", "counter", "CPU time (user + system) of the ffmpeg processes of finished stages.", "cpu"),
+        ("media_seconds_total", "counter", "Media time encoded by finished stages.", "out_time"),
+        ("bytes_written_total", "counter", "Bytes written by finished stages.", "bytes"),
+        ("max_rss_bytes", "gauge", "Peak RSS of a single ffmpeg process of the stage.", "rss"),
+    ]
+    for name, kind, help_text, key in metrics:
+        lines += [f"# HELP videoflix_transcode_{name} {help_text}", f"# TYPE videoflix_transcode_{name} {kind}"]
+        lines += [f"videoflix_transcode_{name}{_labels(stage=stage)} {_number(totals[key])}"
+                  for stage, totals in sorted(finished.items())]
+
+    lines += [
+        "# HELP videoflix_transcode_progress Progress (0..1) of running stages.",
+        "# TYPE videoflix_transcode_progress gauge",
+    ]
+    for job in running:
+        if job.progress is not None:
+            lines.append(f"videoflix_transcode_progress{_labels(video_id=job.video_id, stage=job.stage)} "
+                         f"{job.progress:.4f}")
+    lines += [
+        "# HELP videoflix_transcode_speed Realtime speed factor reported by ffmpeg for running stages.",
+        "# TYPE videoflix_transcode_speed gauge",
+    ]
+    lines += [f"videoflix_transcode_speed{_labels(video_id=job.video_id, stage=job.stage)} {_number(job.speed)}"
+              for job in running if job.speed is not None]
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,9 @@
-from django.db import models
+import uuid
 from datetime import date
+from pathlib import Path
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models
 
 
 def video_upload_path(instance, filename):
@@ -10,6 +14,13 @@ class Video(models.Model):
     Represents a video object in the system.
     """
 
+    class ProcessingStatus(models.TextChoices):
+        PENDING = "pending", "Pending"
+        PROCESSING = "processing", "Processing"
+        PLAYABLE = "playable", "Playable (higher quality pending)"
+        READY = "ready", "Ready"
+        FAILED = "failed", "Failed"
+
     created_at = models.DateField(default=date.today)
     title = models.CharField(max_length=80, unique=True)
     description = models.TextField(max_length=500)
@@ -20,6 +31,33 @@ class Video(models.Model):
     hls_master = models.FileField(upload_to="video/hls", max_length=500, blank=True, null=True)
     trailer = models.FileField(upload_to="video/trailer", max_length=500, blank=True, null=True)
     thumbnail_url = models.ImageField(upload_to="thumbnails/", max_length=500, blank=True, null=True)
+    # Pregenerated thumbnail sizes, {"webp": [320, 640, 1280], ...} (see thumbnails.py).
+    thumbnail_variants = models.JSONField(default=dict, blank=True)
+
+    processing_status = models.CharField(
+        max_length=20, choices=ProcessingStatus.choices, default=ProcessingStatus.PENDING
+    )
+    available_renditions = models.JSONField(default=list, blank=True)
+
+    source_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    source_signature = models.CharField(max_length=64, blank=True)
+    rendition_fingerprints = models.JSONField(default=dict, blank=True)
+    ladder = models.JSONField(default=list, blank=True)
+    # Name of an entry of tasks.ENCODING_PROFILES; empty = HLS_ENCODING_PROFILE.
+    encoding_profile = models.CharField(max_length=30, blank=True)
+    # Entry of tasks.SEGMENT_FORMATS ("ts", "fmp4", "fmp4-single"); empty = HLS_SEGMENT_FORMAT.
+    segment_format = models.CharField(max_length=20, blank=True)
+
+    # PostgreSQL full-text search document, maintained by search.py.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Backs the keyset-paginated catalog (see pagination.KeysetPagination).
+            models.Index(fields=["-created_at", "-id"], name="video_catalog_idx"),
+            # Per-category rows of the browse endpoint and the category drill-down.
+            models.Index(fields=["category", "-created_at", "-id"], name="video_category_idx"),
+        ]
 
          
     def __str__(self):
@@ -28,3 +66,107 @@ class Video(models.Model):
 
 
 
+
+
+class UploadSession(models.Model):
+    """
+    A resumable (tus-like) upload of a video source. Chunks are appended to
+    `part_path` in place; finalizing moves the file into MEDIA_ROOT/video/
+    and creates the Video.
+    """
+
+    class Status(models.TextChoices):
+        OPEN = "open", "Open"
+        COMPLETE = "complete", "Complete"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="upload_sessions")
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    title = models.CharField(max_length=80)
+    description = models.TextField(max_length=500, blank=True)
+    category = models.CharField(max_length=50, default="General")
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.OPEN)
+    video = models.ForeignKey(Video, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def part_path(self) -> Path:
+        return Path(settings.MEDIA_ROOT) / "video" / "uploads" / f"{self.id}.part"
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class TranscodeJob(models.Model):
+    """
+    One stage of an HLS pipeline run (a rendition, a chunk of one, "renditions"
+    for a single-pass encode, "trailer" or "thumbnail") with the resource usage
+    of its ffmpeg processes. Progress is updated while ffmpeg runs; setting a
+    running job to CANCELLED stops its ffmpeg process.
+    """
+
+    class Status(models.TextChoices):
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+        CANCELLED = "cancelled", "Cancelled"
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="transcode_jobs")
+    stage = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.RUNNING)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    duration_seconds = models.FloatField(null=True, blank=True)
+    out_time_seconds = models.FloatField(default=0)
+    speed = models.FloatField(null=True, blank=True)
+    wall_seconds = models.FloatField(null=True, blank=True)
+    cpu_seconds = models.FloatField(default=0)
+    max_rss_bytes = models.BigIntegerField(default=0)
+    bytes_written = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "stage"], name="transcode_status_idx"),
+            models.Index(fields=["finished_at"], name="transcode_finished_idx"),
+        ]
+
+    @property
+    def progress(self) -> float | None:
+        """Share of the stage's media time encoded so far (0..1), if its duration is known."""
+
+        if self.status == self.Status.DONE:
+            return 1.0
+        if not self.duration_seconds:
+            return None
+        return min(self.out_time_seconds / self.duration_seconds, 1.0)
+
+    def __str__(self):
+        return f"{self.stage} of video {self.video_id} ({self.status})"
+
+
+class TranscodeStageTotal(models.Model):
+    """
+    Totals of the finished TranscodeJob rows that prune_transcode_jobs
+    deleted, per rendition and status, so the metrics counters keep counting
+    them and never go backwards.
+    """
+
+    stage = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=TranscodeJob.Status.choices)
+    count = models.BigIntegerField(default=0)
+    wall_seconds = models.FloatField(default=0)
+    cpu_seconds = models.FloatField(default=0)
+    out_time_seconds = models.FloatField(default=0)
+    max_rss_bytes = models.BigIntegerField(default=0)
+    bytes_written = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["stage", "status"], name="transcode_total_unique")]
+
+    def __str__(self):
+        return f"{self.count} {self.status} {self.stage} stages"
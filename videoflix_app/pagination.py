@@ -0,0 +1,62 @@
+import base64
+from datetime import date
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """
+    Keyset (cursor) pagination over (created_at, id), newest first.
+    The cursor encodes the last row of the previous page, so every page is
+    a single index range scan on video_catalog_idx regardless of its depth.
+    """
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+
+    def _limit(self, request) -> int:
+        default = getattr(settings, "VIDEO_CATALOG_PAGE_SIZE", 50)
+        try:
+            limit = int(request.query_params.get(self.limit_query_param, default))
+        except ValueError:
+            limit = default
+        return max(1, min(limit, getattr(settings, "VIDEO_CATALOG_MAX_PAGE_SIZE", 200)))
+
+    def encode_cursor(self, obj) -> str:
+        raw = f"{obj.created_at.isoformat()}|{obj.pk}".encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    def decode_cursor(self, cursor: str) -> tuple[date, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, pk = raw.split("|")
+            return date.fromisoformat(created_at), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        limit = self._limit(request)
+        queryset = queryset.order_by("-created_at", "-id")
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        rows = list(queryset[:limit + 1])
+        self.next_cursor = self.encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit]
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_data(self, data) -> dict:
+        return {"next": self.get_next_link(), "results": data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
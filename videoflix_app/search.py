@@ -0,0 +1,127 @@
+import re
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, connections
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from .models import Video
+
+# Full-text search over Video.title and Video.description.
+#
+# - PostgreSQL: Video.search_vector (tsvector, title weighted above the
+#   description) kept up to date by a post_save signal, GIN index.
+# - SQLite: FTS5 external-content table synced by triggers, ranked with bm25.
+# Both are installed by install_search_backend() after every migrate.
+
+FTS_TABLE = "videoflix_video_fts"
+GIN_INDEX = "video_search_idx"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _config() -> str:
+    return getattr(settings, "VIDEO_SEARCH_CONFIG", "simple")
+
+
+def search_tokens(query: str) -> list[str]:
+    """Split a user query into at most 8 lowercase word tokens (no operators)."""
+
+    return [token.lower() for token in _TOKEN_RE.findall(query or "")][:8]
+
+
+def _search_vector():
+    return (
+        SearchVector(Coalesce(F("title"), Value("")), weight="A", config=_config())
+        + SearchVector(Coalesce(F("description"), Value("")), weight="B", config=_config())
+    )
+
+
+def update_search_vector(video_id: int):
+    """Recompute the tsvector of one video (PostgreSQL only)."""
+
+    if connection.vendor == "postgresql":
+        Video.objects.filter(pk=video_id).update(search_vector=_search_vector())
+
+
+def install_search_backend(using: str = "default"):
+    """
+    Create the search index structures for the database backend: the GIN
+    index plus a backfill on PostgreSQL, the FTS5 table and its sync
+    triggers on SQLite. Idempotent, runs on post_migrate.
+    """
+    db = connections[using]
+    table = Video._meta.db_table
+
+    if db.vendor == "postgresql":
+        with db.cursor() as cursor:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {GIN_INDEX} ON {table} USING gin (search_vector)")
+        Video.objects.using(using).filter(search_vector__isnull=True).update(search_vector=_search_vector())
+
+    elif db.vendor == "sqlite":
+        with db.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '{FTS_TABLE}'")
+            if cursor.fetchone():
+                return
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"title, description, content='{table}', content_rowid='id', tokenize='unicode61')"
+            )
+            cursor.execute(f"""
+                CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+                END""")
+            cursor.execute(f"""
+                CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                END""")
+            cursor.execute(f"""
+                CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, description ON {table} BEGIN
+                    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                    INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+                END""")
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _search_postgres(tokens: list[str], limit: int) -> list[Video]:
+    # The last token is a prefix, so "star wa" matches while typing.
+    raw = " & ".join(tokens[:-1] + [f"{tokens[-1]}:*"])
+    query = SearchQuery(raw, search_type="raw", config=_config())
+    return list(
+        Video.objects.filter(search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "-created_at", "-id")[:limit]
+    )
+
+
+def _search_sqlite(tokens: list[str], limit: int) -> list[Video]:
+    match = " AND ".join([f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*'])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s",
+            [match, limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    videos = Video.objects.in_bulk(ids)
+    return [videos[pk] for pk in ids if pk in videos]
+
+
+def search_videos(query: str, limit: int = 20) -> list[Video]:
+    """
+    Return the best matching videos for a query, best first. Every word must
+    match; the last one also matches as a prefix (typeahead).
+    """
+    tokens = search_tokens(query)
+    if not tokens:
+        return []
+    if connection.vendor == "postgresql":
+        return _search_postgres(tokens, limit)
+    if connection.vendor == "sqlite":
+        return _search_sqlite(tokens, limit)
+
+    queryset = Video.objects.all()
+    for token in tokens:
+        queryset = queryset.filter(Q(title__icontains=token) | Q(description__icontains=token))
+    return list(queryset.order_by("-created_at", "-id")[:limit])
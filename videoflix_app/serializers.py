@@ -1,27 +1,74 @@
 import os
 from django.conf import settings
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import Video
+from .models import UploadSession, Video
+from .thumbnails import variant_name
 
 class VideoSerializer(serializers.ModelSerializer):
     """
     Serializer for the Video model. Exposes all fields of the Video model
     """
     thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Video
-        fields = ["id", "created_at", "title", "description", "thumbnail_url", "category",]
+        fields = [
+            "id", "created_at", "title", "description", "thumbnail_url", "thumbnail_srcset", "category",
+            "processing_status", "available_renditions",
+        ]
+
+    def _absolute_url(self, url):
+        if not url.startswith("/"):
+            return url
+        if "base_url" not in self.context:
+            # Build scheme + host once per response instead of once per row.
+            self.context["base_url"] = self.context["request"].build_absolute_uri("/")[:-1]
+        return self.context["base_url"] + url
 
     def get_thumbnail_url(self, obj):
-        request = self.context.get("request")
+        if not obj.thumbnail_url:
+            return None
+        return self._absolute_url(obj.thumbnail_url.url)
 
-        if obj.thumbnail_url:
-            return request.build_absolute_uri(obj.thumbnail_url.url)
-        return None
+    def get_thumbnail_srcset(self, obj):
+        """
+        `srcset` value per format of the pregenerated thumbnail sizes, e.g.
+        {"webp": ".../320.webp 320w, .../640.webp 640w"}, for <picture><source>.
+        """
+        return {
+            fmt: ", ".join(f"{self._absolute_url(default_storage.url(variant_name(obj.pk, width, fmt)))} {width}w"
+                           for width in widths)
+            for fmt, widths in (obj.thumbnail_variants or {}).items()
+        }
 
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """
+    Serializer for resumable upload sessions. Only the metadata is writable,
+    the offset advances through PATCH requests carrying the chunks.
+    """
 
+    class Meta:
+        model = UploadSession
+        fields = ["id", "filename", "size", "offset", "title", "description", "category", "status", "video"]
+        read_only_fields = ["id", "offset", "status", "video"]
 
+    def validate_filename(self, value):
+        name = os.path.basename(value)
+        if not name or name != value:
+            raise serializers.ValidationError("Invalid filename.")
+        return name
 
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be positive.")
+        if value > getattr(settings, "UPLOAD_MAX_SIZE", 50 * 1024 ** 3):
+            raise serializers.ValidationError("File is too large.")
+        return value
 
+    def validate_title(self, value):
+        if Video.objects.filter(title=value).exists():
+            raise serializers.ValidationError("A video with this title already exists.")
+        return value
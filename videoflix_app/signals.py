@@ -1,11 +1,13 @@
 import os
 from pathlib import Path
-from django.db.models.signals import post_save, post_delete 
+from django.db.models.signals import post_save, post_delete, post_migrate
 from django.dispatch import receiver
 from django.conf import settings
-import django_rq
+from .cache import invalidate_catalog, invalidate_playlists
 from .models import Video
-from .tasks import run_hls_pipeline, convert_to_hls, _generate_thumbnail
+from .search import install_search_backend, update_search_vector
+from .thumbnails import clear_cache
+from .tasks import enqueue_hls_pipeline, run_hls_pipeline, convert_to_hls, _generate_thumbnail, _video_source_path
 
 
 @receiver(post_save, sender=Video)
@@ -13,12 +15,30 @@ def video_post_save(sender, instance, created, **kwargs):
     """
     Enqueue HLS conversion when a new video is uploaded.
     """
+    invalidate_catalog()
     if created and instance.video_file:
-        file_path = os.path.join(settings.MEDIA_ROOT, 'video', os.path.basename(instance.video_file.name))
+        file_path = str(_video_source_path(instance))
         print(f"[SIGNAL] Queuing HLS pipeline for: {file_path}")
 
-        queue = django_rq.get_queue("default")
-        queue.enqueue(run_hls_pipeline, instance.id, file_path)
+        enqueue_hls_pipeline(instance.id, file_path)
+
+
+@receiver(post_save, sender=Video)
+def video_search_post_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the search document in sync with title and description.
+    """
+    if update_fields is None or {"title", "description"} & set(update_fields):
+        update_search_vector(instance.pk)
+
+
+@receiver(post_migrate)
+def video_search_post_migrate(sender, using="default", **kwargs):
+    """
+    Create the full-text search index (GIN on PostgreSQL, FTS5 on SQLite).
+    """
+    if sender.name == "videoflix_app":
+        install_search_backend(using)
 
 
 @receiver(post_delete, sender=Video)
@@ -26,10 +46,13 @@ def auto_delete_file_on_delete(sender, instance, **kwargs):
     """
     Deletes files from filesystem when the Video object is deleted.
     """
+    invalidate_catalog()
     if instance.video_file and instance.video_file.name:
         if os.path.isfile(instance.video_file.path):
             os.remove(instance.video_file.path)
 
+    invalidate_playlists(instance.id)
+    clear_cache(instance.id)
     hls_dir = Path(settings.MEDIA_ROOT) / "hls" / str(instance.id)
     if hls_dir.exists() and hls_dir.is_dir():
         for root, dirs, files in os.walk(hls_dir, topdown=False):
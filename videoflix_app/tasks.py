@@ -1,35 +1,239 @@
+import hashlib
+import json
+import math
 import os
+import re
 import subprocess
 import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
+from typing import NamedTuple
+import django_rq
 from django.conf import settings
 from django.core.files import File
-from .models import Video
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+from PIL import Image
+from rq import Retry
+from rq.job import Dependency
+from . import ffmpeg, thumbnails
+from .cache import invalidate_catalog, invalidate_playlists
+from .models import TranscodeJob, Video
 
 
 FFMPEG_BIN = "ffmpeg"  
+FFPROBE_BIN = "ffprobe"
 HLS_SEG_DUR = int(getattr(settings, "HLS_SEG_DUR", 4))
 
+# Full ladder, lowest first. The ladder of a video is the subset of it that
+# fits the source (see _select_ladder), with bitrates adapted to the content.
 RENDITIONS = [
     {"name": "480p", "scale": "854:480",  "bitrate": "800k"},
     {"name": "720p", "scale": "1280:720", "bitrate": "1400k"},
     {"name": "1080p","scale": "1920:1080","bitrate": "3000k"},
 ]
 
+# Named x264 encoding profiles (HLS_ENCODING_PROFILE, Video.encoding_profile).
+# maxrate/bufsize are multiples of the rung bitrate and cap the peaks either way.
+ENCODING_PROFILES = {
+    # Publish quickly: fast preset, VBR targeting the rung bitrate.
+    "fast-publish": {"preset": "veryfast", "maxrate": 1.5, "bufsize": 2.0},
+    # Background re-encodes of popular titles: constant quality, much better
+    # compression at several times the encode time.
+    "archive": {"preset": "slow", "crf": 21, "maxrate": 1.5, "bufsize": 3.0},
+}
+DEFAULT_PROFILE = "fast-publish"
+
+# HLS segment containers (HLS_SEGMENT_FORMAT, Video.segment_format):
+# - "ts": one MPEG-TS file per segment.
+# - "fmp4": CMAF, an init.mp4 plus one .m4s file per segment, no TS overhead.
+# - "fmp4-single": CMAF with all segments of a rendition in one .m4s file,
+#   addressed by #EXT-X-BYTERANGE, so a rendition is a handful of files.
+SEGMENT_FORMATS = ("ts", "fmp4", "fmp4-single")
+DEFAULT_SEGMENT_FORMAT = "ts"
+
+H264_PROFILES = {
+    "Constrained Baseline": (0x42, 0xE0),
+    "Baseline": (0x42, 0x00),
+    "Main": (0x4D, 0x40),
+    "High": (0x64, 0x00),
+}
+
+
+TRAILER_DURATION = 5
+# Seek preview sprite sheets and their WebVTT index, see _generate_sprites.
+SPRITES_DIR = "sprites"
+SPRITES_VTT = "thumbnails.vtt"
+
+# The TranscodeJob of the pipeline stage running in the current thread, see _track_stage.
+_current_stage = threading.local()
+
 
 def _run_ffmpeg(command: list[str]):
-    """Run an FFmpeg command and raise error on failure."""
-    
-    process = subprocess.run(
-        command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True
-    )
-    if process.returncode != 0:
-        raise RuntimeError(f"FFmpeg exited with code {process.returncode}")
+    """
+    Run an FFmpeg command and raise error (ffmpeg.FFmpegError) on failure.
+    Output is streamed, see ffmpeg.run. Inside a tracked stage the progress is
+    stored on its TranscodeJob together with the CPU time and peak RSS of the
+    process, and cancelling the TranscodeJob stops ffmpeg.
+    """
+    job = getattr(_current_stage, "job", None)
+    command = [command[0], "-nostats", "-progress", "pipe:1", *command[1:]]
+    usage = None
+    try:
+        usage = ffmpeg.run(command, partial(_report_progress, job) if job is not None else None)
+    except ffmpeg.FFmpegError as e:
+        usage = e.usage
+        raise
+    finally:
+        if job is not None and usage is not None:
+            _add_usage(job, usage)
+    return usage
+
+
+def _report_progress(job: TranscodeJob, progress: dict) -> bool:
+    """
+    Apply one `-progress` block to the job, saved at most every
+    HLS_PROGRESS_INTERVAL seconds. Returns False once the job was cancelled
+    or deleted (e.g. with its video), which stops ffmpeg.
+    """
+
+    try:
+        job.out_time_seconds = int(progress.get("out_time_us") or progress.get("out_time_ms")) / 1_000_000
+    except (TypeError, ValueError):
+        pass
+    try:
+        job.speed = float(progress.get("speed", "").rstrip("x"))
+    except ValueError:
+        pass
+
+    now = time.monotonic()
+    if now - job._reported_at < getattr(settings, "HLS_PROGRESS_INTERVAL", 5):
+        return True
+    job._reported_at = now
+    try:
+        return bool(TranscodeJob.objects.filter(pk=job.pk, status=TranscodeJob.Status.RUNNING)
+                    .update(out_time_seconds=job.out_time_seconds, speed=job.speed))
+    except DatabaseError as e:
+        print(f"Could not record transcode stage {job.stage} of video {job.video_id}: {e}")
+        return True
+
+
+def _add_usage(job: TranscodeJob, usage):
+    """Add the rusage of one finished ffmpeg process to the job (ru_maxrss is KiB on Linux, bytes on macOS)."""
+
+    job.cpu_seconds += usage.ru_utime + usage.ru_stime
+    rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    job.max_rss_bytes = max(job.max_rss_bytes, rss)
 
-    return process
+
+def _stage_duration(stage: str, duration: float | None,
+                    chunks: list[tuple[float, float | None]] | None = None) -> float | None:
+    """Media time a stage encodes, the denominator of its progress."""
+
+    if stage == "trailer":
+        return TRAILER_DURATION
+    if stage == "thumbnail":
+        return None
+    if "/chunk_" in stage and chunks and duration:
+        start, end = chunks[int(stage.rsplit("_", 1)[1])]
+        return (end or duration) - start
+    return duration
+
+
+def _stage_bytes(output_dir: Path, stage: str) -> int:
+    """Size of the files a stage wrote."""
+
+    if stage == "trailer":
+        paths = [output_dir / "trailer.mp4"]
+    elif stage == "thumbnail":
+        paths = [output_dir / "thumbnail.jpg", output_dir / thumbnails.VARIANTS_DIR]
+    elif stage == "renditions":
+        paths = ([p for p in output_dir.iterdir() if p.is_dir() and p.name not in (SPRITES_DIR, thumbnails.VARIANTS_DIR)]
+                 if output_dir.is_dir() else [])
+    else:
+        paths = [output_dir / stage]
+
+    total = 0
+    for path in paths:
+        if path.is_file():
+            total += path.stat().st_size
+        elif path.is_dir():
+            total += sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+    return total
+
+
+def _save_stage(job: TranscodeJob, fields: list[str] | None = None):
+    """Save a TranscodeJob; instrumentation must never fail the encode itself."""
+
+    try:
+        job.save(update_fields=fields)
+    except DatabaseError as e:
+        print(f"Could not record transcode stage {job.stage} of video {job.video_id}: {e}")
+
+
+@contextmanager
+def _track_stage(video_id: int, stage: str, output_dir: Path, duration: float | None = None):
+    """
+    Record a pipeline stage as a TranscodeJob: wall time, CPU time and peak
+    RSS of its ffmpeg processes, speed, progress and bytes written.
+    """
+    try:
+        job = TranscodeJob.objects.create(video_id=video_id, stage=stage, duration_seconds=duration) \
+            if Video.objects.filter(pk=video_id).exists() else None
+    except DatabaseError as e:
+        print(f"Could not record transcode stage {stage} of video {video_id}: {e}")
+        job = None
+    if job is None:
+        yield None
+        return
+
+    job._reported_at = time.monotonic()
+    _current_stage.job = job
+    started = time.monotonic()
+    try:
+        yield job
+        job.status = TranscodeJob.Status.DONE
+    except Exception as e:
+        cancelled = isinstance(e, ffmpeg.FFmpegError) and e.reason == "cancelled"
+        job.status = TranscodeJob.Status.CANCELLED if cancelled else TranscodeJob.Status.FAILED
+        job.error = str(e)[:2000]
+        raise
+    finally:
+        _current_stage.job = None
+        job.wall_seconds = time.monotonic() - started
+        job.finished_at = timezone.now()
+        job.bytes_written = _stage_bytes(output_dir, stage)
+        if job.status == TranscodeJob.Status.DONE and job.duration_seconds:
+            job.out_time_seconds = job.duration_seconds
+        # Only updates: a stage whose video was deleted meanwhile must not be re-inserted.
+        _save_stage(job, ["status", "error", "wall_seconds", "finished_at", "bytes_written", "out_time_seconds",
+                          "speed", "cpu_seconds", "max_rss_bytes"])
+
+
+def _run_tracked(video_id: int, stage: str, output_dir: Path, duration: float | None, job):
+    try:
+        with _track_stage(video_id, stage, output_dir, duration):
+            return job()
+    finally:
+        # Pool threads open their own database connection; don't leave it behind.
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+def _tracked_jobs(video_id: int, output_dir: Path, jobs: dict, duration: float | None = None,
+                  chunks: list[tuple[float, float | None]] | None = None) -> dict:
+    """Wrap pipeline jobs so each one is recorded as a TranscodeJob in the thread it runs in."""
+
+    return {
+        name: partial(_run_tracked, video_id, name, output_dir, _stage_duration(name, duration, chunks), job)
+        for name, job in jobs.items()
+    }
 
 
 def _rel_to_media(p: Path):
@@ -40,51 +244,845 @@ def _rel_to_media(p: Path):
     return os.path.relpath(p.as_posix(), settings.MEDIA_ROOT).replace("\\", "/")
 
 
-def _build_renditions(source: Path, output_dir: Path) -> list[tuple[Path, str, str]]:
-    """Generate HLS renditions (480p, 720p, 1080p)."""
+def _scale_filter(scale: str) -> str:
+    """Return the scale/pad filter used to fit a source into a rendition."""
+
+    width, height = scale.split(":")
+    return (f"scale=w={width}:h={height}:force_original_aspect_ratio=decrease,"
+            f"pad=w=ceil(iw/2)*2:h=ceil(ih/2)*2")
+
 
-    variant_playlists = []
+def _has_audio(source: Path) -> bool:
+    """
+    Check with ffprobe whether the source has an audio stream.
+    If probing fails, audio is assumed so that it is never dropped silently.
+    """
+    try:
+        process = subprocess.run(
+            [FFPROBE_BIN, "-v", "error", "-select_streams", "a",
+             "-show_entries", "stream=index", "-of", "csv=p=0", source.as_posix()],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+    except OSError:
+        return True
+    if process.returncode != 0:
+        return True
+    return bool(process.stdout.strip())
+
+
+def _probe_streams(path: Path) -> dict | None:
+    """Return ffprobe's JSON description (streams + format) of a media file, or None."""
+
+    try:
+        process = subprocess.run(
+            [FFPROBE_BIN, "-v", "error", "-show_entries",
+             "stream=codec_type,codec_name,profile,level,width,height,avg_frame_rate,bit_rate"
+             ":format=duration,bit_rate",
+             "-of", "json", path.as_posix()],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+        return json.loads(process.stdout) if process.returncode == 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def _frame_rate(rate: str | None) -> float | None:
+    """Convert ffprobe's "30000/1001" style frame rate to a float."""
+
+    try:
+        num, _, den = (rate or "").partition("/")
+        value = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return value or None
+
+
+def _probe_source(source: Path) -> dict | None:
+    """
+    Summarize the source's first video stream: width, height, fps, duration
+    and the video bitrate in bits/s (estimated from the container if needed).
+    """
+    info = _probe_streams(source)
+    if not info:
+        return None
+    video = next((s for s in info.get("streams", []) if s.get("codec_type") == "video"), None)
+    if not video or not video.get("width") or not video.get("height"):
+        return None
+
+    fmt = info.get("format", {})
+    bitrate = video.get("bit_rate") or fmt.get("bit_rate")
+    return {
+        "width": int(video["width"]),
+        "height": int(video["height"]),
+        "fps": _frame_rate(video.get("avg_frame_rate")),
+        "duration": float(fmt["duration"]) if fmt.get("duration") else None,
+        "bitrate": int(bitrate) if bitrate else None,
+    }
+
+
+def _select_ladder(probe: dict | None) -> list[dict]:
+    """
+    Pick the renditions for a source.
+
+    - Never upscale: renditions larger than the source are dropped; a source
+      smaller than the lowest rendition gets that rendition at its own size.
+    - High frame rates (> 30 fps) get 50% more bits.
+    - Static content (few bits per pixel in the source, e.g. slides or screen
+      recordings) gets HLS_STATIC_BITRATE_FACTOR of the nominal bitrate.
+    - No rendition gets more bits than the source video has.
+    """
+    if not probe or not getattr(settings, "HLS_ADAPTIVE_LADDER", True):
+        return [dict(r) for r in RENDITIONS]
+
+    src_w, src_h, fps = probe["width"], probe["height"], probe.get("fps") or 30
+    bits_per_pixel = None
+    if probe.get("bitrate"):
+        bits_per_pixel = probe["bitrate"] / (src_w * src_h * fps)
+    static = bits_per_pixel is not None and bits_per_pixel < getattr(settings, "HLS_STATIC_BPP", 0.03)
+
+    ladder = []
     for rendition in RENDITIONS:
-        stream_dir = output_dir / rendition["name"]
-        stream_dir.mkdir(parents=True, exist_ok=True)
+        box_w, box_h = (int(v) for v in rendition["scale"].split(":"))
+        rung = dict(rendition)
+        if min(box_w / src_w, box_h / src_h) > 1:
+            if ladder:
+                break
+            rung["scale"] = f"{src_w - src_w % 2}:{src_h - src_h % 2}"
 
-        playlist_path = stream_dir / "index.m3u8"
-        scale = rendition["scale"]
-        bitrate = rendition["bitrate"]
-        width, height = scale.split(":")
+        kbps = int(rendition["bitrate"].rstrip("k"))
+        if fps > 30:
+            kbps = kbps * 3 // 2
+        if static:
+            kbps = int(kbps * getattr(settings, "HLS_STATIC_BITRATE_FACTOR", 0.6))
+        if probe.get("bitrate"):
+            kbps = min(kbps, probe["bitrate"] // 1000)
+        rung["bitrate"] = f"{max(kbps, 100)}k"
+        if probe.get("fps"):
+            rung["fps"] = round(probe["fps"], 3)
+        ladder.append(rung)
+    return ladder
 
-        command = [
-            FFMPEG_BIN,
-            "-i", source.as_posix(),
-            "-vf", f"scale=w={width}:h={height}:force_original_aspect_ratio=decrease,"
-                   f"pad=w=ceil(iw/2)*2:h=ceil(ih/2)*2",
-            "-c:v", "libx264",
-            "-c:a", "aac",          
-            "-b:v", bitrate,
-            "-hls_time", str(HLS_SEG_DUR),
-            "-hls_list_size", "0",
-            "-hls_segment_filename", f"{stream_dir.as_posix()}/segment_%03d.ts",
-            "-f", "hls",
-            playlist_path.as_posix()
-        ]
+
+def _plan_ladder(video_id: int, source: Path) -> list[dict]:
+    """Analyse the source, choose its ladder and store it on the Video."""
+
+    ladder = _select_ladder(_probe_source(source))
+    Video.objects.filter(pk=video_id).update(ladder=ladder)
+    return ladder
+
+
+def _video_ladder(video: Video | None) -> list[dict]:
+    """Return the ladder stored for a video, or the full ladder for older videos."""
+
+    return (video.ladder if video and video.ladder else None) or [dict(r) for r in RENDITIONS]
+
+
+def _ladder_of(video_id: int) -> list[dict]:
+    return _video_ladder(Video.objects.filter(pk=video_id).first())
+
+
+def _profile_name(video: Video | None = None) -> str:
+    """The encoding profile of a video, HLS_ENCODING_PROFILE if it has none."""
+
+    name = (video.encoding_profile if video else "") or getattr(settings, "HLS_ENCODING_PROFILE", DEFAULT_PROFILE)
+    return name if name in ENCODING_PROFILES else DEFAULT_PROFILE
+
+
+def _segment_format(video: Video | None = None) -> str:
+    """The segment format of a video, HLS_SEGMENT_FORMAT if it has none."""
+
+    name = (video.segment_format if video else "") or getattr(settings, "HLS_SEGMENT_FORMAT", DEFAULT_SEGMENT_FORMAT)
+    return name if name in SEGMENT_FORMATS else DEFAULT_SEGMENT_FORMAT
+
+
+def _segment_args(directory: str, segment_format: str | None) -> list[str]:
+    """HLS muxer options writing the segments of one rendition into `directory`."""
+
+    segment_format = segment_format or _segment_format()
+    if segment_format == "ts":
+        return ["-hls_segment_filename", f"{directory}/segment_%03d.ts"]
+
+    args = ["-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4"]
+    if segment_format == "fmp4-single":
+        return args + ["-hls_flags", "single_file", "-hls_segment_filename", f"{directory}/media.m4s"]
+    return args + ["-hls_segment_filename", f"{directory}/segment_%03d.m4s"]
+
+
+def _rate_control_args(rendition: dict, profile: str | None, index: int | None = None) -> list[str]:
+    """
+    Rate control of one video stream; `index` addresses stream v:<index> of a
+    single-pass encode. The rung bitrate is the VBR target (or, with CRF, only
+    the reference for the caps), -maxrate/-bufsize bound the peaks.
+    """
+    options = ENCODING_PROFILES[profile or _profile_name()]
+    spec = f":v:{index}" if index is not None else ""
+    kbps = int(rendition["bitrate"].rstrip("k"))
+
+    if "crf" in options:
+        args = [f"-crf{spec}", str(options["crf"])]
+    else:
+        args = [f"-b:v{':' + str(index) if index is not None else ''}", rendition["bitrate"]]
+    return args + [
+        f"-maxrate{spec}", f"{int(kbps * options['maxrate'])}k",
+        f"-bufsize{spec}", f"{int(kbps * options['bufsize'])}k",
+    ]
+
+
+def _gop_args(rendition: dict) -> list[str]:
+    """
+    Closed GOPs of exactly HLS_SEG_DUR seconds without scene-cut keyframes, so
+    every rendition (and every chunk) cuts its segments at the same timestamps.
+    """
+    if rendition.get("fps"):
+        gop = str(max(1, round(rendition["fps"] * HLS_SEG_DUR)))
+        return ["-g", gop, "-keyint_min", gop, "-sc_threshold", "0"]
+    return ["-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEG_DUR})", "-sc_threshold", "0"]
+
+
+def _encoder_args(profile: str | None) -> list[str]:
+    return ["-c:v", "libx264", "-preset", ENCODING_PROFILES[profile or _profile_name()]["preset"], "-c:a", "aac"]
+
+
+def _staging_path(stream_dir: Path) -> Path:
+    return stream_dir.with_name(f".{stream_dir.name}.encoding")
+
+
+def _staging_dir(stream_dir: Path) -> Path:
+    """Fresh sibling directory an encode writes to before it replaces stream_dir."""
+
+    staging = _staging_path(stream_dir)
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    return staging
+
+
+def _swap_into_place(staging: Path, stream_dir: Path):
+    """
+    Replace stream_dir by a finished encode with two renames. While a video is
+    re-encoded (e.g. with another profile) its old rendition stays playable,
+    and segments are aligned identically, so players switch over seamlessly.
+    """
+    old = stream_dir.with_name(f".{stream_dir.name}.old")
+    shutil.rmtree(old, ignore_errors=True)
+    if stream_dir.exists():
+        os.replace(stream_dir, old)
+    os.replace(staging, stream_dir)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _build_renditions(source: Path, output_dir: Path, ladder: list[dict] | None = None,
+                      profile: str | None = None, segment_format: str | None = None) -> list[tuple[Path, str, str]]:
+    """
+    Generate HLS renditions (480p, 720p, 1080p or the given ladder).
+    Uses a single ffmpeg pass when HLS_ENCODE_MODE is "single_pass" and falls
+    back to one ffmpeg process per rendition otherwise or if that pass fails.
+    A pass that timed out, was cancelled or interrupted is not retried.
+    """
+    ladder = ladder or RENDITIONS
+
+    if getattr(settings, "HLS_ENCODE_MODE", "single_pass") == "single_pass":
+        try:
+            return _build_renditions_single_pass(source, output_dir, ladder, profile, segment_format)
+        except RuntimeError as e:
+            if isinstance(e, ffmpeg.FFmpegError) and e.reason:
+                raise
+            print(f"Single-pass encode failed, falling back to per-rendition encode: {e}")
+
+    return [_build_rendition(source, output_dir, rendition, profile, segment_format) for rendition in ladder]
+
+
+def _build_rendition(source: Path, output_dir: Path, rendition: dict,
+                     profile: str | None = None, segment_format: str | None = None) -> tuple[Path, str, str]:
+    """Generate a single HLS rendition with its own ffmpeg process."""
+
+    stream_dir = output_dir / rendition["name"]
+    playlist_path = _encode_rendition(source, stream_dir, rendition, profile=profile, segment_format=segment_format)
+    return playlist_path, rendition["scale"], rendition["bitrate"]
+
+
+def _encode_rendition(source: Path, stream_dir: Path, rendition: dict,
+                      start: float | None = None, end: float | None = None, profile: str | None = None,
+                      segment_format: str | None = None) -> Path:
+    """
+    Encode one rendition (or the [start, end) time range of it) to HLS in stream_dir.
+    Timestamps of a range are offset by `start` so ranges can be stitched together.
+    The encode is written next to stream_dir and only then swapped in.
+    """
+    staging = _staging_dir(stream_dir)
+
+    command = [FFMPEG_BIN, "-y"]
+    if start is not None:
+        command += ["-ss", f"{start:.3f}"]
+    if end is not None:
+        command += ["-to", f"{end:.3f}"]
+    command += [
+        "-i", source.as_posix(),
+        "-vf", _scale_filter(rendition["scale"]),
+        *_encoder_args(profile),
+        *_rate_control_args(rendition, profile),
+        *_gop_args(rendition),
+    ]
+    if start:
+        command += ["-output_ts_offset", f"{start:.3f}"]
+    command += [
+        "-hls_time", str(HLS_SEG_DUR),
+        "-hls_list_size", "0",
+        *_segment_args(staging.as_posix(), segment_format),
+        "-f", "hls",
+        (staging / "index.m3u8").as_posix()
+    ]
+    try:
         _run_ffmpeg(command)
-        variant_playlists.append((playlist_path, rendition['scale'], bitrate))
-    
-    return variant_playlists
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _swap_into_place(staging, stream_dir)
+    return stream_dir / "index.m3u8"
+
+
+def _build_renditions_single_pass(source: Path, output_dir: Path, ladder: list[dict] | None = None,
+                                  profile: str | None = None,
+                                  segment_format: str | None = None) -> list[tuple[Path, str, str]]:
+    """
+    Generate all renditions with one ffmpeg invocation. The source is decoded
+    once and split into one scaled stream per rendition, which -var_stream_map
+    writes into the same <rendition>/index.m3u8 layout as the per-rendition loop.
+    """
+
+    ladder = ladder or RENDITIONS
+    with_audio = _has_audio(source)
+    count = len(ladder)
+
+    split = f"[0:v]split={count}" + "".join(f"[v{i}]" for i in range(count))
+    scaled = [f"[v{i}]{_scale_filter(r['scale'])}[v{i}out]" for i, r in enumerate(ladder)]
+
+    staging = _staging_dir(output_dir / "renditions")
+    command = [
+        FFMPEG_BIN, "-y",
+        "-i", source.as_posix(),
+        "-filter_complex", ";".join([split, *scaled]),
+    ]
+    stream_map = []
+    for i, rendition in enumerate(ladder):
+        (staging / rendition["name"]).mkdir()
+        command += ["-map", f"[v{i}out]"]
+        if with_audio:
+            command += ["-map", "0:a:0"]
+        command += _rate_control_args(rendition, profile, i)
+        stream_map.append(f"v:{i},a:{i},name:{rendition['name']}" if with_audio
+                          else f"v:{i},name:{rendition['name']}")
+
+    command += [
+        *_encoder_args(profile),
+        *_gop_args(ladder[0]),
+        "-hls_time", str(HLS_SEG_DUR),
+        "-hls_list_size", "0",
+        *_segment_args(f"{staging.as_posix()}/%v", segment_format),
+        "-var_stream_map", " ".join(stream_map),
+        "-f", "hls",
+        f"{staging.as_posix()}/%v/index.m3u8"
+    ]
+    try:
+        _run_ffmpeg(command)
+        for rendition in ladder:
+            _swap_into_place(staging / rendition["name"], output_dir / rendition["name"])
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    return [
+        (output_dir / r["name"] / "index.m3u8", r["scale"], r["bitrate"])
+        for r in ladder
+    ]
+
+
+def _probe_duration(source: Path) -> float | None:
+    """Return the source duration in seconds, or None if ffprobe cannot tell."""
+
+    try:
+        process = subprocess.run(
+            [FFPROBE_BIN, "-v", "error", "-show_entries", "format=duration",
+             "-of", "csv=p=0", source.as_posix()],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+        return float(process.stdout.strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _probe_keyframes(source: Path) -> list[float]:
+    """
+    Return the timestamps of all video keyframes. Only packet headers are
+    read (no decoding), so this is fast even for long sources.
+    """
+    try:
+        process = subprocess.run(
+            [FFPROBE_BIN, "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", source.as_posix()],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+    except OSError:
+        return []
+
+    keyframes = []
+    for line in process.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                keyframes.append(float(pts_time))
+            except ValueError:
+                continue
+    return sorted(keyframes)
+
+
+def _chunk_ranges(duration: float, keyframes: list[float], count: int) -> list[tuple[float, float | None]]:
+    """
+    Split [0, duration) into at most `count` time ranges of similar length.
+    Every boundary is moved to the nearest keyframe so each range starts on one.
+    The last range is open-ended (None) so nothing at the end is cut off.
+    """
+    boundaries = [0.0]
+    for i in range(1, count):
+        target = duration * i / count
+        nearest = min(keyframes, key=lambda t: abs(t - target)) if keyframes else target
+        if nearest > boundaries[-1]:
+            boundaries.append(nearest)
+    return [
+        (start, boundaries[i + 1] if i + 1 < len(boundaries) else None)
+        for i, start in enumerate(boundaries)
+    ]
+
+
+def _plan_chunks(source: Path, duration: float | None = None) -> list[tuple[float, float | None]] | None:
+    """
+    Return the time ranges for chunked transcoding, or None if the source is
+    too short for HLS_CHUNK_MIN_DURATION or cannot be probed.
+    """
+    duration = duration or _probe_duration(source)
+    if not duration or duration < getattr(settings, "HLS_CHUNK_MIN_DURATION", 600):
+        return None
+
+    count = int(getattr(settings, "HLS_CHUNK_COUNT", None) or os.cpu_count() or 1)
+    ranges = _chunk_ranges(duration, _probe_keyframes(source), count)
+    return ranges if len(ranges) > 1 else None
+
+
+def _chunk_dir(output_dir: Path, rendition: dict, index: int) -> Path:
+    # Chunks are encoded into the rendition's staging directory and stitched
+    # there; the live rendition is only replaced by the finished result.
+    return _staging_path(output_dir / rendition["name"]) / f"chunk_{index:03d}"
+
+
+def _build_rendition_chunk(source: Path, output_dir: Path, rendition: dict, index: int,
+                           start: float, end: float | None, profile: str | None = None,
+                           segment_format: str | None = None) -> Path:
+    """Encode one time range of a rendition into its own chunk directory."""
+
+    return _encode_rendition(source, _chunk_dir(output_dir, rendition, index), rendition, start, end, profile,
+                             segment_format)
+
+
+class MediaSegment(NamedTuple):
+    duration: float
+    uri: str
+    # (length, offset) of #EXT-X-BYTERANGE, None for a whole file.
+    byterange: tuple[int, int] | None = None
+    # (uri, byterange) of the #EXT-X-MAP init segment (fMP4), None for TS.
+    init: tuple[str, tuple[int, int] | None] | None = None
+
+
+_MAP_RE = re.compile(r'URI="([^"]+)"(?:.*BYTERANGE="(\d+)(?:@(\d+))?")?')
+
+
+def _read_segments(playlist_path: Path) -> list[MediaSegment]:
+    """Parse every segment of a media playlist, with its byte range and init segment."""
+
+    segments = []
+    duration = byterange = init = None
+    # A byte range without @offset starts where the previous range of the same file ended.
+    next_offset = {}
+    for line in playlist_path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:"):].split(",")[0])
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            length, _, offset = line[len("#EXT-X-BYTERANGE:"):].partition("@")
+            byterange = (int(length), int(offset) if offset else None)
+        elif line.startswith("#EXT-X-MAP:"):
+            match = _MAP_RE.search(line)
+            if match:
+                init_range = (int(match.group(2)), int(match.group(3) or 0)) if match.group(2) else None
+                init = (match.group(1), init_range)
+        elif line and not line.startswith("#") and duration is not None:
+            if byterange:
+                length, offset = byterange
+                offset = next_offset.get(line, 0) if offset is None else offset
+                byterange = (length, offset)
+                next_offset[line] = offset + length
+            segments.append(MediaSegment(duration, line, byterange, init))
+            duration = byterange = None
+    return segments
+
+
+def _read_media_playlist(playlist_path: Path) -> list[tuple[float, str]]:
+    """Return (duration, uri) for every segment of a media playlist."""
+
+    return [(segment.duration, segment.uri) for segment in _read_segments(playlist_path)]
+
+
+def _write_media_playlist(playlist_path: Path, segments: list[MediaSegment]):
+    """Write a VOD media playlist; fMP4 init segments and byte ranges as #EXT-X-MAP / #EXT-X-BYTERANGE."""
+
+    version = 6 if any(s.init for s in segments) else 4 if any(s.byterange for s in segments) else 3
+    target = max((math.ceil(s.duration) for s in segments), default=HLS_SEG_DUR)
+    with playlist_path.open("w", encoding="utf-8") as m3u8:
+        m3u8.write(f"#EXTM3U\n#EXT-X-VERSION:{version}\n")
+        m3u8.write(f"#EXT-X-TARGETDURATION:{target}\n")
+        m3u8.write("#EXT-X-MEDIA-SEQUENCE:0\n#EXT-X-PLAYLIST-TYPE:VOD\n")
+        if version > 3:
+            m3u8.write("#EXT-X-INDEPENDENT-SEGMENTS\n")
+        init = None
+        for segment in segments:
+            if segment.init and segment.init != init:
+                init = segment.init
+                byterange = f',BYTERANGE="{init[1][0]}@{init[1][1]}"' if init[1] else ""
+                m3u8.write(f'#EXT-X-MAP:URI="{init[0]}"{byterange}\n')
+            m3u8.write(f"#EXTINF:{segment.duration:.6f},\n")
+            if segment.byterange:
+                m3u8.write(f"#EXT-X-BYTERANGE:{segment.byterange[0]}@{segment.byterange[1]}\n")
+            m3u8.write(f"{segment.uri}\n")
+        m3u8.write("#EXT-X-ENDLIST\n")
+
+
+def _stitch_chunks(stream_dir: Path, chunk_count: int) -> Path:
+    """
+    Join the chunk playlists of one rendition into a continuous index.m3u8.
+    Segments are moved (not copied) out of the chunk directories and renumbered
+    so the media sequence runs from 0 without gaps. Single-file fMP4 chunks
+    keep one media file per chunk (their byte ranges stay valid), and fMP4
+    init segments are shared between chunks whenever they are identical.
+    Stitching happens in the staging directory the chunks were encoded to,
+    which then replaces stream_dir (_swap_into_place): files of the previous
+    encode, possibly hardlinked to another video's, are never written to.
+    """
+    source_dir = _staging_path(stream_dir)
+    chunk_dirs = [source_dir / f"chunk_{i:03d}" for i in range(chunk_count)]
+    for chunk_dir in chunk_dirs:
+        if not _rendition_finished(chunk_dir / "index.m3u8"):
+            raise RuntimeError(f"Chunk {chunk_dir} is not finished")
+
+    entries = []
+    inits = []
+    for index, chunk_dir in enumerate(chunk_dirs):
+        names = {}
+        for segment in _read_segments(chunk_dir / "index.m3u8"):
+            if segment.uri not in names:
+                uri = Path(segment.uri)
+                name = (f"{uri.stem}_{index:03d}{uri.suffix}" if segment.byterange
+                        else f"segment_{len(entries):03d}{uri.suffix}")
+                os.replace(chunk_dir / segment.uri, source_dir / name)
+                names[segment.uri] = name
+            init = segment.init
+            if init:
+                if init[0] not in names:
+                    names[init[0]] = _stitch_init(chunk_dir / init[0], source_dir, index, inits)
+                init = (names[init[0]], init[1])
+            entries.append(segment._replace(uri=names[segment.uri], init=init))
+        shutil.rmtree(chunk_dir)
+
+    _write_media_playlist(source_dir / "index.m3u8", entries)
+    # Chunks of an earlier run that was split differently, or left by a crashed encode.
+    for path in source_dir.iterdir():
+        if path.is_dir():
+            shutil.rmtree(path)
+    _swap_into_place(source_dir, stream_dir)
+    return stream_dir / "index.m3u8"
+
+
+def _stitch_init(init_path: Path, source_dir: Path, index: int, inits: list[str]) -> str:
+    """Move a chunk's init segment next to the stitched segments, reusing an identical one."""
+
+    init_bytes = init_path.read_bytes()
+    for name in inits:
+        if (source_dir / name).read_bytes() == init_bytes:
+            return name
+    name = init_path.name if not inits else f"{init_path.stem}_{index:03d}{init_path.suffix}"
+    os.replace(init_path, source_dir / name)
+    inits.append(name)
+    return name
+
+
+def _file_sha256(path: Path) -> str:
+    """Hash a file in 1 MB blocks so large sources are never loaded into memory."""
+
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_hash(video: Video, source: Path) -> str:
+    """
+    Return the SHA-256 of the video's source file. The hash is stored on the
+    Video together with the file's size and mtime, and only recomputed when
+    those change, so checking an unchanged library stays cheap.
+    """
+    stat = source.stat()
+    signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+    if video.source_hash and video.source_signature == signature:
+        return video.source_hash
+
+    video.source_hash = _file_sha256(source)
+    video.source_signature = signature
+    if video.pk:
+        Video.objects.filter(pk=video.pk).update(source_hash=video.source_hash,
+                                                 source_signature=signature)
+    return video.source_hash
+
+
+def _encoder_params(profile: str | None = None, segment_format: str | None = None) -> dict:
+    """Encoder settings shared by all renditions; part of every rendition fingerprint."""
+
+    profile = profile or _profile_name()
+    params = {"video_codec": "libx264", "audio_codec": "aac", "segment_duration": HLS_SEG_DUR,
+              "gop": "segment-aligned", "profile": profile, **ENCODING_PROFILES[profile]}
+    segment_format = segment_format or _segment_format()
+    if segment_format != "ts":
+        # Only set for fMP4, so existing TS renditions keep their fingerprints.
+        params["segment_format"] = segment_format
+    return params
+
+
+def _rendition_fingerprint(source_hash: str, rendition: dict, profile: str | None = None,
+                           segment_format: str | None = None) -> str:
+    """Fingerprint of everything that determines a rendition's output."""
+
+    payload = {"source": source_hash, "rendition": rendition, "encoder": _encoder_params(profile, segment_format)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _video_source_path(video: Video) -> Path | None:
+    """Return the path of the uploaded source file of a video, if it has one."""
+
+    if not video.video_file:
+        return None
+    return Path(settings.MEDIA_ROOT) / "video" / os.path.basename(video.video_file.name)
+
+
+def _record_fingerprints(video_id: int, source: Path, names: list[str]):
+    """
+    Store the fingerprints of the renditions that were just encoded. The row
+    is locked, stage jobs of one video record theirs concurrently.
+    """
+    if not names:
+        return
+    with transaction.atomic():
+        video = Video.objects.select_for_update().filter(pk=video_id).first()
+        if video is None:
+            return
+        source_hash = _source_hash(video, source)
+        fingerprints = dict(video.rendition_fingerprints or {})
+        for rendition in _video_ladder(video):
+            if rendition["name"] in names:
+                fingerprints[rendition["name"]] = _rendition_fingerprint(source_hash, rendition, _profile_name(video),
+                                                                         _segment_format(video))
+        Video.objects.filter(pk=video_id).update(rendition_fingerprints=fingerprints)
+
+
+def missing_renditions(video: Video) -> list[str]:
+    """Return the names of the renditions that have no finished output on disk."""
+
+    output_dir = _hls_output_dir(video.pk)
+    return [r["name"] for r in _video_ladder(video)
+            if not _rendition_finished(output_dir / r["name"] / "index.m3u8")]
+
+
+def stale_renditions(video: Video) -> list[str]:
+    """
+    Return the names of the renditions that have to be re-encoded: missing
+    output, or a fingerprint that no longer matches the source and ladder.
+    """
+    source = _video_source_path(video)
+    if source is None or not source.exists():
+        return []
+
+    source_hash = _source_hash(video, source)
+    missing = set(missing_renditions(video))
+    fingerprints = video.rendition_fingerprints or {}
+    profile, segment_format = _profile_name(video), _segment_format(video)
+    return [
+        r["name"] for r in _video_ladder(video)
+        if r["name"] in missing
+        or fingerprints.get(r["name"]) != _rendition_fingerprint(source_hash, r, profile, segment_format)
+    ]
+
+
+def _link_tree(source_dir: Path, target_dir: Path):
+    """Recreate the files of source_dir in target_dir as hardlinks (copies across filesystems)."""
+
+    for path in source_dir.rglob("*"):
+        if path.is_dir():
+            continue
+        target = target_dir / path.relative_to(source_dir)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.unlink(missing_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copy2(path, target)
+
+
+def _encoded_duplicate(video: Video, source_hash: str) -> Video | None:
+    """
+    Return another video of the same source whose whole ladder is encoded
+    with the profile and segment format requested for `video`.
+    """
+    profile, segment_format = _profile_name(video), _segment_format(video)
+    candidates = (Video.objects.filter(source_hash=source_hash, processing_status=Video.ProcessingStatus.READY)
+                  .exclude(pk=video.pk).order_by("id"))
+    for donor in candidates:
+        fingerprints = donor.rendition_fingerprints or {}
+        if not (_hls_output_dir(donor.pk) / "master.m3u8").exists() or missing_renditions(donor):
+            continue
+        if all(fingerprints.get(r["name"]) == _rendition_fingerprint(source_hash, r, profile, segment_format)
+               for r in _video_ladder(donor)):
+            return donor
+    return None
+
+
+def reuse_duplicate_encode(video_id: int, source: Path) -> bool:
+    """
+    Content-addressed ingest: if a source with the same SHA-256 already has
+    up-to-date HLS output, hardlink its hls/<id> tree for this video and
+    publish it instead of encoding again. Returns True if output was reused.
+    Only for the first encode of an upload: a video that was published or
+    encoded before is re-encoded on purpose (new profile, --force).
+    """
+    if not getattr(settings, "HLS_DEDUPLICATE_SOURCES", True) or not source.exists():
+        return False
+    video = Video.objects.filter(pk=video_id).first()
+    if video is None or video.hls_master or video.rendition_fingerprints:
+        return False
+
+    source_hash = _source_hash(video, source)
+    donor = _encoded_duplicate(video, source_hash)
+    if donor is None:
+        return False
+
+    output_dir = _hls_output_dir(video_id)
+    _link_tree(_hls_output_dir(donor.pk), output_dir)
+    Video.objects.filter(pk=video_id).update(ladder=donor.ladder, rendition_fingerprints=donor.rendition_fingerprints)
+    _publish(video_id, output_dir / "master.m3u8", output_dir / "trailer.mp4", output_dir / "thumbnail.jpg",
+             _completed_renditions(output_dir, _video_ladder(donor)))
+    print(f"[HLS] Reused the encode of video {donor.pk} for identical source of video {video_id}")
+    return True
+
+
+def _rendition_finished(playlist_path: Path) -> bool:
+    """A rendition is complete once ffmpeg has written #EXT-X-ENDLIST."""
+
+    try:
+        return "#EXT-X-ENDLIST" in playlist_path.read_text(encoding="utf-8")
+    except OSError:
+        return False
+
+
+def _completed_renditions(output_dir: Path, ladder: list[dict] | None = None) -> list[tuple[Path, str, str]]:
+    """Return the variant tuples of all renditions already finished on disk, in ladder order."""
+
+    return [
+        (output_dir / r["name"] / "index.m3u8", r["scale"], r["bitrate"])
+        for r in ladder or RENDITIONS
+        if _rendition_finished(output_dir / r["name"] / "index.m3u8")
+    ]
+
+
+def _codec_string(stream: dict) -> str | None:
+    """RFC 6381 codec string of an ffprobe stream (avc1.PPCCLL / mp4a.40.x)."""
+
+    if stream.get("codec_name") == "h264":
+        profile, constraints = H264_PROFILES.get(stream.get("profile"), (0x64, 0x00))
+        level = stream.get("level") or 40
+        return f"avc1.{profile:02x}{constraints:02x}{level:02x}"
+    if stream.get("codec_name") == "aac":
+        return "mp4a.40.5" if stream.get("profile") == "HE-AAC" else "mp4a.40.2"
+    return None
+
+
+def _measure_variant(playlist_path: Path) -> dict | None:
+    """
+    Measure an encoded rendition: peak and average segment bitrate from the
+    segment sizes (or byte ranges), plus codecs, resolution and frame rate of
+    its first segment - of its init segment for fMP4, which holds the track headers.
+    """
+    if not playlist_path.exists():
+        return None
+    segments = [
+        segment for segment in _read_segments(playlist_path)
+        if segment.duration > 0 and (playlist_path.parent / segment.uri).exists()
+    ]
+    if not segments:
+        return None
+
+    sizes = [s.byterange[0] if s.byterange else (playlist_path.parent / s.uri).stat().st_size for s in segments]
+    rates = [size * 8 / segment.duration for size, segment in zip(sizes, segments)]
+    measured = {
+        "peak": int(max(rates)),
+        "average": int(sum(sizes) * 8 / sum(segment.duration for segment in segments)),
+    }
+
+    first = segments[0]
+    info = _probe_streams(playlist_path.parent / (first.init[0] if first.init else first.uri)) or {}
+    streams = info.get("streams", [])
+    codecs = [c for c in (_codec_string(s) for s in streams) if c]
+    if codecs:
+        measured["codecs"] = ",".join(codecs)
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video and video.get("width") and video.get("height"):
+        measured["resolution"] = f"{video['width']}x{video['height']}"
+        fps = _frame_rate(video.get("avg_frame_rate"))
+        if fps:
+            measured["frame_rate"] = f"{fps:.3f}"
+    return measured
 
 
 def _write_master_playlist(output: Path, variant_playlists: list[tuple [Path, str, str]]):
-    """Write the master.m3u8 playlist pointing to all renditions."""
+    """
+    Write the master.m3u8 playlist pointing to all renditions.
+    BANDWIDTH, AVERAGE-BANDWIDTH, CODECS, RESOLUTION and FRAME-RATE are measured
+    from the encoded segments; the nominal ladder values are used if that fails.
+    The file is replaced atomically, players never see a half written master.
+    """
 
     master_path = output / "master.m3u8"
-    with master_path.open("w", encoding="utf-8") as m3u8:
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=output, suffix=".tmp", delete=False) as m3u8:
+        tmp_path = m3u8.name
         m3u8.write("#EXTM3U\n")
         for playlist_path, scale, bitrate in variant_playlists:
             w, h = scale.split(":")
-            bw_int = int(bitrate.rstrip("k")) * 1000
-            m3u8.write(f"#EXT-X-STREAM-INF:BANDWIDTH={bw_int},RESOLUTION={w}x{h}\n")
+            measured = _measure_variant(playlist_path) or {}
+            attributes = [
+                f"BANDWIDTH={measured.get('peak') or int(bitrate.rstrip('k')) * 1000}",
+            ]
+            if measured.get("average"):
+                attributes.append(f"AVERAGE-BANDWIDTH={measured['average']}")
+            if measured.get("codecs"):
+                attributes.append(f'CODECS="{measured["codecs"]}"')
+            attributes.append(f"RESOLUTION={measured.get('resolution') or f'{w}x{h}'}")
+            if measured.get("frame_rate"):
+                attributes.append(f"FRAME-RATE={measured['frame_rate']}")
+            m3u8.write(f"#EXT-X-STREAM-INF:{','.join(attributes)}\n")
             rel = playlist_path.relative_to(output)
             m3u8.write(f"{rel.as_posix()}\n")
+    os.replace(tmp_path, master_path)
     return master_path
 
 
@@ -92,10 +1090,11 @@ def _generate_trailer(source: Path, output_dir: Path):
     """Generate a trailer."""
     
     trailer_path = output_dir / "trailer.mp4"
+    trailer_path.unlink(missing_ok=True)
     _run_ffmpeg([
         FFMPEG_BIN, "-y",
         "-i", source.as_posix(),
-        "-ss", "00:00:05", "-t", "5",
+        "-ss", "00:00:05", "-t", str(TRAILER_DURATION),
         "-c:v", "libx264", "-c:a", "aac",
         trailer_path.as_posix()
     ])
@@ -104,12 +1103,14 @@ def _generate_trailer(source: Path, output_dir: Path):
 
 def _generate_thumbnail(source: Path, output_dir: Path):
     """
-    Generate a thumbnail image from the video at the given timestamp.
+    Generate a thumbnail image from the video at the given timestamp, plus its
+    width-bucketed WebP/AVIF variants (see thumbnails.py).
     If generation fails, use fallback image.
     """
     output_dir.mkdir(parents=True, exist_ok=True)
 
     thumb_path = output_dir / "thumbnail.jpg"
+    thumb_path.unlink(missing_ok=True)
     fallback_path = Path(settings.BASE_DIR) / "static" / "fallback_thumbnail.jpg"
 
     try:
@@ -128,16 +1129,253 @@ def _generate_thumbnail(source: Path, output_dir: Path):
             print(f"Fallback thumbnail copy failed: {copy_error}")
             return fallback_path  
 
+    if thumb_path.exists():
+        try:
+            thumbnails.generate_variants(thumb_path)
+        except Exception as e:
+            print(f"Thumbnail variant generation failed: {e}")
     return thumb_path if thumb_path.exists() else fallback_path
 
 
-def run_hls_pipeline(video_id, source_path):
+def _sprites_enabled() -> bool:
+    return getattr(settings, "HLS_SPRITES", True)
+
+
+def _vtt_timestamp(seconds: float) -> str:
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def _write_sprites_vtt(vtt_path: Path, sheets: list[str], tile: tuple[int, int], columns: int, rows: int,
+                       interval: float, duration: float | None):
+    """
+    Write the WebVTT index of the sprite sheets: one cue per thumbnail whose
+    payload is "<sheet>#xywh=x,y,w,h" (media fragment), as used by video.js,
+    Plyr and others for seek previews.
+    """
+    per_sheet = columns * rows
+    count = len(sheets) * per_sheet
+    if duration:
+        count = min(count, math.ceil(duration / interval))
+    width, height = tile
+
+    with vtt_path.open("w", encoding="utf-8") as vtt:
+        vtt.write("WEBVTT\n")
+        for index in range(count):
+            start = index * interval
+            end = (index + 1) * interval
+            if duration:
+                end = min(end, duration)
+            position = index % per_sheet
+            x, y = position % columns * width, position // columns * height
+            vtt.write(f"\n{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}\n")
+            vtt.write(f"{sheets[index // per_sheet]}#xywh={x},{y},{width},{height}\n")
+
+
+def _generate_sprites(source: Path, output_dir: Path, duration: float | None = None) -> Path:
+    """
+    Generate the seek preview of a video: one frame every HLS_SPRITE_INTERVAL
+    seconds, tiled into sprite sheets of HLS_SPRITE_GRID ("<columns>x<rows>")
+    thumbnails in a single ffmpeg pass (fps + tile filters, no per-frame
+    seeks), plus sprites/thumbnails.vtt mapping time ranges to sheet regions.
+    The sheets are re-encoded as WebP with Pillow if HLS_SPRITE_FORMAT is "webp".
+    """
+    interval = float(getattr(settings, "HLS_SPRITE_INTERVAL", 10))
+    width = int(getattr(settings, "HLS_SPRITE_WIDTH", 160))
+    columns, rows = (int(n) for n in getattr(settings, "HLS_SPRITE_GRID", "10x10").lower().split("x"))
+
+    sprites_dir = output_dir / SPRITES_DIR
+    staging = _staging_dir(sprites_dir)
+    try:
+        _run_ffmpeg([
+            FFMPEG_BIN, "-y",
+            "-i", source.as_posix(),
+            "-an", "-sn",
+            "-vf", f"fps=1/{interval:g},scale={width}:-2,tile={columns}x{rows}",
+            "-q:v", "4",
+            f"{staging.as_posix()}/sprite_%03d.jpg",
+        ])
+        sheets = sorted(staging.glob("sprite_*.jpg"))
+        if not sheets:
+            raise RuntimeError(f"No sprite sheets generated for {source}")
+
+        with Image.open(sheets[0]) as image:
+            tile = (image.width // columns, image.height // rows)
+        if getattr(settings, "HLS_SPRITE_FORMAT", "webp") == "webp":
+            sheets = [_sprite_to_webp(sheet) for sheet in sheets]
+
+        _write_sprites_vtt(staging / SPRITES_VTT, [sheet.name for sheet in sheets], tile, columns, rows,
+                           interval, duration or _probe_duration(source))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _swap_into_place(staging, sprites_dir)
+    return sprites_dir / SPRITES_VTT
+
+
+def _sprite_to_webp(sheet: Path) -> Path:
+    """Re-encode a JPEG sprite sheet as WebP; keeps the JPEG if Pillow cannot write WebP."""
+
+    target = sheet.with_suffix(".webp")
     try:
+        with Image.open(sheet) as image:
+            image.save(target, "WEBP", quality=70, method=4)
+    except (OSError, KeyError) as e:
+        print(f"Could not write WebP sprite {target.name}, keeping JPEG: {e}")
+        target.unlink(missing_ok=True)
+        return sheet
+    sheet.unlink()
+    return target
+
+
+def _max_parallel_jobs() -> int:
+    """Return how many pipeline jobs may run at once (HLS_MAX_PARALLEL_JOBS)."""
+
+    configured = getattr(settings, "HLS_MAX_PARALLEL_JOBS", None)
+    return max(1, int(configured or os.cpu_count() or 1))
+
+
+def _pipeline_jobs(source: Path, output_dir: Path, make_trailer: bool, make_thumbnail: bool,
+                   chunks: list[tuple[float, float | None]] | None = None,
+                   renditions: list[str] | None = None, ladder: list[dict] | None = None,
+                   profile: str | None = None, segment_format: str | None = None) -> dict:
+    """
+    Return the independent ffmpeg jobs of the pipeline keyed by name.
+    In per-rendition mode every rendition is its own job so they can run side by side,
+    with `chunks` every time range of every rendition is a job ("<name>/chunk_<n>").
+    `renditions` restricts the jobs to the given rendition names.
+    """
+    ladder = ladder or RENDITIONS
+    selected = [r for r in ladder if renditions is None or r["name"] in renditions]
+    jobs = {}
+    if chunks:
+        for rendition in selected:
+            _staging_dir(output_dir / rendition["name"])  # drop chunks of an earlier run
+            for index, (start, end) in enumerate(chunks):
+                jobs[f"{rendition['name']}/chunk_{index:03d}"] = partial(
+                    _build_rendition_chunk, source, output_dir, rendition, index, start, end, profile, segment_format)
+    elif renditions is not None or getattr(settings, "HLS_ENCODE_MODE", "single_pass") == "per_rendition":
+        for rendition in selected:
+            jobs[rendition["name"]] = partial(_build_rendition, source, output_dir, rendition, profile, segment_format)
+    else:
+        jobs["renditions"] = partial(_build_renditions, source, output_dir, ladder, profile, segment_format)
+
+    if make_trailer:
+        jobs["trailer"] = partial(_generate_trailer, source, output_dir)
+    if make_thumbnail:
+        jobs["thumbnail"] = partial(_generate_thumbnail, source, output_dir)
+        if _sprites_enabled():
+            jobs["sprites"] = partial(_generate_sprites, source, output_dir)
+    return jobs
+
+
+def _stitch_chunk_results(results: dict, output_dir: Path, chunk_count: int, ladder: list[dict] | None = None):
+    """
+    Replace the chunk results of every rendition by one result for the stitched
+    rendition, or by the error if any of its chunks failed.
+    """
+    for rendition in ladder or RENDITIONS:
+        name = rendition["name"]
+        keys = [f"{name}/chunk_{i:03d}" for i in range(chunk_count)]
+        if not any(key in results for key in keys):
+            continue
+        failed = [results[key] for key in keys if isinstance(results.get(key), Exception)]
+        for key in keys:
+            results.pop(key, None)
+        try:
+            if failed:
+                raise failed[0]
+            playlist_path = _stitch_chunks(output_dir / name, chunk_count)
+            results[name] = (playlist_path, rendition["scale"], rendition["bitrate"])
+        except Exception as e:
+            results[name] = e
+
+
+def _run_jobs(jobs: dict, on_done=None) -> dict:
+    """
+    Run the given jobs on a bounded thread pool and wait for all of them.
+    Returns a dict of job name to result, or to the exception the job raised,
+    so a failing job never discards the work of the others.
+    `on_done(name, result)` is called in the calling thread as each job finishes.
+    """
+    max_workers = min(_max_parallel_jobs(), len(jobs)) or 1
+    results = {}
+
+    if max_workers == 1:
+        for name, job in jobs.items():
+            try:
+                results[name] = job()
+            except Exception as e:
+                results[name] = e
+            if on_done:
+                on_done(name, results[name])
+        return results
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hls") as pool:
+            futures = {pool.submit(job): name for name, job in jobs.items()}
+            try:
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        results[name] = e
+                    if on_done:
+                        on_done(name, results[name])
+            except BaseException:
+                # RQ's job timeout is raised here, in the main thread only:
+                # drop the queued jobs and stop the ffmpeg of the running ones,
+                # so leaving the pool doesn't wait for whole encodes.
+                pool.shutdown(wait=False, cancel_futures=True)
+                ffmpeg.stop_all("interrupted")
+                raise
+    finally:
+        ffmpeg.clear_stop()
+    return results
+
+
+def _job_result(results: dict, name: str):
+    """Return the result of a finished job, or None if it did not run or failed."""
+
+    result = results.get(name)
+    if isinstance(result, Exception):
+        print(f"Pipeline job '{name}' failed: {result}")
+        return None
+    return result
+
+
+def _collect_renditions(results: dict, ladder: list[dict] | None = None) -> list[tuple[Path, str, str]]:
+    """
+    Gather the finished renditions in ladder order. Failed renditions are left
+    out of the master playlist; if none succeeded the pipeline fails.
+    """
+    if "renditions" in results:
+        variant_playlists = _job_result(results, "renditions") or []
+    else:
+        variant_playlists = [
+            result for result in (_job_result(results, r["name"]) for r in ladder or RENDITIONS)
+            if result is not None
+        ]
+
+    if not variant_playlists:
+        raise RuntimeError("No HLS rendition could be generated")
+    return variant_playlists
+
+
+def run_hls_pipeline(video_id, source_path, renditions=None):
+    try:
+        # Hashing the source for reuse_duplicate_encode reads all of it, so
+        # it runs here in the worker and not in the request that saved the video.
+        if renditions is None and reuse_duplicate_encode(video_id, Path(source_path)):
+            return
         convert_to_hls(
             source_path=source_path,
             video_id=video_id,
-            make_trailer=True,
-            make_thumbnail=True,
+            make_trailer=renditions is None,
+            make_thumbnail=renditions is None,
+            renditions=renditions,
         )
         print(f"[RQ] Finished HLS pipeline for video {video_id}")
 
@@ -146,48 +1384,344 @@ def run_hls_pipeline(video_id, source_path):
 
 
 
-def convert_to_hls(source_path: str, video_id: int, make_trailer: bool = True, make_thumbnail: bool = True) -> str:
-    """
-    Convert a video file to HLS (.m3u8 + segments). Returns the path to the master playlist.
-    """
-
-    source = Path(source_path)
-    if not source.exists():
-        raise RuntimeError(f"File {source} does not exist")
-   
-    output_dir = Path(settings.MEDIA_ROOT) / "hls" / str(video_id)
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    variant_playlists = _build_renditions(source, output_dir)
-    master_path = _write_master_playlist(output_dir, variant_playlists)
+def _set_status(video_id: int, status: str):
+    Video.objects.filter(pk=video_id).update(processing_status=status)
+    invalidate_catalog()
 
-    trailer_path = None
-    thumb_path = None
 
-    if make_trailer:
-        trailer_path = _generate_trailer(source, output_dir)
-    if make_thumbnail:
-        thumb_path = _generate_thumbnail(source, output_dir)
+def _publish(video_id: int, master_path: Path, trailer_path: Path | None, thumb_path: Path | None,
+             variant_playlists: list[tuple[Path, str, str]] | None = None):
+    """
+    Store the generated master playlist, trailer and thumbnail on the Video.
+    The processing status is derived from `variant_playlists`: ready once
+    every rendition of the ladder is published, playable before that.
+    """
 
-    
+    invalidate_playlists(video_id)
     try:
         video = Video.objects.get(pk=video_id)
 
         video.hls_master = _rel_to_media(master_path)
+        if variant_playlists is not None:
+            video.available_renditions = [path.parent.name for path, _, _ in variant_playlists]
+            complete = len(variant_playlists) >= len(_video_ladder(video))
+            video.processing_status = (Video.ProcessingStatus.READY if complete
+                                       else Video.ProcessingStatus.PLAYABLE)
         
-        if trailer_path:
+        if trailer_path and trailer_path.exists():
             trailer_rel = _rel_to_media(trailer_path)
             video.trailer.name = trailer_rel           
         
-        if thumb_path: 
+        if thumb_path and thumb_path.exists(): 
             thumb_rel = _rel_to_media(thumb_path)
             video.thumbnail_url.name = thumb_rel
+            video.thumbnail_variants = thumbnails.available_variants(thumb_path.parent)
                 
-        video.save(update_fields=["hls_master", "trailer", "thumbnail_url"])
+        video.save(update_fields=["hls_master", "trailer", "thumbnail_url", "thumbnail_variants",
+                                  "processing_status", "available_renditions"])
         
     except Video.DoesNotExist:
         pass
 
+
+def _publish_progress(video_id: int, output_dir: Path,
+                      variant_playlists: list[tuple[Path, str, str]] | None = None):
+    """
+    Progressive publish: rewrite master.m3u8 for the renditions finished so far
+    (read from disk if not given) and make the video playable right away.
+    """
+    if variant_playlists is None:
+        variant_playlists = _completed_renditions(output_dir, _ladder_of(video_id))
+    if not variant_playlists:
+        return
+    master_path = _write_master_playlist(output_dir, variant_playlists)
+    _publish(video_id, master_path, output_dir / "trailer.mp4", output_dir / "thumbnail.jpg",
+             variant_playlists)
+
+
+def _progressive_enabled() -> bool:
+    return getattr(settings, "HLS_PROGRESSIVE_PUBLISH", False)
+
+
+def _run_progressive(source: Path, output_dir: Path, video_id: int,
+                     make_trailer: bool, make_thumbnail: bool, ladder: list[dict] | None = None,
+                     duration: float | None = None, profile: str | None = None,
+                     segment_format: str | None = None) -> dict:
+    """
+    Encode the lowest rendition (and the thumbnail) first and publish it,
+    then encode the remaining renditions and the trailer, republishing the
+    master playlist as each rendition finishes.
+    """
+    ladder = ladder or RENDITIONS
+    names = [r["name"] for r in ladder]
+    finished = []
+
+    def on_done(name, result):
+        if name in names and not isinstance(result, Exception):
+            finished.append(result)
+            finished.sort(key=lambda variant: names.index(variant[0].parent.name))
+            _publish_progress(video_id, output_dir, finished)
+
+    first, rest = ladder[0], ladder[1:]
+
+    jobs = {first["name"]: partial(_build_rendition, source, output_dir, first, profile, segment_format)}
+    if make_thumbnail:
+        jobs["thumbnail"] = partial(_generate_thumbnail, source, output_dir)
+    results = _run_jobs(_tracked_jobs(video_id, output_dir, jobs, duration), on_done)
+
+    jobs = {r["name"]: partial(_build_rendition, source, output_dir, r, profile, segment_format) for r in rest}
+    if make_trailer:
+        jobs["trailer"] = partial(_generate_trailer, source, output_dir)
+    if make_thumbnail and _sprites_enabled():
+        jobs["sprites"] = partial(_generate_sprites, source, output_dir, duration)
+    results.update(_run_jobs(_tracked_jobs(video_id, output_dir, jobs, duration), on_done))
+    return results
+
+
+def _hls_output_dir(video_id: int) -> Path:
+    return Path(settings.MEDIA_ROOT) / "hls" / str(video_id)
+
+
+def _queue_name(profile: str) -> str:
+    """Queue for a profile's jobs (HLS_PROFILE_QUEUES), HLS_QUEUE by default."""
+
+    return getattr(settings, "HLS_PROFILE_QUEUES", {}).get(profile) or getattr(settings, "HLS_QUEUE", "default")
+
+
+def enqueue_hls_pipeline(video_id: int, source_path: str, renditions: list[str] | None = None,
+                         profile: str | None = None, segment_format: str | None = None):
+    """
+    Enqueue the HLS pipeline for a video on the queue of its encoding profile
+    (HLS_PROFILE_QUEUES, else HLS_QUEUE). `profile` switches the video to
+    another profile first, e.g. to re-encode a popular title with "archive",
+    `segment_format` likewise to another entry of SEGMENT_FORMATS.
+
+    With HLS_PIPELINE_FANOUT a fan_out_hls_pipeline job plans the stages and
+    enqueues them (see there). Otherwise the whole pipeline runs as a single
+    run_hls_pipeline job. `renditions` restricts the run to these renditions.
+    Both jobs skip a full run if an identical source was already encoded
+    (reuse_duplicate_encode).
+    """
+    if profile:
+        if profile not in ENCODING_PROFILES:
+            raise ValueError(f"Unknown encoding profile: {profile}")
+        Video.objects.filter(pk=video_id).update(encoding_profile=profile)
+    if segment_format:
+        if segment_format not in SEGMENT_FORMATS:
+            raise ValueError(f"Unknown segment format: {segment_format}")
+        Video.objects.filter(pk=video_id).update(segment_format=segment_format)
+
+    queue = django_rq.get_queue(_queue_name(profile or _profile_name(Video.objects.filter(pk=video_id).first())))
+    _set_status(video_id, Video.ProcessingStatus.PROCESSING)
+
+    if not getattr(settings, "HLS_PIPELINE_FANOUT", False):
+        if renditions is None:
+            return [queue.enqueue(run_hls_pipeline, video_id, source_path)]
+        return [queue.enqueue(run_hls_pipeline, video_id, source_path, renditions)]
+
+    # Hashing and probing the source (duplicate lookup, ladder, chunk
+    # boundaries) happen in the worker rather than in the request that saved the video.
+    return [queue.enqueue(fan_out_hls_pipeline, video_id, source_path, renditions,
+                          job_timeout=getattr(settings, "HLS_JOB_TIMEOUT", 3600),
+                          description=f"HLS fan-out for video {video_id}")]
+
+
+def fan_out_hls_pipeline(video_id: int, source_path: str, renditions: list[str] | None = None) -> list:
+    """
+    RQ job that fans the pipeline out: every rendition (or, in chunked mode,
+    every time range of it), the trailer, the thumbnail and the sprites become
+    separate jobs so several workers can share one upload, and a finalize job
+    that depends on all of them writes the master playlist. A failed stage is
+    retried on its own without redoing the others.
+    """
+    if renditions is None and reuse_duplicate_encode(video_id, Path(source_path)):
+        return []
+    video = Video.objects.filter(pk=video_id).first()
+    queue = django_rq.get_queue(_queue_name(_profile_name(video)))
+    ladder = _plan_ladder(video_id, Path(source_path)) if renditions is None else _video_ladder(video)
+
+    options = {
+        "job_timeout": getattr(settings, "HLS_JOB_TIMEOUT", 3600),
+        "retry": Retry(max=getattr(settings, "HLS_JOB_RETRIES", 2), interval=[30, 120]),
+    }
+    selected = [r for r in ladder if renditions is None or r["name"] in renditions]
+    chunks = None
+    if getattr(settings, "HLS_ENCODE_MODE", "single_pass") == "chunked":
+        chunks = _plan_chunks(Path(source_path))
+
+    jobs = []
+    for rendition in selected:
+        if chunks:
+            _staging_dir(_hls_output_dir(video_id) / rendition["name"])  # drop chunks of an earlier run
+            jobs += [
+                queue.enqueue(run_hls_chunk, video_id, source_path, rendition["name"], index, start, end,
+                              description=f"HLS {rendition['name']} chunk {index} for video {video_id}",
+                              **options)
+                for index, (start, end) in enumerate(chunks)
+            ]
+        else:
+            jobs.append(queue.enqueue(run_hls_stage, video_id, source_path, rendition["name"],
+                                      description=f"HLS {rendition['name']} for video {video_id}",
+                                      **options))
+    if renditions is None:
+        jobs += [
+            queue.enqueue(run_hls_stage, video_id, source_path, stage,
+                          description=f"HLS {stage} for video {video_id}", **options)
+            for stage in ("trailer", "thumbnail", "sprites")
+            if stage != "sprites" or _sprites_enabled()
+        ]
+
+    finalize = queue.enqueue(
+        finalize_hls_pipeline, video_id, len(chunks) if chunks else 0, [r["name"] for r in selected],
+        depends_on=Dependency(jobs=jobs, allow_failure=True),
+        description=f"HLS finalize for video {video_id}",
+    )
+    return [*jobs, finalize]
+
+
+def run_hls_chunk(video_id: int, source_path: str, name: str, index: int, start: float, end: float | None):
+    """RQ job that encodes one time range of one rendition (chunked mode)."""
+
+    video = Video.objects.filter(pk=video_id).first()
+    rendition = next((r for r in _video_ladder(video) if r["name"] == name), None)
+    if rendition is None:
+        raise ValueError(f"Unknown rendition: {name}")
+    source, output_dir = Path(source_path), _hls_output_dir(video_id)
+    duration = (end if end is not None else _probe_duration(source) or start) - start
+    with _track_stage(video_id, f"{name}/chunk_{index:03d}", output_dir, duration or None):
+        _build_rendition_chunk(source, output_dir, rendition, index, start, end, _profile_name(video),
+                               _segment_format(video))
+    print(f"[RQ] Finished HLS {name} chunk {index} for video {video_id}")
+
+
+def run_hls_stage(video_id: int, source_path: str, stage: str):
+    """
+    RQ job for a single pipeline stage: a rendition name, "trailer", "thumbnail" or "sprites".
+    Errors propagate so RQ can mark the job failed and retry it.
+    """
+    source = Path(source_path)
+    if not source.exists():
+        raise RuntimeError(f"File {source} does not exist")
+
+    output_dir = _hls_output_dir(video_id)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    video = Video.objects.filter(pk=video_id).first()
+    rendition = None
+    if stage not in ("trailer", "thumbnail", "sprites"):
+        rendition = next((r for r in _video_ladder(video) if r["name"] == stage), None)
+        if rendition is None:
+            raise ValueError(f"Unknown HLS stage: {stage}")
+
+    source_duration = _probe_duration(source) if rendition or stage == "sprites" else None
+    with _track_stage(video_id, stage, output_dir, _stage_duration(stage, source_duration)):
+        if stage == "trailer":
+            _generate_trailer(source, output_dir)
+        elif stage == "thumbnail":
+            _generate_thumbnail(source, output_dir)
+        elif stage == "sprites":
+            _generate_sprites(source, output_dir, source_duration)
+        else:
+            _build_rendition(source, output_dir, rendition, _profile_name(video), _segment_format(video))
+    if rendition:
+        # Stamped here, once the encode succeeded, not by the finalize job,
+        # which only sees what is on disk, possibly the previous encode.
+        _record_fingerprints(video_id, source, [rendition["name"]])
+    if rendition and _progressive_enabled():
+        _publish_progress(video_id, output_dir)
+    print(f"[RQ] Finished HLS stage {stage} for video {video_id}")
+
+
+def finalize_hls_pipeline(video_id: int, chunk_count: int = 0, renditions: list[str] | None = None) -> str:
+    """
+    RQ job that runs after all stage jobs: stitches chunked renditions, writes
+    master.m3u8 for every finished rendition and stores master, trailer and
+    thumbnail on the Video. Stage jobs record the fingerprints of what they
+    encoded, this job those of the stitched renditions. The video fails if
+    none of `renditions` (all by default) is up to date afterwards, i.e.
+    every job of the run failed and only older output is left on disk.
+    """
+    output_dir = _hls_output_dir(video_id)
+    video = Video.objects.filter(pk=video_id).first()
+    source = _video_source_path(video) if video else None
+    ladder = _video_ladder(video)
+    if chunk_count:
+        stitched = []
+        for rendition in ladder:
+            if _chunk_dir(output_dir, rendition, 0).is_dir():
+                try:
+                    _stitch_chunks(output_dir / rendition["name"], chunk_count)
+                    stitched.append(rendition["name"])
+                except Exception as e:
+                    print(f"Could not stitch {rendition['name']} for video {video_id}: {e}")
+        if source and source.exists():
+            _record_fingerprints(video_id, source, stitched)
+            video.refresh_from_db()
+
+    variant_playlists = _completed_renditions(output_dir, ladder)
+    requested = [r["name"] for r in ladder if renditions is None or r["name"] in renditions]
+    stale = stale_renditions(video) if video else requested
+    if not variant_playlists or not [name for name in requested if name not in stale]:
+        _set_status(video_id, Video.ProcessingStatus.FAILED)
+        raise RuntimeError(f"No finished HLS rendition for video {video_id}")
+
+    master_path = _write_master_playlist(output_dir, variant_playlists)
+    _publish(video_id, master_path, output_dir / "trailer.mp4", output_dir / "thumbnail.jpg",
+             variant_playlists)
+    print(f"[RQ] Finalized HLS pipeline for video {video_id}")
+    return master_path.as_posix()
+
+
+def convert_to_hls(source_path: str, video_id: int, make_trailer: bool = True, make_thumbnail: bool = True,
+                   renditions: list[str] | None = None) -> str:
+    """
+    Convert a video file to HLS (.m3u8 + segments). Returns the path to the master playlist.
+    `renditions` re-encodes only the given renditions and keeps the others on disk.
+    """
+
+    source = Path(source_path)
+    if not source.exists():
+        raise RuntimeError(f"File {source} does not exist")
+   
+    output_dir = _hls_output_dir(video_id)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    _set_status(video_id, Video.ProcessingStatus.PROCESSING)
+    ladder = _plan_ladder(video_id, source) if renditions is None else _ladder_of(video_id)
+
+    duration = _probe_duration(source)
+    chunks = (_plan_chunks(source, duration)
+              if getattr(settings, "HLS_ENCODE_MODE", "single_pass") == "chunked" else None)
+    video = Video.objects.filter(pk=video_id).first()
+    profile, segment_format = _profile_name(video), _segment_format(video)
+    if _progressive_enabled() and not chunks and renditions is None:
+        results = _run_progressive(source, output_dir, video_id, make_trailer, make_thumbnail, ladder,
+                                   duration, profile, segment_format)
+    else:
+        jobs = _pipeline_jobs(source, output_dir, make_trailer, make_thumbnail, chunks, renditions, ladder,
+                              profile, segment_format)
+        results = _run_jobs(_tracked_jobs(video_id, output_dir, jobs, duration, chunks))
+        if chunks:
+            _stitch_chunk_results(results, output_dir, len(chunks), ladder)
+
+    try:
+        variant_playlists = _collect_renditions(results, ladder)
+    except RuntimeError:
+        _set_status(video_id, Video.ProcessingStatus.FAILED)
+        raise
+    built = [path.parent.name for path, _, _ in variant_playlists]
+    if renditions is not None:
+        variant_playlists += [v for v in _completed_renditions(output_dir, ladder) if v[0].parent.name not in built]
+        names = [r["name"] for r in ladder]
+        variant_playlists.sort(key=lambda variant: names.index(variant[0].parent.name))
+    master_path = _write_master_playlist(output_dir, variant_playlists)
+
+    trailer_path = _job_result(results, "trailer")
+    thumb_path = _job_result(results, "thumbnail")
+
+    _publish(video_id, master_path, trailer_path, thumb_path, variant_playlists)
+    _record_fingerprints(video_id, source, built)
+
     return master_path.as_posix()
 
 
@@ -1,17 +1,35 @@
+import base64
+import fcntl
+import hashlib
+import io
 import os
 import subprocess
-from datetime import date
+import threading
+import time
+from datetime import date, timedelta
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 import pytest
+from PIL import Image
 from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.db.models.signals import post_save
 from django.http import Http404
-from django.test import TestCase
-from rest_framework.test import APIClient
-from videoflix_app import tasks, utils
-from videoflix_app.models import Video
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+from rq.job import Job
+from core.cache import LRUCache
+from videoflix_app import cache, ffmpeg, metrics, search, signing, tasks, thumbnails, utils, views
+from videoflix_app.models import TranscodeJob, UploadSession, Video
+from videoflix_app.serializers import VideoSerializer
 from videoflix_app.signals import video_post_save
+from videoflix_app.views import (AsyncHLSChunkView, AsyncHLSIndexView, HLSChunkView, SpritePreviewView,
+                                 ThumbnailView, VideoListView)
 
 pytestmark = pytest.mark.django_db
 
@@ -58,6 +76,199 @@ def test_videolistview_returns_videos_in_desc_order(client, user):
     assert len(results) == 2
     assert results[0]["id"] == v2.id
     assert results[1]["id"] == v1.id
+    assert results[0]["processing_status"] == Video.ProcessingStatus.PENDING
+    assert results[0]["available_renditions"] == []
+
+
+def test_videolistview_keyset_pagination(client, user):
+    for day in (1, 2, 2, 3):
+        Video.objects.create(title=f"Video {day} {Video.objects.count()}", created_at=date(2024, 1, day))
+    expected = list(Video.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+    client.force_authenticate(user=user)
+
+    seen = []
+    url = "/api/video/?limit=3"
+    while url:
+        page = client.get(url).json()
+        seen += [video["id"] for video in page["results"]]
+        url = page["next"]
+
+    assert seen == expected
+    assert client.get("/api/video/?cursor=broken").status_code == 404
+
+
+def test_videolistview_cached_with_etag(client, user):
+    client.force_authenticate(user=user)
+    Video.objects.create(title="Cached", created_at=date(2024, 1, 1))
+
+    with patch.object(cache, "cache", LocMemCache("catalog-test", {})):
+        first = client.get("/api/video/")
+        with patch.object(VideoListView, "_catalog_data", side_effect=AssertionError("not cached")):
+            cached = client.get("/api/video/")
+        not_modified = client.get("/api/video/", HTTP_IF_NONE_MATCH=first["ETag"])
+        Video.objects.create(title="Invalidates", created_at=date(2024, 1, 2))
+        changed = client.get("/api/video/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+    assert cached.json() == first.json()
+    assert not_modified.status_code == 304
+    assert changed.status_code == 200
+    assert len(changed.json()) == 2
+
+
+def test_browseview_groups_newest_per_category(client, user, settings):
+    settings.VIDEO_BROWSE_ROW_SIZE = 2
+    for day in range(1, 4):
+        Video.objects.create(title=f"Drama {day}", category="drama", created_at=date(2024, 1, day))
+    Video.objects.create(title="Comedy 1", category="comedy", created_at=date(2024, 1, 1))
+    client.force_authenticate(user=user)
+
+    rows = {row["category"]: row for row in client.get("/api/video/browse/").json()}
+
+    assert [v["title"] for v in rows["drama"]["videos"]] == ["Drama 3", "Drama 2"]
+    assert [v["title"] for v in rows["comedy"]["videos"]] == ["Comedy 1"]
+    assert rows["comedy"]["next"] is None
+
+    rest = client.get(rows["drama"]["next"]).json()
+    assert [v["title"] for v in rest["results"]] == ["Drama 1"]
+    assert rest["next"] is None
+
+
+def test_videosearchview_ranks_and_matches_prefix(client, user):
+    Video.objects.create(title="Ocean Life", description="Whales and dolphins")
+    Video.objects.create(title="Mountains", description="A documentary about the ocean floor")
+    Video.objects.create(title="Desert", description="Sand")
+    client.force_authenticate(user=user)
+
+    results = client.get("/api/video/search/", {"q": "oce"}).json()["results"]
+    both = client.get("/api/video/search/", {"q": "ocean dolph"}).json()["results"]
+    empty = client.get("/api/video/search/", {"q": "\"*"}).json()["results"]
+
+    assert [v["title"] for v in results] == ["Ocean Life", "Mountains"]
+    assert [v["title"] for v in both] == ["Ocean Life"]
+    assert empty == []
+
+
+def test_search_index_follows_updates_and_deletes():
+    video = Video.objects.create(title="Old Name", description="")
+    video.title = "Renamed"
+    video.save()
+
+    assert [v.pk for v in search.search_videos("renamed")] == [video.pk]
+    assert search.search_videos("old") == []
+    video.delete()
+    assert search.search_videos("renamed") == []
+
+
+def _checksum(data: bytes) -> str:
+    return "sha256 " + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+@patch("videoflix_app.signals.enqueue_hls_pipeline")
+def test_resumable_upload_appends_chunks_and_finalizes(mock_enqueue, tmp_path, settings, client, django_user_model):
+    settings.MEDIA_ROOT = str(tmp_path)
+    staff = django_user_model.objects.create_user(username="staff", email="staff@example.com", password="pass123", is_staff=True)
+    client.force_authenticate(user=staff)
+
+    response = client.post("/api/video/uploads/", {
+        "filename": "clip.mp4", "size": 10, "title": "Clip", "description": "d", "category": "Drama",
+    }, format="json")
+    assert response.status_code == 201
+    url = response["Location"]
+
+    first = client.patch(url, b"01234", content_type="application/offset+octet-stream",
+                         HTTP_UPLOAD_OFFSET="0", HTTP_UPLOAD_CHECKSUM=_checksum(b"01234"))
+    assert first.status_code == 204 and first["Upload-Offset"] == "5"
+
+    # A retried chunk at a stale offset is refused, a corrupted one is rolled back.
+    stale = client.patch(url, b"01234", content_type="application/offset+octet-stream", HTTP_UPLOAD_OFFSET="0")
+    assert stale.status_code == 409
+    corrupt = client.patch(url, b"5678X", content_type="application/offset+octet-stream",
+                           HTTP_UPLOAD_OFFSET="5", HTTP_UPLOAD_CHECKSUM=_checksum(b"56789"))
+    assert corrupt.status_code == 460
+    assert client.head(url)["Upload-Offset"] == "5"
+    assert client.post(url + "finalize/").status_code == 409
+
+    second = client.patch(url, b"56789", content_type="application/offset+octet-stream",
+                          HTTP_UPLOAD_OFFSET="5", HTTP_UPLOAD_CHECKSUM=_checksum(b"56789"))
+    assert second.status_code == 204
+
+    response = client.post(url + "finalize/")
+    assert response.status_code == 201
+    video = Video.objects.get(pk=response.data["id"])
+    assert video.title == "Clip"
+    assert (tmp_path / video.video_file.name).read_bytes() == b"0123456789"
+    assert not list((tmp_path / "video" / "uploads").iterdir())
+    mock_enqueue.assert_called_once()
+
+
+def _complete_upload(client, django_user_model, title):
+    staff = django_user_model.objects.create_user(username="staff", email="staff@example.com", password="pass123", is_staff=True)
+    client.force_authenticate(user=staff)
+    url = client.post("/api/video/uploads/", {"filename": "clip.mp4", "size": 5, "title": title},
+                      format="json")["Location"]
+    client.patch(url, b"01234", content_type="application/offset+octet-stream", HTTP_UPLOAD_OFFSET="0")
+    return url, UploadSession.objects.get(user=staff)
+
+
+def test_finalize_upload_refuses_taken_title(tmp_path, settings, client, django_user_model):
+    settings.MEDIA_ROOT = str(tmp_path)
+    url, session = _complete_upload(client, django_user_model, "Clip")
+    Video.objects.create(title="Clip")
+
+    response = client.post(url + "finalize/")
+
+    assert response.status_code == 400
+    session.refresh_from_db()
+    assert session.status == UploadSession.Status.OPEN
+    assert session.part_path.read_bytes() == b"01234"
+
+
+def test_finalize_upload_reopens_session_when_title_race_lost(tmp_path, settings, client, django_user_model):
+    settings.MEDIA_ROOT = str(tmp_path)
+    url, session = _complete_upload(client, django_user_model, "Clip")
+
+    with patch("videoflix_app.uploads.Video.objects.create", side_effect=IntegrityError("title")):
+        response = client.post(url + "finalize/")
+
+    assert response.status_code == 400
+    session.refresh_from_db()
+    assert session.status == UploadSession.Status.OPEN
+    assert session.part_path.read_bytes() == b"01234"
+    assert not (tmp_path / "video" / "clip.mp4").exists()
+
+
+def test_append_chunk_to_finalized_upload_leaves_no_part_file(tmp_path, settings, client, django_user_model):
+    settings.MEDIA_ROOT = str(tmp_path)
+    url, session = _complete_upload(client, django_user_model, "Clip")
+    with patch("videoflix_app.signals.enqueue_hls_pipeline"):
+        assert client.post(url + "finalize/").status_code == 201
+
+    response = client.patch(url, b"56789", content_type="application/offset+octet-stream", HTTP_UPLOAD_OFFSET="5")
+
+    assert response.status_code == 409
+    assert not session.part_path.exists()
+
+
+def test_append_chunk_refuses_concurrent_chunk(tmp_path, settings, client, django_user_model):
+    settings.MEDIA_ROOT = str(tmp_path)
+    url, session = _complete_upload(client, django_user_model, "Clip")
+    session.size = 10
+    session.save()
+
+    with open(session.part_path, "rb+") as part:
+        fcntl.flock(part.fileno(), fcntl.LOCK_EX)
+        response = client.patch(url, b"56789", content_type="application/offset+octet-stream",
+                                HTTP_UPLOAD_OFFSET="5")
+
+    assert response.status_code == 409
+    session.refresh_from_db()
+    assert session.offset == 5
+
+
+def test_upload_api_is_staff_only(client, user):
+    client.force_authenticate(user=user)
+    response = client.post("/api/video/uploads/", {"filename": "a.mp4", "size": 1, "title": "A"}, format="json")
+    assert response.status_code == 403
 
 
 def test_hlsindexview_returns_file(tmp_path, settings, client, user):
@@ -75,10 +286,308 @@ def test_hlsindexview_returns_file(tmp_path, settings, client, user):
 
     assert response.status_code == 200
     assert response["Content-Type"] == "application/vnd.apple.mpegurl"
-    body = b"".join(response.streaming_content).decode()
+    body = response.content.decode()
     assert "#EXTM3U" in body
 
 
+def test_hlsindexview_revalidates_with_etag(tmp_path, settings, client, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    movie = Video.objects.create(title="Test Movie")
+    hls_dir = Path(settings.MEDIA_ROOT) / "hls" / str(movie.id) / "720p"
+    hls_dir.mkdir(parents=True)
+    (hls_dir / "index.m3u8").write_text("#EXTM3U")
+    client.force_authenticate(user=user)
+    url = f"/api/video/{movie.id}/720p/index.m3u8"
+
+    first = client.get(url)
+    second = client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+
+    assert first["ETag"].startswith('"')
+    assert "max-age=60" in first["Cache-Control"]
+    assert second.status_code == 304
+    assert second["ETag"] == first["ETag"]
+
+
+def test_playlist_cache_serves_from_memory_until_file_changes(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    playlist = tmp_path / "hls" / "7" / "480p" / "index.m3u8"
+    playlist.parent.mkdir(parents=True)
+    playlist.write_text("#EXTM3U\n#first")
+    cache.invalidate_playlists(7)
+
+    body, etag = cache.get_playlist(7, "480p")
+    with patch.object(cache, "safe_media_path", side_effect=AssertionError("cache miss")):
+        assert cache.get_playlist(7, "480p") == (body, etag)
+
+    playlist.write_text("#EXTM3U\n#second")
+    os.utime(playlist, ns=(0, playlist.stat().st_mtime_ns + 1_000_000))
+    body2, etag2 = cache.get_playlist(7, "480p")
+    assert b"#second" in body2 and etag2 != etag
+
+    playlist.unlink()
+    with pytest.raises(Http404):
+        cache.get_playlist(7, "480p")
+
+
+def test_lru_cache_evicts_by_size():
+    lru = LRUCache(max_entries=10, max_size=10, sizeof=len)
+    lru.set("a", b"12345")
+    lru.set("b", b"12345")
+    lru.get("a")
+    lru.set("c", b"123")
+
+    assert lru.get("b") is None
+    assert lru.get("a") == b"12345" and lru.get("c") == b"123"
+    assert lru.size == 8
+
+
+def test_hlschunkview_x_accel_redirect(tmp_path, settings, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_DELIVERY_BACKEND = "x-accel"
+    settings.HLS_ACCEL_REDIRECT_PREFIX = "/protected-media/"
+    movie = Video.objects.create(title="Test Movie")
+    request = APIRequestFactory().get("/")
+    force_authenticate(request, user=user)
+
+    response = HLSChunkView.as_view()(request, movie_id=movie.id, resolution="720p", segment="segment0.ts")
+
+    assert response.status_code == 200
+    assert response["X-Accel-Redirect"] == f"/protected-media/hls/{movie.id}/720p/segment0.ts"
+    assert response["Content-Type"] == "video/MP2T"
+    assert response.content == b""
+
+
+def _get_segment(user, movie_id, **headers):
+    request = APIRequestFactory().get("/", **headers)
+    force_authenticate(request, user=user)
+    return HLSChunkView.as_view()(request, movie_id=movie_id, resolution="720p", segment="segment0.ts")
+
+
+def test_hlschunkview_serves_byte_range(tmp_path, settings, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    movie = Video.objects.create(title="Test Movie")
+    seg_dir = tmp_path / "hls" / str(movie.id) / "720p"
+    seg_dir.mkdir(parents=True)
+    (seg_dir / "segment0.ts").write_bytes(b"0123456789")
+
+    partial_response = _get_segment(user, movie.id, HTTP_RANGE="bytes=2-5")
+    suffix = _get_segment(user, movie.id, HTTP_RANGE="bytes=-3")
+    unsatisfiable = _get_segment(user, movie.id, HTTP_RANGE="bytes=20-")
+
+    assert partial_response.status_code == 206
+    assert partial_response["Content-Range"] == "bytes 2-5/10"
+    assert partial_response["Content-Length"] == "4"
+    assert b"".join(partial_response.streaming_content) == b"2345"
+    assert b"".join(suffix.streaming_content) == b"789"
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable["Content-Range"] == "bytes */10"
+
+
+def test_hlschunkview_serves_fmp4_init_and_single_file_ranges(tmp_path, settings, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    movie = Video.objects.create(title="Test Movie")
+    seg_dir = tmp_path / "hls" / str(movie.id) / "720p"
+    seg_dir.mkdir(parents=True)
+    (seg_dir / "init.mp4").write_bytes(b"ftypmoov")
+    (seg_dir / "media.m4s").write_bytes(b"0123456789")
+
+    def get(segment, **headers):
+        request = APIRequestFactory().get("/", **headers)
+        force_authenticate(request, user=user)
+        return HLSChunkView.as_view()(request, movie_id=movie.id, resolution="720p", segment=segment)
+
+    init = get("init.mp4")
+    fragment = get("media.m4s", HTTP_RANGE="bytes=4-7")
+
+    assert init["Content-Type"] == "video/mp4"
+    assert fragment.status_code == 206
+    assert fragment["Content-Type"] == "video/mp4"
+    assert b"".join(fragment.streaming_content) == b"4567"
+    assert get("index.m3u8").status_code == 404
+
+
+def test_sprite_preview_view_serves_vtt_and_sheets(tmp_path, settings, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    sprites_dir = tmp_path / "hls" / "5" / "sprites"
+    sprites_dir.mkdir(parents=True)
+    (sprites_dir / "thumbnails.vtt").write_text("WEBVTT\n")
+    (sprites_dir / "sprite_001.webp").write_bytes(b"RIFF")
+
+    def get(name):
+        request = APIRequestFactory().get("/")
+        force_authenticate(request, user=user)
+        return SpritePreviewView.as_view()(request, movie_id=5, name=name)
+
+    assert get("thumbnails.vtt")["Content-Type"] == "text/vtt"
+    assert get("sprite_001.webp")["Content-Type"] == "image/webp"
+    assert get("sprite_002.webp").status_code == 404
+    assert get("index.m3u8").status_code == 404
+    anonymous = SpritePreviewView.as_view()(APIRequestFactory().get("/"), movie_id=5, name="thumbnails.vtt")
+    assert anonymous.status_code in (401, 403)
+
+
+def test_hlschunkview_conditional_requests(tmp_path, settings, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    movie = Video.objects.create(title="Test Movie")
+    seg_dir = tmp_path / "hls" / str(movie.id) / "720p"
+    seg_dir.mkdir(parents=True)
+    (seg_dir / "segment0.ts").write_bytes(b"0123456789")
+
+    full = _get_segment(user, movie.id)
+    not_modified = _get_segment(user, movie.id, HTTP_IF_NONE_MATCH=full["ETag"])
+    since = _get_segment(user, movie.id, HTTP_IF_MODIFIED_SINCE=full["Last-Modified"])
+    stale_range = _get_segment(user, movie.id, HTTP_RANGE="bytes=0-1", HTTP_IF_RANGE='"other"')
+
+    assert full.status_code == 200
+    assert full["Accept-Ranges"] == "bytes"
+    assert not_modified.status_code == 304
+    assert since.status_code == 304
+    assert stale_range.status_code == 200
+    assert b"".join(stale_range.streaming_content) == b"0123456789"
+
+
+def test_serve_media_supports_ranges_for_trailers(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    (tmp_path / "trailer.mp4").write_bytes(b"trailer-bytes")
+    request = RequestFactory().get("/media/trailer.mp4", HTTP_RANGE="bytes=0-6")
+
+    response = utils.serve_media(request, "trailer.mp4", document_root=str(tmp_path))
+
+    assert response.status_code == 206
+    assert response["Content-Type"] == "video/mp4"
+    assert b"".join(response.streaming_content) == b"trailer"
+    with pytest.raises(Http404):
+        utils.serve_media(request, "../secret.txt")
+
+
+def test_hlsindexview_signs_segment_uris(tmp_path, settings, client, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_SIGNED_SEGMENTS = True
+    movie = Video.objects.create(title="Test Movie")
+    hls_dir = tmp_path / "hls" / str(movie.id) / "720p"
+    hls_dir.mkdir(parents=True)
+    (hls_dir / "index.m3u8").write_text("#EXTM3U\n#EXTINF:4.0,\nsegment_000.ts\n#EXT-X-ENDLIST\n")
+    client.force_authenticate(user=user)
+
+    body = client.get(f"/api/video/{movie.id}/720p/index.m3u8").content.decode()
+
+    query = signing.signed_query(user.pk, movie.id, "720p")
+    assert f"segment_000.ts?{query}" in body
+    assert "#EXT-X-ENDLIST" in body
+
+
+def test_sign_playlist_rewrites_uri_attributes():
+    body = b'#EXTM3U\n#EXT-X-MAP:URI="init.mp4"\n#EXTINF:4.0,\nsegment_000.m4s\n'
+
+    signed, etag = signing.sign_playlist(body, '"abc"', "u=1&e=2&s=x")
+
+    assert b'URI="init.mp4?u=1&e=2&s=x"' in signed
+    assert b"segment_000.m4s?u=1&e=2&s=x" in signed
+    assert etag != '"abc"'
+
+
+def test_hlschunkview_accepts_signed_url_without_jwt(tmp_path, settings, django_assert_num_queries):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_SIGNED_SEGMENTS = True
+    seg_dir = tmp_path / "hls" / "5" / "720p"
+    seg_dir.mkdir(parents=True)
+    (seg_dir / "segment0.ts").write_bytes(b"data")
+    view = HLSChunkView.as_view()
+    query = signing.signed_query(42, 5, "720p")
+
+    with django_assert_num_queries(0):
+        response = view(APIRequestFactory().get(f"/?{query}"), movie_id=5, resolution="720p", segment="segment0.ts")
+    other_rendition = view(APIRequestFactory().get(f"/?{query}"), movie_id=5, resolution="1080p", segment="segment0.ts")
+    expires = int(time.time()) - 1
+    expired_query = f"u=42&e={expires}&s={signing.segment_signature(42, 5, '720p', expires)}"
+    expired = view(APIRequestFactory().get(f"/?{expired_query}"), movie_id=5, resolution="720p", segment="segment0.ts")
+
+    assert response.status_code == 200
+    assert b"".join(response.streaming_content) == b"data"
+    assert other_rendition.status_code in (401, 403)
+    assert expired.status_code in (401, 403)
+
+
+async def _consume(response):
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+def test_async_hlschunkview_streams_signed_range(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_SIGNED_SEGMENTS = True
+    settings.HLS_ASYNC_CHUNK_SIZE = 3
+    seg_dir = tmp_path / "hls" / "5" / "720p"
+    seg_dir.mkdir(parents=True)
+    (seg_dir / "segment0.ts").write_bytes(b"0123456789")
+    query = signing.signed_query(42, 5, "720p")
+    view = async_to_sync(AsyncHLSChunkView.as_view())
+
+    response = view(AsyncRequestFactory().get(f"/?{query}", headers={"range": "bytes=1-7"}),
+                    movie_id=5, resolution="720p", segment="segment0.ts")
+    anonymous = view(AsyncRequestFactory().get("/"), movie_id=5, resolution="720p", segment="segment0.ts")
+
+    assert response.status_code == 206
+    assert response.is_async
+    assert async_to_sync(_consume)(response) == b"1234567"
+    assert anonymous.status_code == 403
+
+
+def test_async_hlschunkview_touches_filesystem_off_the_event_loop(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_SIGNED_SEGMENTS = True
+    seg_dir = tmp_path / "hls" / "5" / "720p"
+    seg_dir.mkdir(parents=True)
+    (seg_dir / "segment0.ts").write_bytes(b"0123456789")
+    threads = []
+
+    def record(func):
+        def wrapper(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return func(*args, **kwargs)
+        return wrapper
+
+    with patch("videoflix_app.views.safe_media_path", record(views.safe_media_path)), \
+         patch("videoflix_app.views.media_file_response", record(views.media_file_response)):
+        response = async_to_sync(AsyncHLSChunkView.as_view())(
+            AsyncRequestFactory().get(f"/?{signing.signed_query(42, 5, '720p')}"),
+            movie_id=5, resolution="720p", segment="segment0.ts")
+
+    assert response.status_code == 200
+    assert len(threads) == 2 and all(name.startswith("asyncio_") for name in threads)
+
+
+def test_async_hlsindexview_uses_cookie_jwt(tmp_path, settings, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.AUTH_STATELESS_MEDIA = True
+    hls_dir = tmp_path / "hls" / "5" / "720p"
+    hls_dir.mkdir(parents=True)
+    (hls_dir / "index.m3u8").write_text("#EXTM3U")
+    request = AsyncRequestFactory().get("/")
+    request.COOKIES["access_token"] = str(AccessToken.for_user(user))
+    bad_request = AsyncRequestFactory().get("/")
+    bad_request.COOKIES["access_token"] = "invalid"
+    view = async_to_sync(AsyncHLSIndexView.as_view())
+
+    response = view(request, movie_id=5, resolution="720p")
+    rejected = view(bad_request, movie_id=5, resolution="720p")
+
+    assert response.status_code == 200
+    assert response.content == b"#EXTM3U"
+    assert rejected.status_code == 403
+
+
+def test_hlsindexview_x_sendfile(tmp_path, settings, client, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_DELIVERY_BACKEND = "x-sendfile"
+    movie = Video.objects.create(title="Test Movie")
+    client.force_authenticate(user=user)
+
+    response = client.get(f"/api/video/{movie.id}/720p/index.m3u8")
+
+    expected = tmp_path.resolve() / "hls" / str(movie.id) / "720p" / "index.m3u8"
+    assert response["X-Sendfile"] == str(expected)
+
+
 def test_hlsindexview_not_found(tmp_path, settings, client, user):
     settings.MEDIA_ROOT = str(tmp_path)
     movie = Video.objects.create(title="Test Movie")
@@ -194,6 +703,296 @@ def test_build_renditions(mock_ffmpeg, tmp_path):
         assert bitrate.endswith("k")
 
 
+def test_build_renditions_single_pass_runs_ffmpeg_once(mock_ffmpeg, tmp_path, settings):
+    settings.HLS_ENCODE_MODE = "single_pass"
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+    output_dir = tmp_path / "hls_test"
+
+    with patch("videoflix_app.tasks._has_audio", return_value=True):
+        renditions = tasks._build_renditions(dummy_source, output_dir)
+
+    mock_ffmpeg.assert_called_once()
+    command = mock_ffmpeg.call_args[0][0]
+    assert "-filter_complex" in command
+    stream_map = command[command.index("-var_stream_map") + 1]
+    assert stream_map.split() == [f"v:{i},a:{i},name:{r['name']}" for i, r in enumerate(tasks.RENDITIONS)]
+    assert [path.parent.name for path, _, _ in renditions] == [r["name"] for r in tasks.RENDITIONS]
+
+
+def test_build_renditions_single_pass_without_audio(mock_ffmpeg, tmp_path, settings):
+    settings.HLS_ENCODE_MODE = "single_pass"
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+
+    with patch("videoflix_app.tasks._has_audio", return_value=False):
+        tasks._build_renditions(dummy_source, tmp_path / "hls_test")
+
+    command = mock_ffmpeg.call_args[0][0]
+    assert "0:a:0" not in command
+    assert "a:0" not in command[command.index("-var_stream_map") + 1]
+
+
+def test_encode_rendition_applies_profile_and_segment_aligned_gop(mock_ffmpeg, tmp_path):
+    rendition = {"name": "720p", "scale": "1280:720", "bitrate": "1400k", "fps": 25}
+
+    tasks._encode_rendition(tmp_path / "video.mp4", tmp_path / "720p", rendition, profile="fast-publish")
+    command = mock_ffmpeg.call_args[0][0]
+    assert command[command.index("-preset") + 1] == "veryfast"
+    assert command[command.index("-b:v") + 1] == "1400k"
+    assert command[command.index("-maxrate") + 1] == "2100k"
+    assert command[command.index("-g") + 1] == str(25 * tasks.HLS_SEG_DUR)
+    assert command[command.index("-keyint_min") + 1] == str(25 * tasks.HLS_SEG_DUR)
+    assert command[command.index("-sc_threshold") + 1] == "0"
+
+    tasks._encode_rendition(tmp_path / "video.mp4", tmp_path / "720p", rendition, profile="archive")
+    command = mock_ffmpeg.call_args[0][0]
+    assert command[command.index("-preset") + 1] == "slow"
+    assert command[command.index("-crf") + 1] == "21"
+    assert "-b:v" not in command and "-bufsize" in command
+
+
+def test_encode_rendition_segment_formats(mock_ffmpeg, tmp_path):
+    rendition = {"name": "720p", "scale": "1280:720", "bitrate": "1400k"}
+
+    tasks._encode_rendition(tmp_path / "video.mp4", tmp_path / "720p", rendition, segment_format="ts")
+    command = mock_ffmpeg.call_args[0][0]
+    assert "-hls_segment_type" not in command
+    assert command[command.index("-hls_segment_filename") + 1].endswith("/segment_%03d.ts")
+
+    tasks._encode_rendition(tmp_path / "video.mp4", tmp_path / "720p", rendition, segment_format="fmp4")
+    command = mock_ffmpeg.call_args[0][0]
+    assert command[command.index("-hls_segment_type") + 1] == "fmp4"
+    assert command[command.index("-hls_fmp4_init_filename") + 1] == "init.mp4"
+    assert command[command.index("-hls_segment_filename") + 1].endswith("/segment_%03d.m4s")
+    assert "single_file" not in command
+
+    tasks._encode_rendition(tmp_path / "video.mp4", tmp_path / "720p", rendition, segment_format="fmp4-single")
+    command = mock_ffmpeg.call_args[0][0]
+    assert command[command.index("-hls_flags") + 1] == "single_file"
+    assert command[command.index("-hls_segment_filename") + 1].endswith("/media.m4s")
+
+
+def test_run_hls_stage_uses_segment_format_of_video(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_SEGMENT_FORMAT = "ts"
+    source = tmp_path / "video.mp4"
+    source.touch()
+    video = Video.objects.create(title="CMAF", segment_format="fmp4-single")
+
+    with patch("videoflix_app.tasks._probe_duration", return_value=None):
+        tasks.run_hls_stage(video.id, str(source), "720p")
+
+    command = mock_ffmpeg.call_args[0][0]
+    assert command[command.index("-hls_segment_type") + 1] == "fmp4"
+    assert "single_file" in command
+
+
+def test_reencode_keeps_old_rendition_until_new_one_is_complete(mock_ffmpeg, tmp_path):
+    stream_dir = tmp_path / "720p"
+    stream_dir.mkdir()
+    (stream_dir / "index.m3u8").write_text("old")
+    rendition = {"name": "720p", "scale": "1280:720", "bitrate": "1400k"}
+
+    mock_ffmpeg.side_effect = RuntimeError("encoder crashed")
+    with pytest.raises(RuntimeError):
+        tasks._encode_rendition(tmp_path / "video.mp4", stream_dir, rendition)
+    assert (stream_dir / "index.m3u8").read_text() == "old"
+
+    def encode(command):
+        assert (stream_dir / "index.m3u8").read_text() == "old"
+        Path(command[-1]).write_text("new")
+
+    mock_ffmpeg.side_effect = encode
+    tasks._encode_rendition(tmp_path / "video.mp4", stream_dir, rendition)
+    assert (stream_dir / "index.m3u8").read_text() == "new"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["720p"]
+
+
+def test_build_renditions_per_rendition_mode(mock_ffmpeg, tmp_path, settings):
+    settings.HLS_ENCODE_MODE = "per_rendition"
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+
+    tasks._build_renditions(dummy_source, tmp_path / "hls_test")
+    assert mock_ffmpeg.call_count == len(tasks.RENDITIONS)
+
+
+def test_build_renditions_single_pass_falls_back_on_failure(mock_ffmpeg, tmp_path, settings):
+    settings.HLS_ENCODE_MODE = "single_pass"
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+    mock_ffmpeg.side_effect = [RuntimeError("split failed")] + [MagicMock()] * len(tasks.RENDITIONS)
+
+    renditions = tasks._build_renditions(dummy_source, tmp_path / "hls_test")
+    assert mock_ffmpeg.call_count == 1 + len(tasks.RENDITIONS)
+    assert len(renditions) == len(tasks.RENDITIONS)
+
+
+def test_build_renditions_single_pass_does_not_fall_back_after_timeout(mock_ffmpeg, tmp_path, settings):
+    settings.HLS_ENCODE_MODE = "single_pass"
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+    mock_ffmpeg.side_effect = ffmpeg.FFmpegError(None, "", "timed out after 60s")
+
+    with pytest.raises(ffmpeg.FFmpegError, match="timed out"):
+        tasks._build_renditions(dummy_source, tmp_path / "hls_test")
+    assert mock_ffmpeg.call_count == 1
+
+
+def test_chunk_ranges_snap_to_keyframes():
+    ranges = tasks._chunk_ranges(100.0, [0.0, 24.0, 47.0, 52.0, 77.0, 96.0], 4)
+    assert ranges == [(0.0, 24.0), (24.0, 52.0), (52.0, 77.0), (77.0, None)]
+
+
+def test_chunk_ranges_drop_duplicate_boundaries():
+    ranges = tasks._chunk_ranges(10.0, [0.0, 9.0], 4)
+    assert ranges == [(0.0, 9.0), (9.0, None)]
+
+
+def _write_chunk_playlist(chunk_dir, durations):
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+    lines = ["#EXTM3U", "#EXT-X-TARGETDURATION:4"]
+    for i, duration in enumerate(durations):
+        (chunk_dir / f"segment_{i:03d}.ts").write_bytes(b"ts")
+        lines += [f"#EXTINF:{duration},", f"segment_{i:03d}.ts"]
+    (chunk_dir / "index.m3u8").write_text("\n".join(lines + ["#EXT-X-ENDLIST", ""]))
+
+
+def test_stitch_chunks_renumbers_segments(tmp_path):
+    stream_dir = tmp_path / "720p"
+    _write_chunk_playlist(tasks._staging_path(stream_dir) / "chunk_000", [4.0, 4.0, 2.5])
+    _write_chunk_playlist(tasks._staging_path(stream_dir) / "chunk_001", [4.0, 4.2])
+
+    playlist = tasks._stitch_chunks(stream_dir, 2)
+
+    content = playlist.read_text()
+    assert "#EXT-X-MEDIA-SEQUENCE:0" in content
+    assert "#EXT-X-TARGETDURATION:5" in content
+    assert content.rstrip().endswith("#EXT-X-ENDLIST")
+    assert [line for line in content.splitlines() if line.endswith(".ts")] == [
+        f"segment_{i:03d}.ts" for i in range(5)
+    ]
+    assert sorted(p.name for p in stream_dir.iterdir()) == ["index.m3u8"] + [f"segment_{i:03d}.ts" for i in range(5)]
+    assert [p.name for p in tmp_path.iterdir()] == ["720p"]
+
+
+def test_stitch_chunks_replaces_live_rendition_without_touching_linked_files(tmp_path):
+    donor = tmp_path / "donor_index.m3u8"
+    donor.write_text("#EXTM3U\n#EXTINF:4.0,\nsegment_000.ts\n#EXT-X-ENDLIST\n")
+    stream_dir = tmp_path / "720p"
+    stream_dir.mkdir()
+    os.link(donor, stream_dir / "index.m3u8")
+    (stream_dir / "segment_009.ts").write_bytes(b"stale")
+    _write_chunk_playlist(tasks._chunk_dir(tmp_path, {"name": "720p"}, 0), [4.0])
+
+    tasks._stitch_chunks(stream_dir, 1)
+
+    assert "segment_000.ts" in donor.read_text() and "#EXT-X-VERSION" not in donor.read_text()
+    assert sorted(p.name for p in stream_dir.iterdir()) == ["index.m3u8", "segment_000.ts"]
+
+
+def test_stitch_chunks_requires_finished_chunks(tmp_path):
+    stream_dir = tmp_path / "720p"
+    _write_chunk_playlist(tasks._staging_path(stream_dir) / "chunk_000", [4.0])
+    (tasks._staging_path(stream_dir) / "chunk_001").mkdir()
+    (tasks._staging_path(stream_dir) / "chunk_001" / "index.m3u8").write_text("#EXTM3U\n")
+
+    with pytest.raises(RuntimeError):
+        tasks._stitch_chunks(stream_dir, 2)
+
+
+def test_read_segments_resolves_byte_ranges_and_init(tmp_path):
+    playlist = tmp_path / "index.m3u8"
+    playlist.write_text(
+        '#EXTM3U\n#EXT-X-VERSION:6\n#EXT-X-MAP:URI="media.m4s",BYTERANGE="800@0"\n'
+        "#EXTINF:4.0,\n#EXT-X-BYTERANGE:1000@800\nmedia.m4s\n"
+        "#EXTINF:2.5,\n#EXT-X-BYTERANGE:600\nmedia.m4s\n#EXT-X-ENDLIST\n"
+    )
+
+    segments = tasks._read_segments(playlist)
+
+    assert [s.byterange for s in segments] == [(1000, 800), (600, 1800)]
+    assert segments[1].init == ("media.m4s", (800, 0))
+    assert tasks._read_media_playlist(playlist) == [(4.0, "media.m4s"), (2.5, "media.m4s")]
+
+
+def _write_fmp4_chunk(chunk_dir, sizes, init=b"init", single_file=False):
+    chunk_dir.mkdir(parents=True)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:7", "#EXT-X-TARGETDURATION:4"]
+    if single_file:
+        (chunk_dir / "media.m4s").write_bytes(init + b"".join(b"m" * size for size in sizes))
+        lines.append(f'#EXT-X-MAP:URI="media.m4s",BYTERANGE="{len(init)}@0"')
+        offset = len(init)
+        for size in sizes:
+            lines += ["#EXTINF:4.0,", f"#EXT-X-BYTERANGE:{size}@{offset}", "media.m4s"]
+            offset += size
+    else:
+        (chunk_dir / "init.mp4").write_bytes(init)
+        lines.append('#EXT-X-MAP:URI="init.mp4"')
+        for i, size in enumerate(sizes):
+            (chunk_dir / f"segment_{i:03d}.m4s").write_bytes(b"m" * size)
+            lines += ["#EXTINF:4.0,", f"segment_{i:03d}.m4s"]
+    (chunk_dir / "index.m3u8").write_text("\n".join(lines + ["#EXT-X-ENDLIST", ""]))
+
+
+def test_stitch_chunks_fmp4_shares_identical_init(tmp_path):
+    stream_dir = tmp_path / "720p"
+    _write_fmp4_chunk(tasks._staging_path(stream_dir) / "chunk_000", [10, 20])
+    _write_fmp4_chunk(tasks._staging_path(stream_dir) / "chunk_001", [30])
+    _write_fmp4_chunk(tasks._staging_path(stream_dir) / "chunk_002", [40], init=b"other")
+
+    content = tasks._stitch_chunks(stream_dir, 3).read_text()
+
+    assert "#EXT-X-VERSION:6" in content
+    assert content.count("#EXT-X-MAP") == 2
+    assert '#EXT-X-MAP:URI="init.mp4"' in content and '#EXT-X-MAP:URI="init_002.mp4"' in content
+    assert sorted(p.name for p in stream_dir.iterdir()) == [
+        "index.m3u8", "init.mp4", "init_002.mp4",
+        "segment_000.m4s", "segment_001.m4s", "segment_002.m4s", "segment_003.m4s",
+    ]
+    assert [s.init[0] for s in tasks._read_segments(stream_dir / "index.m3u8")] == [
+        "init.mp4", "init.mp4", "init.mp4", "init_002.mp4"
+    ]
+
+
+def test_stitch_chunks_fmp4_single_file_keeps_byte_ranges(tmp_path):
+    stream_dir = tmp_path / "720p"
+    _write_fmp4_chunk(tasks._staging_path(stream_dir) / "chunk_000", [10, 20], single_file=True)
+    _write_fmp4_chunk(tasks._staging_path(stream_dir) / "chunk_001", [30], single_file=True)
+
+    segments = tasks._read_segments(tasks._stitch_chunks(stream_dir, 2))
+
+    assert [(s.uri, s.byterange) for s in segments] == [
+        ("media_000.m4s", (10, 4)), ("media_000.m4s", (20, 14)), ("media_001.m4s", (30, 4)),
+    ]
+    assert segments[2].init == ("media_001.m4s", (4, 0))
+    assert sorted(p.name for p in stream_dir.iterdir()) == ["index.m3u8", "media_000.m4s", "media_001.m4s"]
+
+
+def test_convert_to_hls_chunked_mode(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_ENCODE_MODE = "chunked"
+    settings.HLS_MAX_PARALLEL_JOBS = 4
+    video = Video.objects.create(title="Long Video")
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+
+    def fake_ffmpeg(command):
+        _write_chunk_playlist(Path(command[-1]).parent, [4.0, 4.0])
+        assert "-ss" in command
+
+    mock_ffmpeg.side_effect = fake_ffmpeg
+    with patch("videoflix_app.tasks._plan_chunks", return_value=[(0.0, 8.0), (8.0, None)]):
+        tasks.convert_to_hls(str(dummy_source), video.id, make_trailer=False, make_thumbnail=False)
+
+    assert mock_ffmpeg.call_count == 2 * len(tasks.RENDITIONS)
+    playlist = tmp_path / "hls" / str(video.id) / "480p" / "index.m3u8"
+    assert len(tasks._read_media_playlist(playlist)) == 4
+    video.refresh_from_db()
+    assert "master.m3u8" in video.hls_master.name
+
+
 def test_write_master_playlist(tmp_path):
     output_dir = tmp_path / "hls_test"
     (output_dir / "480p").mkdir(parents=True)
@@ -206,6 +1005,82 @@ def test_write_master_playlist(tmp_path):
     assert "BANDWIDTH=" in content
 
 
+def test_write_master_playlist_uses_measured_attributes(tmp_path):
+    output_dir = tmp_path / "hls_test"
+    stream_dir = output_dir / "720p"
+    stream_dir.mkdir(parents=True)
+    (stream_dir / "segment_000.ts").write_bytes(b"x" * 4000)
+    (stream_dir / "segment_001.ts").write_bytes(b"x" * 1000)
+    (stream_dir / "index.m3u8").write_text(
+        "#EXTM3U\n#EXTINF:4.0,\nsegment_000.ts\n#EXTINF:4.0,\nsegment_001.ts\n#EXT-X-ENDLIST\n"
+    )
+    probe = {"streams": [
+        {"codec_type": "video", "codec_name": "h264", "profile": "High", "level": 31,
+         "width": 1280, "height": 720, "avg_frame_rate": "30000/1001"},
+        {"codec_type": "audio", "codec_name": "aac", "profile": "LC"},
+    ]}
+
+    with patch.object(tasks, "_probe_streams", return_value=probe):
+        master = tasks._write_master_playlist(output_dir, [(stream_dir / "index.m3u8", "1280:720", "1400k")])
+
+    content = master.read_text()
+    assert "BANDWIDTH=8000," in content
+    assert "AVERAGE-BANDWIDTH=5000" in content
+    assert 'CODECS="avc1.64001f,mp4a.40.2"' in content
+    assert "RESOLUTION=1280x720" in content
+    assert "FRAME-RATE=29.970" in content
+
+
+def test_measure_variant_fmp4_uses_byte_ranges_and_init(tmp_path):
+    stream_dir = tmp_path / "720p"
+    _write_fmp4_chunk(stream_dir, [4000, 1000], single_file=True)
+
+    with patch.object(tasks, "_probe_streams", return_value={"streams": []}) as probe:
+        measured = tasks._measure_variant(stream_dir / "index.m3u8")
+
+    assert measured == {"peak": 8000, "average": 5000}
+    probe.assert_called_once_with(stream_dir / "media.m4s")
+
+
+def test_select_ladder_never_upscales():
+    ladder = tasks._select_ladder({"width": 1280, "height": 720, "fps": 25, "bitrate": 5_000_000})
+
+    assert [r["name"] for r in ladder] == ["480p", "720p"]
+    assert ladder[1]["bitrate"] == "1400k"
+
+
+def test_select_ladder_small_source_keeps_lowest_rung_at_source_size():
+    ladder = tasks._select_ladder({"width": 641, "height": 360, "fps": 30, "bitrate": 600_000})
+
+    assert ladder == [{"name": "480p", "scale": "640:360", "bitrate": "600k", "fps": 30}]
+
+
+def test_select_ladder_adapts_bitrate_to_frame_rate_and_content(settings):
+    settings.HLS_STATIC_BPP = 0.03
+    settings.HLS_STATIC_BITRATE_FACTOR = 0.5
+    fast = tasks._select_ladder({"width": 1920, "height": 1080, "fps": 60, "bitrate": 20_000_000})
+    static = tasks._select_ladder({"width": 1920, "height": 1080, "fps": 30, "bitrate": 1_000_000})
+
+    assert [r["bitrate"] for r in fast] == ["1200k", "2100k", "4500k"]
+    assert [r["bitrate"] for r in static] == ["400k", "700k", "1000k"]
+
+
+def test_convert_to_hls_stores_source_ladder(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = tmp_path
+    video = Video.objects.create(title="Ladder", description="desc", category="drama")
+    source = tmp_path / "video.mp4"
+    source.touch()
+    probe = {"width": 1280, "height": 720, "fps": 25, "duration": 10.0, "bitrate": 5_000_000}
+
+    with patch.object(tasks, "_probe_source", return_value=probe):
+        tasks.convert_to_hls(str(source), video.id)
+
+    video.refresh_from_db()
+    assert [r["name"] for r in video.ladder] == ["480p", "720p"]
+    assert video.processing_status == Video.ProcessingStatus.READY
+    assert "1080p" not in (tmp_path / "hls" / str(video.id) / "master.m3u8").read_text()
+
+
 def test_generate_trailer(mock_ffmpeg, tmp_path):
     dummy_source = tmp_path / "video.mp4"
     dummy_source.touch()
@@ -226,6 +1101,144 @@ def test_generate_thumbnail(mock_ffmpeg, tmp_path):
     mock_ffmpeg.assert_called_once()
 
 
+def test_generate_sprites_tiles_frames_and_writes_vtt(mock_ffmpeg, tmp_path, settings):
+    settings.HLS_SPRITE_INTERVAL = 10
+    settings.HLS_SPRITE_WIDTH = 16
+    settings.HLS_SPRITE_GRID = "2x2"
+    settings.HLS_SPRITE_FORMAT = "webp"
+    output_dir = tmp_path / "hls_test"
+
+    def tile(command):
+        assert "fps=1/10,scale=16:-2,tile=2x2" in command
+        for sheet in (1, 2):
+            Image.new("RGB", (32, 18)).save(command[-1] % sheet)
+
+    mock_ffmpeg.side_effect = tile
+    vtt_path = tasks._generate_sprites(tmp_path / "video.mp4", output_dir, duration=55)
+
+    assert vtt_path == output_dir / "sprites" / "thumbnails.vtt"
+    assert sorted(p.name for p in vtt_path.parent.iterdir()) == ["sprite_001.webp", "sprite_002.webp", "thumbnails.vtt"]
+    cues = vtt_path.read_text().split("\n\n")
+    assert cues[0] == "WEBVTT"
+    assert cues[1] == "00:00:00.000 --> 00:00:10.000\nsprite_001.webp#xywh=0,0,16,9"
+    assert cues[4] == "00:00:30.000 --> 00:00:40.000\nsprite_001.webp#xywh=16,9,16,9"
+    assert cues[6] == "00:00:50.000 --> 00:00:55.000\nsprite_002.webp#xywh=16,0,16,9\n"
+    assert len(cues) == 7
+
+
+def test_generate_sprites_keeps_previous_preview_on_failure(mock_ffmpeg, tmp_path):
+    sprites_dir = tmp_path / "sprites"
+    sprites_dir.mkdir()
+    (sprites_dir / "thumbnails.vtt").write_text("WEBVTT\n")
+
+    with pytest.raises(RuntimeError):
+        tasks._generate_sprites(tmp_path / "video.mp4", tmp_path, duration=30)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["sprites"]
+    assert (sprites_dir / "thumbnails.vtt").read_text() == "WEBVTT\n"
+
+
+def _thumbnail_video(tmp_path, size=(1920, 1080), variants=True):
+    video = Video.objects.create(title="Thumbnail Video")
+    hls_dir = tmp_path / "hls" / str(video.id)
+    hls_dir.mkdir(parents=True)
+    Image.new("RGB", size, "navy").save(hls_dir / "thumbnail.jpg")
+    (hls_dir / "master.m3u8").write_text("#EXTM3U\n")
+    if variants:
+        thumbnails.generate_variants(hls_dir / "thumbnail.jpg")
+    tasks._publish(video.id, hls_dir / "master.m3u8", None, hls_dir / "thumbnail.jpg")
+    video.refresh_from_db()
+    return video
+
+
+def test_generate_variants_never_upscales(tmp_path, settings):
+    settings.THUMBNAIL_WIDTHS = [320, 640, 1280]
+    settings.THUMBNAIL_FORMATS = ["webp"]
+    Image.new("RGB", (800, 450)).save(tmp_path / "thumbnail.jpg")
+
+    assert thumbnails.generate_variants(tmp_path / "thumbnail.jpg") == {"webp": [320, 640]}
+    assert thumbnails.available_variants(tmp_path) == {"webp": [320, 640]}
+    with Image.open(tmp_path / "thumbnail" / "320.webp") as image:
+        assert image.size == (320, 180)
+
+
+def test_publish_stores_thumbnail_variants_and_serializer_exposes_srcset(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.THUMBNAIL_WIDTHS = [320, 640]
+    settings.THUMBNAIL_FORMATS = ["webp"]
+    video = _thumbnail_video(tmp_path)
+    assert video.thumbnail_variants == {"webp": [320, 640]}
+
+    data = VideoSerializer(video, context={"request": RequestFactory().get("/")}).data
+    assert data["thumbnail_srcset"] == {
+        "webp": f"http://testserver/media/hls/{video.id}/thumbnail/320.webp 320w, "
+                f"http://testserver/media/hls/{video.id}/thumbnail/640.webp 640w"
+    }
+
+
+def test_thumbnail_view_resizes_on_demand_into_lru_cache(tmp_path, settings, user):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.THUMBNAIL_WIDTHS = [320]
+    settings.THUMBNAIL_FORMATS = ["webp"]
+    settings.THUMBNAIL_RESIZE_STEP = 40
+    video = _thumbnail_video(tmp_path)
+
+    def get(query, **headers):
+        request = APIRequestFactory().get(f"/?{query}", **headers)
+        force_authenticate(request, user=user)
+        return ThumbnailView.as_view()(request, movie_id=video.id)
+
+    pregenerated = get("w=320", HTTP_ACCEPT="image/webp,*/*")
+    assert pregenerated["Content-Type"] == "image/webp"
+    assert pregenerated["Vary"] == "Accept"
+    assert not (tmp_path / "cache").exists()
+
+    resized = get("w=500&fmt=webp")
+    assert resized.status_code == 200
+    cached = list((tmp_path / "cache" / "thumbnails" / str(video.id)).iterdir())
+    assert [p.name.split("_")[0] for p in cached] == ["520"]
+    with Image.open(cached[0]) as image:
+        assert image.size == (520, 292)
+
+    assert get("w=480&fmt=jpeg")["Content-Type"] == "image/jpeg"
+    assert get("w=0").status_code == 400
+    assert get("w=320&fmt=gif").status_code == 400
+
+
+def test_thumbnail_cache_evicts_least_recently_used(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.THUMBNAIL_FORMATS = ["webp"]
+    video = _thumbnail_video(tmp_path, variants=False)
+
+    first = thumbnails.resized_thumbnail(video, 400, "jpeg")
+    second = thumbnails.resized_thumbnail(video, 600, "jpeg")
+    os.utime(first, (time.time() - 60, time.time() - 60))
+    os.utime(second, (time.time() - 120, time.time() - 120))
+    assert thumbnails.resized_thumbnail(video, 400, "jpeg") == first
+
+    settings.THUMBNAIL_CACHE_MAX_BYTES = first.stat().st_size + second.stat().st_size
+    third = thumbnails.resized_thumbnail(video, 200, "jpeg")
+
+    assert first.exists() and third.exists()
+    assert not second.exists()
+
+
+def test_thumbnail_cache_scans_only_when_estimate_exceeds_limit(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.THUMBNAIL_FORMATS = ["webp"]
+    video = _thumbnail_video(tmp_path, variants=False)
+    thumbnails.resized_thumbnail(video, 400, "jpeg")
+
+    with patch.object(Path, "rglob", wraps=Path.rglob, autospec=True) as rglob:
+        thumbnails.resized_thumbnail(video, 200, "jpeg")
+        thumbnails.resized_thumbnail(video, 600, "jpeg")
+        assert rglob.call_count == 0
+
+        settings.THUMBNAIL_CACHE_MAX_BYTES = 1
+        thumbnails.resized_thumbnail(video, 800, "jpeg")
+        assert rglob.call_count == 1
+
+
 def test_convert_to_hls_updates_video(mock_ffmpeg, tmp_path, settings):
     settings.MEDIA_ROOT = str(tmp_path)
     video = Video.objects.create(title="Test Video")
@@ -268,11 +1281,577 @@ def test_convert_to_hls_video_does_not_exist(mock_ffmpeg, tmp_path, settings):
     assert result.endswith("master.m3u8")
 
 
+def test_run_jobs_isolates_failures(settings):
+    settings.HLS_MAX_PARALLEL_JOBS = 4
+
+    def boom():
+        raise RuntimeError("trailer failed")
+
+    results = tasks._run_jobs({"480p": lambda: "done", "trailer": boom})
+    assert results["480p"] == "done"
+    assert isinstance(results["trailer"], RuntimeError)
+
+
+def test_run_jobs_interrupted_stops_ffmpeg_in_pool_threads(tmp_path, settings):
+    settings.HLS_MAX_PARALLEL_JOBS = 2
+    binary = _fake_ffmpeg(tmp_path, "exec sleep 30\n")
+    errors = []
+
+    def encode():
+        try:
+            ffmpeg.run([binary, "out.m3u8"])
+        except ffmpeg.FFmpegError as e:
+            errors.append(e)
+            raise
+
+    def wait_for_encode():
+        deadline = time.monotonic() + 5
+        while not ffmpeg._running.stoppers and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def on_done(name, result):
+        raise KeyboardInterrupt  # stands in for RQ's JobTimeoutException
+
+    started = time.monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        tasks._run_jobs({"480p": encode, "trailer": wait_for_encode}, on_done)
+
+    assert time.monotonic() - started < 10
+    assert [e.reason for e in errors] == ["interrupted"]
+    assert ffmpeg._running.stoppers == set() and ffmpeg._running.reason is None
+
+
+def test_convert_to_hls_parallel_keeps_renditions_when_trailer_fails(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_ENCODE_MODE = "per_rendition"
+    settings.HLS_MAX_PARALLEL_JOBS = 4
+    video = Video.objects.create(title="Parallel Video")
+
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+
+    def fake_ffmpeg(command):
+        if command[-1].endswith("trailer.mp4"):
+            raise RuntimeError("FFmpeg exited with code 1")
+        return MagicMock(returncode=0)
+
+    mock_ffmpeg.side_effect = fake_ffmpeg
+    master_path = tasks.convert_to_hls(str(dummy_source), video.id, make_thumbnail=False)
+
+    video.refresh_from_db()
+    assert "master.m3u8" in video.hls_master.name
+    assert not video.trailer
+    assert Path(master_path).read_text().count("#EXT-X-STREAM-INF") == len(tasks.RENDITIONS)
+
+
+def test_convert_to_hls_fails_without_any_rendition(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_ENCODE_MODE = "per_rendition"
+    mock_ffmpeg.side_effect = RuntimeError("FFmpeg exited with code 1")
+
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+
+    with pytest.raises(RuntimeError):
+        tasks.convert_to_hls(str(dummy_source), 1, make_trailer=False, make_thumbnail=False)
+
+
+def test_convert_to_hls_progressive_publishes_lowest_rendition_first(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_PROGRESSIVE_PUBLISH = True
+    settings.HLS_MAX_PARALLEL_JOBS = 1
+    video = Video.objects.create(title="Progressive Video")
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+    snapshots = []
+
+    def fake_ffmpeg(command):
+        video.refresh_from_db()
+        snapshots.append((command[-1], video.processing_status, list(video.available_renditions)))
+
+    mock_ffmpeg.side_effect = fake_ffmpeg
+    tasks.convert_to_hls(str(dummy_source), video.id, make_thumbnail=False)
+
+    first_rendition = tasks.RENDITIONS[0]["name"]
+    assert snapshots[0][0].endswith(f".{first_rendition}.encoding/index.m3u8")
+    assert snapshots[0][1] == Video.ProcessingStatus.PROCESSING
+    assert snapshots[1][1:] == (Video.ProcessingStatus.PLAYABLE, [first_rendition])
+
+    video.refresh_from_db()
+    assert video.processing_status == Video.ProcessingStatus.READY
+    assert video.available_renditions == [r["name"] for r in tasks.RENDITIONS]
+
+
+def test_convert_to_hls_marks_failed_video(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    mock_ffmpeg.side_effect = RuntimeError("FFmpeg exited with code 1")
+    video = Video.objects.create(title="Broken Video")
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+
+    with pytest.raises(RuntimeError):
+        tasks.convert_to_hls(str(dummy_source), video.id, make_trailer=False, make_thumbnail=False)
+
+    video.refresh_from_db()
+    assert video.processing_status == Video.ProcessingStatus.FAILED
+
+
+def test_run_hls_stage_progressive_publishes_partial_master(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_PROGRESSIVE_PUBLISH = True
+    video = Video.objects.create(title="Fanout Progressive")
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+    mock_ffmpeg.side_effect = lambda command: Path(command[-1]).write_text("#EXTM3U\n#EXT-X-ENDLIST\n")
+
+    tasks.run_hls_stage(video.id, str(dummy_source), "480p")
+
+    video.refresh_from_db()
+    assert video.processing_status == Video.ProcessingStatus.PLAYABLE
+    assert video.available_renditions == ["480p"]
+    assert "480p/index.m3u8" in (tmp_path / "hls" / str(video.id) / "master.m3u8").read_text()
+
+
 def test_convert_to_hls_missing_source(mock_ffmpeg, tmp_path, settings):
     with pytest.raises(RuntimeError):
         tasks.convert_to_hls(str(tmp_path / "mising.mp4"), 1)
 
 
+def test_convert_to_hls_records_transcode_job_per_stage(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.HLS_ENCODE_MODE = "per_rendition"
+    settings.HLS_MAX_PARALLEL_JOBS = 1
+    video = Video.objects.create(title="Tracked")
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+    mock_ffmpeg.side_effect = lambda command: Path(command[-1]).write_text("#EXTM3U\n#EXT-X-ENDLIST\n")
+
+    tasks.convert_to_hls(str(dummy_source), video.id, make_trailer=False, make_thumbnail=False)
+
+    jobs = {job.stage: job for job in TranscodeJob.objects.filter(video=video)}
+    assert set(jobs) == {"480p", "720p", "1080p"}
+    assert all(job.status == TranscodeJob.Status.DONE and job.wall_seconds is not None for job in jobs.values())
+    assert jobs["720p"].bytes_written == len("#EXTM3U\n#EXT-X-ENDLIST\n")
+
+
+def _fake_ffmpeg(tmp_path, script: str) -> str:
+    binary = tmp_path / "ffmpeg"
+    binary.write_text("#!/bin/sh\n" + script)
+    binary.chmod(0o755)
+    return str(binary)
+
+
+def test_run_ffmpeg_streams_progress_and_usage_into_stage(tmp_path):
+    video = Video.objects.create(title="Progress")
+    binary = _fake_ffmpeg(tmp_path, (
+        "printf 'out_time_us=2000000\\nspeed=2.5x\\nprogress=continue\\n'\n"
+        "printf 'out_time_us=4000000\\nspeed=3x\\nprogress=end\\n'\n"
+    ))
+
+    with tasks._track_stage(video.id, "720p", tmp_path, duration=8.0) as job:
+        tasks._run_ffmpeg([binary, "-i", "in.mp4", "out.m3u8"])
+        assert job.out_time_seconds == 4.0 and job.speed == 3.0
+        assert job.progress == 0.5
+
+    job.refresh_from_db()
+    assert job.status == TranscodeJob.Status.DONE
+    assert job.max_rss_bytes > 0 and job.cpu_seconds >= 0
+    assert job.progress == 1.0
+
+
+def test_run_ffmpeg_failure_marks_stage_failed(tmp_path):
+    video = Video.objects.create(title="Broken")
+    binary = _fake_ffmpeg(tmp_path, "echo 'Invalid data found' >&2\nexit 1\n")
+
+    with pytest.raises(RuntimeError, match="Invalid data found"):
+        with tasks._track_stage(video.id, "trailer", tmp_path):
+            tasks._run_ffmpeg([binary, "-i", "in.mp4", "out.mp4"])
+
+    job = TranscodeJob.objects.get(video=video)
+    assert job.status == TranscodeJob.Status.FAILED
+    assert "exited with code 1" in job.error
+
+
+def test_run_ffmpeg_keeps_only_the_log_tail(tmp_path, settings):
+    settings.HLS_FFMPEG_LOG_BYTES = 1024
+    binary = _fake_ffmpeg(tmp_path, "for i in $(seq 1 2000); do echo \"log line $i\" >&2; done\nexit 1\n")
+
+    with pytest.raises(ffmpeg.FFmpegError) as error:
+        tasks._run_ffmpeg([binary, "out.mp4"])
+    assert len(error.value.log) <= 1024
+    assert error.value.log.rstrip().endswith("log line 2000")
+
+
+def test_run_ffmpeg_timeout_kills_process(tmp_path, settings):
+    settings.HLS_FFMPEG_TIMEOUT = 1
+    binary = _fake_ffmpeg(tmp_path, "exec sleep 30\n")
+
+    started = time.monotonic()
+    with pytest.raises(ffmpeg.FFmpegError, match="timed out"):
+        tasks._run_ffmpeg([binary, "out.mp4"])
+    assert time.monotonic() - started < 10
+
+
+def test_cancelling_transcode_job_stops_ffmpeg(tmp_path, settings):
+    settings.HLS_PROGRESS_INTERVAL = 0
+    video = Video.objects.create(title="Cancelled")
+    binary = _fake_ffmpeg(tmp_path, "while true; do printf 'out_time_us=1\\nprogress=continue\\n'; sleep 0.1; done\n")
+
+    with pytest.raises(ffmpeg.FFmpegError, match="cancelled"):
+        with tasks._track_stage(video.id, "480p", tmp_path) as job:
+            TranscodeJob.objects.filter(pk=job.pk).update(status=TranscodeJob.Status.CANCELLED)
+            tasks._run_ffmpeg([binary, "out.m3u8"])
+
+    job.refresh_from_db()
+    assert job.status == TranscodeJob.Status.CANCELLED
+
+
+def test_parse_cpu_list():
+    assert ffmpeg.parse_cpu_list("0-2, 6") == {0, 1, 2, 6}
+    assert ffmpeg.parse_cpu_list("") == set()
+
+
+def test_transcode_metrics_endpoint(client, settings):
+    settings.METRICS_TOKEN = "scrape-me"
+    video = Video.objects.create(title="Metrics")
+    TranscodeJob.objects.create(video=video, stage="720p/chunk_000", status=TranscodeJob.Status.DONE,
+                                wall_seconds=10, cpu_seconds=30, max_rss_bytes=2048, bytes_written=4096)
+    TranscodeJob.objects.create(video=video, stage="720p/chunk_001", status=TranscodeJob.Status.DONE,
+                                wall_seconds=5, cpu_seconds=15, max_rss_bytes=1024, bytes_written=1024)
+    TranscodeJob.objects.create(video=video, stage="1080p", duration_seconds=100, out_time_seconds=25, speed=1.5)
+
+    assert client.get("/api/video/metrics/").status_code == 404
+    response = client.get("/api/video/metrics/", HTTP_AUTHORIZATION="Bearer scrape-me")
+    body = response.content.decode()
+
+    assert response.status_code == 200
+    assert 'videoflix_transcode_wall_seconds_total{stage="720p"} 15' in body
+    assert 'videoflix_transcode_max_rss_bytes{stage="720p"} 2048' in body
+    assert 'videoflix_transcode_stages_total{stage="720p",status="done"} 2' in body
+    assert 'status="running"' not in body
+    assert 'videoflix_transcode_stages_running{stage="1080p"} 1' in body
+    assert f'videoflix_transcode_progress{{video_id="{video.id}",stage="1080p"}} 0.2500' in body
+
+
+def test_prune_transcode_jobs_keeps_metric_totals(settings):
+    video = Video.objects.create(title="Pruned")
+    old = timezone.now() - timedelta(days=40)
+    for wall in (10, 5):
+        TranscodeJob.objects.create(video=video, stage="720p/chunk_000", status=TranscodeJob.Status.DONE,
+                                    finished_at=old, wall_seconds=wall, max_rss_bytes=2048)
+    TranscodeJob.objects.create(video=video, stage="720p", status=TranscodeJob.Status.DONE,
+                                finished_at=timezone.now(), wall_seconds=1)
+    before = metrics.render_metrics()
+
+    call_command("prune_transcode_jobs", days=30, stdout=io.StringIO())
+
+    assert TranscodeJob.objects.count() == 1
+    assert metrics.render_metrics() == before
+    assert 'videoflix_transcode_wall_seconds_total{stage="720p"} 16' in before
+
+
+def test_enqueue_hls_pipeline_single_job(settings):
+    settings.HLS_PIPELINE_FANOUT = False
+    with patch("videoflix_app.tasks.django_rq.get_queue") as get_queue:
+        tasks.enqueue_hls_pipeline(1, "/media/video/a.mp4")
+
+    get_queue.return_value.enqueue.assert_called_once_with(tasks.run_hls_pipeline, 1, "/media/video/a.mp4")
+
+
+def test_enqueue_hls_pipeline_fanout_defers_planning_to_job(settings):
+    settings.HLS_PIPELINE_FANOUT = True
+    settings.HLS_ENCODE_MODE = "chunked"
+    with patch("videoflix_app.tasks.django_rq.get_queue") as get_queue, \
+         patch("videoflix_app.tasks._plan_chunks") as plan_chunks, \
+         patch("videoflix_app.tasks._plan_ladder") as plan_ladder:
+        tasks.enqueue_hls_pipeline(1, "/media/video/a.mp4")
+
+    plan_chunks.assert_not_called()
+    plan_ladder.assert_not_called()
+    enqueue = get_queue.return_value.enqueue
+    enqueue.assert_called_once()
+    assert enqueue.call_args.args == (tasks.fan_out_hls_pipeline, 1, "/media/video/a.mp4", None)
+
+
+def test_fan_out_hls_pipeline_with_finalize(settings):
+    with patch("videoflix_app.tasks.django_rq.get_queue") as get_queue, \
+         patch("videoflix_app.tasks._plan_ladder", return_value=[dict(r) for r in tasks.RENDITIONS]) as plan_ladder:
+        get_queue.return_value.enqueue.side_effect = lambda *args, **kwargs: MagicMock(spec=Job)
+        jobs = tasks.fan_out_hls_pipeline(1, "/media/video/a.mp4")
+
+    plan_ladder.assert_called_once_with(1, Path("/media/video/a.mp4"))
+
+    calls = get_queue.return_value.enqueue.call_args_list
+    stages = [c.args[3] for c in calls[:-1]]
+    assert stages == [r["name"] for r in tasks.RENDITIONS] + ["trailer", "thumbnail", "sprites"]
+    assert all(c.args[0] is tasks.run_hls_stage for c in calls[:-1])
+
+    finalize = calls[-1]
+    assert finalize.args == (tasks.finalize_hls_pipeline, 1, 0, [r["name"] for r in tasks.RENDITIONS])
+    assert finalize.kwargs["depends_on"].allow_failure is True
+    assert len(finalize.kwargs["depends_on"].dependencies) == len(stages)
+    assert len(jobs) == len(stages) + 1
+
+
+def test_fan_out_hls_pipeline_skips_duplicate_source():
+    with patch("videoflix_app.tasks.reuse_duplicate_encode", return_value=True) as reuse, \
+         patch("videoflix_app.tasks.django_rq.get_queue") as get_queue:
+        assert tasks.fan_out_hls_pipeline(1, "/media/video/a.mp4") == []
+
+    reuse.assert_called_once_with(1, Path("/media/video/a.mp4"))
+    get_queue.assert_not_called()
+
+
+def test_fan_out_hls_pipeline_selected_renditions(settings):
+    with patch("videoflix_app.tasks.django_rq.get_queue") as get_queue:
+        get_queue.return_value.enqueue.side_effect = lambda *args, **kwargs: MagicMock(spec=Job)
+        tasks.fan_out_hls_pipeline(1, "/media/video/a.mp4", renditions=["1080p"])
+
+    calls = get_queue.return_value.enqueue.call_args_list
+    assert [c.args[3] for c in calls[:-1]] == ["1080p"]
+
+
+def test_fan_out_hls_pipeline_chunked(settings):
+    settings.HLS_ENCODE_MODE = "chunked"
+    with patch("videoflix_app.tasks.django_rq.get_queue") as get_queue, \
+         patch("videoflix_app.tasks._plan_chunks", return_value=[(0.0, 300.0), (300.0, None)]):
+        get_queue.return_value.enqueue.side_effect = lambda *args, **kwargs: MagicMock(spec=Job)
+        tasks.fan_out_hls_pipeline(1, "/media/video/a.mp4", renditions=["720p"])
+
+    calls = get_queue.return_value.enqueue.call_args_list
+    assert [c.args[:6] for c in calls[:-1]] == [
+        (tasks.run_hls_chunk, 1, "/media/video/a.mp4", "720p", 0, 0.0),
+        (tasks.run_hls_chunk, 1, "/media/video/a.mp4", "720p", 1, 300.0),
+    ]
+    assert calls[-1].args == (tasks.finalize_hls_pipeline, 1, 2, ["720p"])
+
+
+def test_run_hls_stage_builds_single_rendition(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    dummy_source = tmp_path / "video.mp4"
+    dummy_source.touch()
+
+    tasks.run_hls_stage(7, str(dummy_source), "720p")
+
+    mock_ffmpeg.assert_called_once()
+    assert mock_ffmpeg.call_args[0][0][-1].endswith("hls/7/.720p.encoding/index.m3u8")
+    with pytest.raises(ValueError):
+        tasks.run_hls_stage(7, str(dummy_source), "4k")
+
+
+def test_finalize_hls_pipeline_publishes_finished_renditions(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    video = Video.objects.create(title="Fanout Video")
+    hls_dir = tmp_path / "hls" / str(video.id)
+    for name, playlist in (("480p", "#EXTM3U\n#EXT-X-ENDLIST\n"), ("720p", "#EXTM3U\n")):
+        (hls_dir / name).mkdir(parents=True)
+        (hls_dir / name / "index.m3u8").write_text(playlist)
+    (hls_dir / "thumbnail.jpg").write_bytes(b"img")
+
+    tasks.finalize_hls_pipeline(video.id)
+
+    master = (hls_dir / "master.m3u8").read_text()
+    assert "480p/index.m3u8" in master
+    assert "720p/index.m3u8" not in master
+    video.refresh_from_db()
+    assert video.hls_master.name == f"hls/{video.id}/master.m3u8"
+    assert video.thumbnail_url.name == f"hls/{video.id}/thumbnail.jpg"
+    assert not video.trailer
+
+
+def test_run_hls_stage_records_fingerprint_of_its_rendition(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    video = _video_with_hls(tmp_path, "staged", finished=())
+    mock_ffmpeg.side_effect = lambda command: Path(command[-1]).write_text("#EXTM3U\n#EXT-X-ENDLIST\n")
+
+    tasks.run_hls_stage(video.id, str(tasks._video_source_path(video)), "720p")
+
+    video.refresh_from_db()
+    assert list(video.rendition_fingerprints) == ["720p"]
+
+
+def test_finalize_hls_pipeline_fails_when_no_job_of_the_run_succeeded(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    video = _video_with_hls(tmp_path, "reencoded")
+    tasks._record_fingerprints(video.id, tasks._video_source_path(video), ["480p", "720p", "1080p"])
+    Video.objects.filter(pk=video.id).update(encoding_profile="archive",
+                                             processing_status=Video.ProcessingStatus.PROCESSING)
+
+    with pytest.raises(RuntimeError):
+        tasks.finalize_hls_pipeline(video.id)
+
+    video.refresh_from_db()
+    assert video.processing_status == Video.ProcessingStatus.FAILED
+    assert tasks.stale_renditions(video) == ["480p", "720p", "1080p"]
+
+
+def _video_with_hls(tmp_path, title, finished=("480p", "720p", "1080p")):
+    video_dir = tmp_path / "video"
+    video_dir.mkdir(exist_ok=True)
+    (video_dir / f"{title}.mp4").write_bytes(title.encode())
+    with patch("videoflix_app.signals.enqueue_hls_pipeline"):
+        video = Video.objects.create(title=title, video_file=f"video/{title}.mp4")
+    for name in finished:
+        stream_dir = tmp_path / "hls" / str(video.id) / name
+        stream_dir.mkdir(parents=True)
+        (stream_dir / "index.m3u8").write_text("#EXTM3U\n#EXT-X-ENDLIST\n")
+    return video
+
+
+def test_stale_renditions_follow_fingerprints(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    video = _video_with_hls(tmp_path, "fingerprinted", finished=("480p", "720p"))
+    assert tasks.stale_renditions(video) == ["480p", "720p", "1080p"]
+
+    tasks._record_fingerprints(video.id, tasks._video_source_path(video), ["480p", "720p"])
+    video.refresh_from_db()
+    assert len(video.source_hash) == 64
+    assert tasks.stale_renditions(video) == ["1080p"]
+
+    (tmp_path / "video" / "fingerprinted.mp4").write_bytes(b"re-uploaded master")
+    assert tasks.stale_renditions(video) == ["480p", "720p", "1080p"]
+
+
+def test_source_hash_is_reused_while_file_is_unchanged(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    video = _video_with_hls(tmp_path, "hashed")
+    source = tasks._video_source_path(video)
+
+    first = tasks._source_hash(video, source)
+    with patch("videoflix_app.tasks._file_sha256") as file_sha256:
+        assert tasks._source_hash(video, source) == first
+    file_sha256.assert_not_called()
+
+
+def test_identical_source_reuses_existing_hls_output(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    donor = _video_with_hls(tmp_path, "master", finished=("480p", "720p", "1080p"))
+    donor_dir = tmp_path / "hls" / str(donor.id)
+    (donor_dir / "720p" / "segment_000.ts").write_bytes(b"ts")
+    (donor_dir / "master.m3u8").write_text("#EXTM3U\n")
+    tasks._record_fingerprints(donor.id, tasks._video_source_path(donor), ["480p", "720p", "1080p"])
+    Video.objects.filter(pk=donor.pk).update(processing_status=Video.ProcessingStatus.READY)
+
+    (tmp_path / "video" / "copy.mp4").write_bytes(b"master")
+    with patch("videoflix_app.signals.enqueue_hls_pipeline"):
+        video = Video.objects.create(title="copy", video_file="video/copy.mp4")
+
+    with patch("videoflix_app.tasks.reuse_duplicate_encode", wraps=tasks.reuse_duplicate_encode) as reuse, \
+         patch("videoflix_app.tasks.django_rq.get_queue"):
+        tasks.enqueue_hls_pipeline(video.id, str(tasks._video_source_path(video)))
+    reuse.assert_not_called()
+
+    with patch("videoflix_app.tasks.convert_to_hls") as convert:
+        tasks.run_hls_pipeline(video.id, str(tasks._video_source_path(video)))
+    convert.assert_not_called()
+
+    segment = tmp_path / "hls" / str(video.id) / "720p" / "segment_000.ts"
+    assert os.path.samefile(segment, donor_dir / "720p" / "segment_000.ts")
+    video.refresh_from_db()
+    assert video.processing_status == Video.ProcessingStatus.READY
+    assert video.available_renditions == ["480p", "720p", "1080p"]
+    assert tasks.stale_renditions(video) == []
+
+
+def test_duplicate_source_is_not_reused_for_another_profile_or_a_reencode(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    donor = _video_with_hls(tmp_path, "master")
+    (tmp_path / "hls" / str(donor.id) / "master.m3u8").write_text("#EXTM3U\n")
+    tasks._record_fingerprints(donor.id, tasks._video_source_path(donor), ["480p", "720p", "1080p"])
+    Video.objects.filter(pk=donor.pk).update(processing_status=Video.ProcessingStatus.READY)
+    (tmp_path / "video" / "copy.mp4").write_bytes(b"master")
+    with patch("videoflix_app.signals.enqueue_hls_pipeline"):
+        archive = Video.objects.create(title="copy", video_file="video/copy.mp4", encoding_profile="archive")
+        published = Video.objects.create(title="copy2", video_file="video/copy.mp4",
+                                          hls_master="hls/0/master.m3u8")
+
+    assert not tasks.reuse_duplicate_encode(archive.id, tasks._video_source_path(archive))
+    assert not tasks.reuse_duplicate_encode(published.id, tasks._video_source_path(published))
+    archive.refresh_from_db()
+    assert archive.encoding_profile == "archive"
+    assert not (tmp_path / "hls" / str(archive.id)).exists()
+
+
+def test_convert_to_hls_selected_renditions_keeps_others(mock_ffmpeg, tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    video = _video_with_hls(tmp_path, "partial", finished=("480p", "720p"))
+    mock_ffmpeg.side_effect = lambda command: Path(command[-1]).write_text("#EXTM3U\n#EXT-X-ENDLIST\n")
+
+    tasks.convert_to_hls(str(tasks._video_source_path(video)), video.id,
+                         make_trailer=False, make_thumbnail=False, renditions=["1080p"])
+
+    mock_ffmpeg.assert_called_once()
+    master = (tmp_path / "hls" / str(video.id) / "master.m3u8").read_text()
+    assert master.count("#EXT-X-STREAM-INF") == 3
+    video.refresh_from_db()
+    assert list(video.rendition_fingerprints) == ["1080p"]
+    assert video.processing_status == Video.ProcessingStatus.READY
+
+
+def test_reprocess_hls_enqueues_only_stale_renditions(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    up_to_date = _video_with_hls(tmp_path, "current")
+    tasks._record_fingerprints(up_to_date.id, tasks._video_source_path(up_to_date), ["480p", "720p", "1080p"])
+    stale = _video_with_hls(tmp_path, "stale", finished=("480p", "720p"))
+    tasks._record_fingerprints(stale.id, tasks._video_source_path(stale), ["480p", "720p"])
+
+    with patch("videoflix_app.management.commands.reprocess_hls.enqueue_hls_pipeline") as enqueue:
+        call_command("reprocess_hls")
+
+    enqueue.assert_called_once_with(stale.id, str(tasks._video_source_path(stale)), ["1080p"])
+
+
+def test_reprocess_hls_switches_selected_videos_to_profile(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    popular = _video_with_hls(tmp_path, "popular")
+    other = _video_with_hls(tmp_path, "other")
+    for video in (popular, other):
+        tasks._record_fingerprints(video.id, tasks._video_source_path(video), ["480p", "720p", "1080p"])
+
+    with patch("videoflix_app.management.commands.reprocess_hls.enqueue_hls_pipeline") as enqueue:
+        call_command("reprocess_hls", "--profile", "archive", "--video", str(popular.id))
+
+    enqueue.assert_called_once_with(popular.id, str(tasks._video_source_path(popular)), None, profile="archive")
+
+
+def test_segment_format_is_part_of_the_fingerprint(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    video = _video_with_hls(tmp_path, "cmaf")
+    tasks._record_fingerprints(video.id, tasks._video_source_path(video), ["480p", "720p", "1080p"])
+    video.refresh_from_db()
+    assert tasks.stale_renditions(video) == []
+
+    with patch("videoflix_app.management.commands.reprocess_hls.enqueue_hls_pipeline") as enqueue:
+        call_command("reprocess_hls", "--segment-format", "fmp4")
+
+    enqueue.assert_called_once_with(video.id, str(tasks._video_source_path(video)), None, segment_format="fmp4")
+
+
+def test_enqueue_hls_pipeline_uses_profile_queue(settings):
+    settings.HLS_PIPELINE_FANOUT = False
+    settings.HLS_PROFILE_QUEUES = {"archive": "hls_background"}
+    video = Video.objects.create(title="Popular")
+    with patch("videoflix_app.tasks.django_rq.get_queue") as get_queue:
+        tasks.enqueue_hls_pipeline(video.id, "/media/video/a.mp4", profile="archive")
+
+    get_queue.assert_called_once_with("hls_background")
+    video.refresh_from_db()
+    assert video.encoding_profile == "archive"
+
+
+def test_reprocess_hls_dry_run_reports_encode_minutes(tmp_path, settings):
+    settings.MEDIA_ROOT = str(tmp_path)
+    _video_with_hls(tmp_path, "missing-hd", finished=("480p",))
+    out = io.StringIO()
+
+    with patch("videoflix_app.management.commands.reprocess_hls.enqueue_hls_pipeline") as enqueue, \
+         patch("videoflix_app.management.commands.reprocess_hls._probe_duration", return_value=600):
+        call_command("reprocess_hls", "--only-missing", "--rendition", "1080p", "--dry-run", stdout=out)
+
+    enqueue.assert_not_called()
+    assert "1 videos need re-encoding, about 10.0 encode minutes" in out.getvalue()
+
+
 def test_video_post_save_creates_hls_and_updates_fields(tmp_path, settings):
     settings.MEDIA_ROOT = str(tmp_path)
 
@@ -0,0 +1,186 @@
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from django.conf import settings
+from PIL import Image, features
+
+# Catalog thumbnails at the sizes cards are rendered at, instead of the full
+# frame: width-bucketed variants generated next to thumbnail.jpg at pipeline
+# time (THUMBNAIL_WIDTHS x THUMBNAIL_FORMATS), and on-demand resizes for any
+# other width, kept in a size-bounded disk cache. The cache is LRU by mtime
+# (touched on every hit), so all worker processes share it without an index.
+# Each process keeps an estimate of the cache size (its last scan plus what it
+# wrote since) and only scans when that passes the limit, then evicts down to
+# EVICT_TO of it, so a scan covers many later misses. Resizes written by other
+# processes since our last scan can overshoot the limit until the next one.
+
+# format -> (Pillow format, content type, file extension, save options)
+FORMATS = {
+    "avif": ("AVIF", "image/avif", "avif", {"quality": 55}),
+    "webp": ("WEBP", "image/webp", "webp", {"quality": 75, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", "jpg", {"quality": 80, "optimize": True, "progressive": True}),
+}
+EXTENSIONS = {extension: name for name, (_, _, extension, _) in FORMATS.items()}
+VARIANTS_DIR = "thumbnail"
+MAX_WIDTH = 4096
+CACHE_DIR = Path("cache") / "thumbnails"
+EVICT_TO = 0.8
+
+_estimated_size = {}
+_estimate_lock = threading.Lock()
+
+
+def supported_formats() -> list[str]:
+    """THUMBNAIL_FORMATS that this Pillow build can write, best compression first."""
+
+    return [name for name in getattr(settings, "THUMBNAIL_FORMATS", ("avif", "webp"))
+            if name in FORMATS and features.check(FORMATS[name][0].lower())]
+
+
+def variant_name(video_id: int, width: int, fmt: str) -> str:
+    """Path of a pregenerated variant relative to MEDIA_ROOT."""
+
+    return f"hls/{video_id}/{VARIANTS_DIR}/{width}.{FORMATS[fmt][2]}"
+
+
+def _resize(image: Image.Image, width: int) -> Image.Image:
+    height = max(1, round(image.height * width / image.width))
+    return image.convert("RGB").resize((width, height), Image.LANCZOS)
+
+
+def _save(image: Image.Image, path: Path, fmt: str):
+    """Write atomically, concurrent requests for the same size never see a partial file."""
+
+    pillow_format, _, _, options = FORMATS[fmt]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, pillow_format, **options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def generate_variants(thumb_path: Path) -> dict[str, list[int]]:
+    """
+    Write the THUMBNAIL_WIDTHS variants of a thumbnail in every supported
+    format to <hls dir>/thumbnail/<width>.<ext>. Widths above the frame are
+    skipped (never upscaled). Returns {format: [widths]}.
+    """
+    variants_dir = thumb_path.parent / VARIANTS_DIR
+    shutil.rmtree(variants_dir, ignore_errors=True)
+
+    with Image.open(thumb_path) as image:
+        widths = [w for w in sorted(getattr(settings, "THUMBNAIL_WIDTHS", (320, 640, 1280))) if w <= image.width]
+        variants = {}
+        for width in widths or [image.width]:
+            resized = _resize(image, width)
+            for fmt in supported_formats():
+                _save(resized, variants_dir / f"{width}.{FORMATS[fmt][2]}", fmt)
+                variants.setdefault(fmt, []).append(width)
+    return variants
+
+
+def available_variants(output_dir: Path) -> dict[str, list[int]]:
+    """Read the variants present in an HLS output directory, {format: [widths]}."""
+
+    variants = {}
+    variants_dir = output_dir / VARIANTS_DIR
+    if not variants_dir.is_dir():
+        return variants
+    for path in variants_dir.iterdir():
+        fmt = EXTENSIONS.get(path.suffix.lstrip("."))
+        if fmt and path.stem.isdigit():
+            variants.setdefault(fmt, []).append(int(path.stem))
+    return {fmt: sorted(widths) for fmt, widths in sorted(variants.items())}
+
+
+def negotiate_format(accept: str) -> str:
+    """Best format for an Accept header; JPEG is understood by every client."""
+
+    for fmt in supported_formats():
+        if FORMATS[fmt][1] in accept:
+            return fmt
+    return "jpeg"
+
+
+def _cache_root() -> Path:
+    return Path(settings.MEDIA_ROOT) / CACHE_DIR
+
+
+def _evict(added: int = 0):
+    """
+    Account for `added` new bytes; if the estimated cache size is over
+    THUMBNAIL_CACHE_MAX_BYTES, delete the least recently used resizes until
+    the cache is down to EVICT_TO of it.
+    """
+    limit = getattr(settings, "THUMBNAIL_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+    root = str(_cache_root())
+    with _estimate_lock:
+        if root in _estimated_size:
+            _estimated_size[root] += added
+            if _estimated_size[root] <= limit:
+                return
+
+    entries = []
+    for path in _cache_root().rglob("*"):
+        try:
+            if path.is_file():
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+        except FileNotFoundError:
+            continue
+    total = sum(size for _, size, _ in entries)
+    if total > limit:
+        for _, size, path in sorted(entries):
+            if total <= limit * EVICT_TO:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+    with _estimate_lock:
+        _estimated_size[root] = total
+
+
+def resized_thumbnail(video, width: int, fmt: str) -> Path | None:
+    """
+    Return a file with the video's thumbnail at `width` in `fmt`: the
+    pregenerated variant if there is one, else a cached resize. Widths are
+    rounded up to THUMBNAIL_RESIZE_STEP and capped at the frame width, which
+    bounds the number of distinct files per video. None without a thumbnail.
+    """
+    if not video.thumbnail_url:
+        return None
+    source = Path(settings.MEDIA_ROOT) / video.thumbnail_url.name
+    if not source.is_file():
+        return None
+
+    if width in (video.thumbnail_variants or {}).get(fmt, []):
+        variant = Path(settings.MEDIA_ROOT) / variant_name(video.pk, width, fmt)
+        if variant.is_file():
+            return variant
+
+    step = getattr(settings, "THUMBNAIL_RESIZE_STEP", 40)
+    width = -(-width // step) * step
+    # The source mtime is part of the name, a regenerated thumbnail never hits an old resize.
+    mtime = source.stat().st_mtime_ns
+    with Image.open(source) as image:
+        width = min(width, image.width)
+        path = _cache_root() / str(video.pk) / f"{width}_{mtime}.{FORMATS[fmt][2]}"
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+        _save(_resize(image, width), path, fmt)
+    _evict(path.stat().st_size)
+    return path
+
+
+def clear_cache(video_id: int):
+    """Drop the cached resizes of a deleted video."""
+
+    shutil.rmtree(_cache_root() / str(video_id), ignore_errors=True)
@@ -0,0 +1,167 @@
+import base64
+import binascii
+import hashlib
+import os
+from pathlib import Path
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from .models import UploadSession, Video
+
+try:
+    import fcntl
+except ImportError:  # not on POSIX, chunks rely on the offset check alone
+    fcntl = None
+
+CHECKSUM_ALGORITHMS = {
+    "sha256": hashlib.sha256,
+    "sha1": hashlib.sha1,
+    "md5": hashlib.md5,
+}
+
+
+class UploadError(Exception):
+    """A rejected upload request, carries the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_checksum(header: str | None) -> tuple[str, bytes] | None:
+    """Parse an `Upload-Checksum: <algorithm> <base64 digest>` header (tus checksum extension)."""
+
+    if not header:
+        return None
+    algorithm, _, encoded = header.strip().partition(" ")
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f"Unsupported checksum algorithm: {algorithm}", 400)
+    try:
+        return algorithm, base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise UploadError("Invalid checksum", 400)
+
+
+def _check_offset(session_id, user, offset: int, length: int) -> UploadSession:
+    """Lock the session row (inside a transaction) and validate a chunk against it."""
+
+    session = UploadSession.objects.select_for_update().get(pk=session_id, user=user)
+    if session.status != UploadSession.Status.OPEN:
+        raise UploadError("Upload is already finalized", 409)
+    if offset != session.offset:
+        raise UploadError(f"Offset mismatch, expected {session.offset}", 409)
+    if length > session.size - offset:
+        raise UploadError("Chunk exceeds the declared upload size", 413)
+    return session
+
+
+def _lock_part(part):
+    """Take an exclusive, non-blocking lock on the part file; 409 while another chunk is written."""
+
+    if fcntl is None:
+        return
+    try:
+        fcntl.flock(part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        raise UploadError("Another chunk of this upload is in progress", 409)
+
+
+def append_chunk(session_id, user, offset: int, stream, length: int,
+                 checksum: tuple[str, bytes] | None = None) -> UploadSession:
+    """
+    Append one chunk, read from `stream` in blocks, to the part file at
+    `offset` - no temp file, no copy. The session row is locked only to check
+    the offset and to advance it, not while the body streams in; a lock on
+    the part file keeps chunks of one upload from interleaving. With a
+    checksum the chunk is verified and rolled back on mismatch; without one a
+    chunk cut off by a dropped connection is kept and the upload resumes
+    after it.
+    """
+    block_size = getattr(settings, "UPLOAD_READ_BLOCK_SIZE", 1024 * 1024)
+
+    session = UploadSession.objects.get(pk=session_id, user=user)
+    # Checked before O_CREAT, a late chunk must not recreate the part file of a finalized upload.
+    if session.status != UploadSession.Status.OPEN:
+        raise UploadError("Upload is already finalized", 409)
+    path = session.part_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    hasher = CHECKSUM_ALGORITHMS[checksum[0]]() if checksum else None
+
+    written = 0
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    with os.fdopen(fd, "wb") as part:
+        _lock_part(part)
+        # Checked after taking the file lock, a chunk that just finished has advanced the offset.
+        with transaction.atomic():
+            _check_offset(session_id, user, offset, length)
+
+        # Drop bytes of an earlier chunk that were written but never acknowledged.
+        part.truncate(offset)
+        part.seek(offset)
+        while written < length:
+            data = stream.read(min(block_size, length - written))
+            if not data:
+                break
+            part.write(data)
+            if hasher:
+                hasher.update(data)
+            written += len(data)
+
+        if hasher and (written != length or hasher.digest() != checksum[1]):
+            part.truncate(offset)
+            raise UploadError("Checksum mismatch", 460)
+        part.flush()
+
+        with transaction.atomic():
+            session = _check_offset(session_id, user, offset, 0)
+            session.offset = offset + written
+            session.save(update_fields=["offset", "updated_at"])
+    return session
+
+
+def finalize_upload(session_id, user) -> Video:
+    """
+    Move a complete upload into MEDIA_ROOT/video/ (a rename on the same
+    filesystem) and create its Video, which enqueues the HLS pipeline. A
+    title that is already taken is refused (400) with the upload left open,
+    so it can be finalized again under another title.
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session_id, user=user)
+        if session.status != UploadSession.Status.OPEN:
+            raise UploadError("Upload is already finalized", 409)
+        if session.offset != session.size:
+            raise UploadError(f"Upload incomplete ({session.offset}/{session.size} bytes)", 409)
+        if Video.objects.filter(title=session.title).exists():
+            raise UploadError("A video with this title already exists", 400)
+
+        name = default_storage.get_available_name(f"video/{session.filename}")
+        target = Path(settings.MEDIA_ROOT) / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(session.part_path, target)
+        session.status = UploadSession.Status.COMPLETE
+        session.save(update_fields=["status", "updated_at"])
+
+    # Created after the commit, so the worker picking up the pipeline job sees the row.
+    try:
+        video = Video.objects.create(
+            title=session.title,
+            description=session.description,
+            category=session.category,
+            video_file=name,
+        )
+    except IntegrityError:
+        # The title was taken since the check above: reopen the upload.
+        os.replace(target, session.part_path)
+        UploadSession.objects.filter(pk=session.pk).update(status=UploadSession.Status.OPEN)
+        raise UploadError("A video with this title already exists", 400)
+    UploadSession.objects.filter(pk=session.pk).update(video=video)
+    return video
+
+
+def abort_upload(session_id, user):
+    """Delete an upload session and its partial file."""
+
+    session = UploadSession.objects.get(pk=session_id, user=user)
+    session.part_path.unlink(missing_ok=True)
+    session.delete()
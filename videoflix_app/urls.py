@@ -1,9 +1,27 @@
+from django.conf import settings
 from django.urls import path
-from .views import VideoListView, HLSIndexView, HLSChunkView
+from .views import (
+    VideoListView, BrowseView, VideoSearchView, HLSIndexView, HLSChunkView, AsyncHLSIndexView, AsyncHLSChunkView,
+    UploadCreateView, UploadDetailView, UploadFinalizeView, TranscodeMetricsView, SpritePreviewView,
+    ThumbnailView,
+)
+
+# Under an ASGI server (uvicorn) the async HLS views stream without tying up a worker per client.
+if getattr(settings, "HLS_ASYNC_VIEWS", False):
+    index_view, chunk_view = AsyncHLSIndexView, AsyncHLSChunkView
+else:
+    index_view, chunk_view = HLSIndexView, HLSChunkView
 
 urlpatterns = [
     path('', VideoListView.as_view(), name='video-list'),
-    path('<int:movie_id>/<str:resolution>/index.m3u8', HLSIndexView.as_view(), name='hls-index'),
-    path('<int:movie_id>/<str:resolution>/<str:segment>/', HLSChunkView.as_view(), name='hls-chunk'),
+    path('browse/', BrowseView.as_view(), name='video-browse'),
+    path('search/', VideoSearchView.as_view(), name='video-search'),
+    path('uploads/', UploadCreateView.as_view(), name='upload-create'),
+    path('uploads/<uuid:upload_id>/', UploadDetailView.as_view(), name='upload-detail'),
+    path('uploads/<uuid:upload_id>/finalize/', UploadFinalizeView.as_view(), name='upload-finalize'),
+    path('metrics/', TranscodeMetricsView.as_view(), name='transcode-metrics'),
+    path('<int:movie_id>/thumbnail/', ThumbnailView.as_view(), name='video-thumbnail'),
+    path('<int:movie_id>/sprites/<str:name>', SpritePreviewView.as_view(), name='video-sprites'),
+    path('<int:movie_id>/<str:resolution>/index.m3u8', index_view.as_view(), name='hls-index'),
+    path('<int:movie_id>/<str:resolution>/<str:segment>/', chunk_view.as_view(), name='hls-chunk'),
 ]
-
@@ -1,7 +1,14 @@
+import asyncio
+import mimetypes
 import os
+import re
+import stat
 from pathlib import Path
+from urllib.parse import quote
 from django.conf import settings
-from django.http import Http404
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
 
 
 def safe_media_path(*parts: str) -> Path:
@@ -27,4 +34,221 @@ def validate_segment_name(segment: str) -> str:
     return segment
 
 
+# Matches the types of the /protected-media/ location in nginx/nginx.conf.
+SEGMENT_CONTENT_TYPES = {
+    ".ts": "video/MP2T",
+    ".m4s": "video/mp4",
+    ".mp4": "video/mp4",
+}
+
+
+PREVIEW_CONTENT_TYPES = {
+    ".vtt": "text/vtt",
+    ".jpg": "image/jpeg",
+    ".webp": "image/webp",
+}
+
+
+def segment_content_type(segment: str) -> str:
+    """
+    Content type of an HLS media file: MPEG-TS segments, or fMP4 init
+    segments (init.mp4) and media segments/single-file media (.m4s).
+    """
+    content_type = SEGMENT_CONTENT_TYPES.get(Path(segment).suffix.lower())
+    if content_type is None:
+        raise Http404("Unsupported segment type")
+    return content_type
+
+
+def preview_content_type(name: str) -> str:
+    """Content type of a seek preview file: the WebVTT index or a sprite sheet."""
+
+    content_type = PREVIEW_CONTENT_TYPES.get(Path(name).suffix.lower())
+    if content_type is None:
+        raise Http404("Unsupported preview file")
+    return content_type
+
+
+def offload_enabled() -> bool:
+    """True if file transfers are handed to the front proxy (HLS_DELIVERY_BACKEND)."""
+
+    return getattr(settings, "HLS_DELIVERY_BACKEND", "django") in ("x-accel", "x-sendfile")
+
+
+class FileRange:
+    """
+    File-like view of `length` bytes of an open file, starting at its current
+    position. Exposes fileno() so WSGI servers with a sendfile-capable
+    wsgi.file_wrapper (gunicorn) send the range zero-copy; everything else
+    reads through read(), which never returns bytes past the range.
+    """
+
+    def __init__(self, file, length: int):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_byte_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range Range header into an inclusive (start, end).
+    Returns None if there is no usable header (the full file is sent) and
+    raises ValueError if the range cannot be satisfied.
+    """
+    match = _RANGE_RE.match((header or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or size == 0:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def _if_range_matches(request, etag: str, mtime: float) -> bool:
+    """A Range is only honored if If-Range (when given) still names this file version."""
+
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def _sync_file_body(path: Path, start: int, length: int, content_type: str, status: int) -> HttpResponse:
+    file = open(path, "rb")
+    if status == 206:
+        file.seek(start)
+        response = FileResponse(FileRange(file, length), status=status, content_type=content_type)
+        response["Content-Length"] = length
+        return response
+    return FileResponse(file, content_type=content_type)
+
+
+async def _read_chunks(path: Path, start: int, length: int):
+    """Read a byte range in chunks, every blocking call runs in a thread."""
+
+    chunk_size = getattr(settings, "HLS_ASYNC_CHUNK_SIZE", 64 * 1024)
+    file = await asyncio.to_thread(open, path, "rb")
+    try:
+        await asyncio.to_thread(file.seek, start)
+        remaining = length
+        while remaining > 0:
+            data = await asyncio.to_thread(file.read, min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def _async_file_body(path: Path, start: int, length: int, content_type: str, status: int) -> HttpResponse:
+    response = StreamingHttpResponse(_read_chunks(path, start, length), status=status, content_type=content_type)
+    response["Content-Length"] = length
+    return response
+
+
+def file_response(request, path: Path, content_type: str | None = None, async_stream: bool = False) -> HttpResponse:
+    """
+    Stream a file with ETag/Last-Modified from its stat, 304/412 handling for
+    conditional requests and 206 responses for single byte ranges.
+    With `async_stream` the body is an async iterator for ASGI servers.
+    """
+    make_body = _async_file_body if async_stream else _sync_file_body
+    try:
+        st = os.stat(path)
+    except OSError:
+        raise Http404("File not found")
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404("File not found")
+
+    etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+    last_modified = http_date(st.st_mtime)
+    content_type = content_type or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+
+    response = None
+    if request is not None:
+        response = get_conditional_response(request, etag=etag, last_modified=int(st.st_mtime))
+    if response is None:
+        byte_range = None
+        if request is not None and _if_range_matches(request, etag, st.st_mtime):
+            try:
+                byte_range = parse_byte_range(request.META.get("HTTP_RANGE"), st.st_size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{st.st_size}"
+                return response
+
+        if byte_range:
+            start, end = byte_range
+            response = make_body(path, start, end - start + 1, content_type, 206)
+            response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        else:
+            response = make_body(path, 0, st.st_size, content_type, 200)
+        response["Accept-Ranges"] = "bytes"
+
+    response["ETag"] = etag
+    response["Last-Modified"] = last_modified
+    return response
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Development MEDIA_URL view (see core.urls) with range and conditional
+    request support, so trailers can be seeked without full re-downloads.
+    """
+    return file_response(request, safe_media_path(path))
+
+
+def media_file_response(path: Path, content_type: str, request=None, async_stream: bool = False) -> HttpResponse:
+    """
+    Build the response for a validated file under MEDIA_ROOT.
+
+    - "django" (default): stream the file from this process (see file_response).
+    - "x-accel": empty response with X-Accel-Redirect to the internal nginx
+      location HLS_ACCEL_REDIRECT_PREFIX, nginx sends the bytes.
+    - "x-sendfile": empty response with X-Sendfile and the absolute path.
+    """
+    backend = getattr(settings, "HLS_DELIVERY_BACKEND", "django")
+
+    if backend == "x-accel":
+        relative = path.relative_to(Path(settings.MEDIA_ROOT).resolve()).as_posix()
+        prefix = getattr(settings, "HLS_ACCEL_REDIRECT_PREFIX", "/protected-media/").rstrip("/")
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = f"{prefix}/{quote(relative)}"
+        return response
+
+    if backend == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = str(path)
+        return response
+
+    return file_response(request, path, content_type, async_stream)
+
+
 
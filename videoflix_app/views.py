@@ -1,51 +1,406 @@
-from django.http import FileResponse, Http404
+import asyncio
+import hashlib
+import hmac
+from urllib.parse import urlencode
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.urls import reverse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
-from rest_framework.permissions import IsAuthenticated
-from user_auth_app.authentication import CookieJWTAuthentication
-from .models import Video
-from .serializers import VideoSerializer
-from .utils import safe_media_path, validate_segment_name
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from user_auth_app.authentication import CookieJWTAuthentication, MediaCookieJWTAuthentication
+from . import thumbnails
+from .metrics import render_metrics
+from .cache import catalog_generation, get_catalog_page, get_playlist, set_catalog_page
+from .models import UploadSession, Video
+from .pagination import KeysetPagination
+from .search import search_tokens, search_videos
+from .signing import SignedSegmentAuthentication, sign_playlist, signed_query, signing_enabled
+from .serializers import UploadSessionSerializer, VideoSerializer
+from .uploads import UploadError, abort_upload, append_chunk, finalize_upload, parse_checksum
+from .tasks import SPRITES_DIR
+from .utils import (media_file_response, offload_enabled, preview_content_type, safe_media_path,
+                    segment_content_type, validate_segment_name)
+
+
+def _cached_catalog_response(request, variant: str, build):
+    """
+    Serve catalog data from the Redis cache of the current catalog generation
+    with an ETag (304 on If-None-Match); `build()` computes it on a miss.
+    Without a generation (cache disabled or Redis down) nothing is cached.
+    """
+    generation = catalog_generation() if getattr(settings, "VIDEO_CATALOG_CACHE", True) else 0
+    if not generation:
+        return Response(build())
+
+    digest = hashlib.sha256(f"{generation}|{variant}|{request.build_absolute_uri()}".encode()).hexdigest()[:32]
+    etag = f'"{digest}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        key = f"videos:catalog:{digest}"
+        data = get_catalog_page(key)
+        if data is None:
+            data = build()
+            set_catalog_page(key, data)
+        response = Response(data)
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 class VideoListView(ListAPIView):
     """
     API endpoint that provides a list of all available videos.
+    With ?limit= / ?cursor= (or VIDEO_CATALOG_PAGINATE) it returns keyset
+    pages {"next", "results"}; ?category= narrows it to one category (the
+    drill-down of BrowseView). Responses are cached in Redis per catalog
+    generation and carry an ETag, an unchanged catalog is answered with 304.
     """
     authentication_classes = [CookieJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
-    queryset = Video.objects.all().order_by("-created_at")
+    queryset = Video.objects.all().order_by("-created_at", "-id")
     serializer_class = VideoSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        category = self.request.query_params.get("category")
+        return queryset.filter(category=category) if category is not None else queryset
+
+    def list(self, request, *args, **kwargs):
+        paginate = getattr(settings, "VIDEO_CATALOG_PAGINATE", False) or any(
+            param in request.query_params for param in ("cursor", "limit", "category")
+        )
+        return _cached_catalog_response(request, f"list:{paginate}",
+                                        lambda: self._catalog_data(request, paginate))
+
+    def _catalog_data(self, request, paginate: bool):
+        queryset = self.filter_queryset(self.get_queryset())
+        if not paginate:
+            return self.get_serializer(queryset, many=True).data
+        page = self.paginator.paginate_queryset(queryset, request)
+        return self.paginator.get_paginated_data(self.get_serializer(page, many=True).data)
+
+
+class BrowseView(APIView):
+    """
+    Homepage rows: the newest VIDEO_BROWSE_ROW_SIZE videos of every category,
+    fetched with one ROW_NUMBER() window query and cached like the catalog.
+    Each row links to its paginated drill-down (/api/video/?category=...).
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return _cached_catalog_response(request, "browse", lambda: self._rows(request))
+
+    def _rows(self, request):
+        row_size = getattr(settings, "VIDEO_BROWSE_ROW_SIZE", 10)
+        videos = (
+            Video.objects.annotate(row=Window(
+                RowNumber(),
+                partition_by=[F("category")],
+                order_by=[F("created_at").desc(), F("id").desc()],
+            ))
+            .filter(row__lte=row_size + 1)
+            .order_by("category", "row")
+        )
+
+        rows = {}
+        for video in videos:
+            rows.setdefault(video.category, []).append(video)
+
+        serializer_context = {"request": request}
+        return [
+            {
+                "category": category,
+                "videos": VideoSerializer(row[:row_size], many=True, context=serializer_context).data,
+                "next": self._drill_down_url(request, category, row[row_size - 1]) if len(row) > row_size else None,
+            }
+            for category, row in rows.items()
+        ]
+
+    def _drill_down_url(self, request, category: str, last: Video) -> str:
+        query = urlencode({"category": category, "cursor": KeysetPagination().encode_cursor(last)})
+        return f"{request.build_absolute_uri(reverse('video-list'))}?{query}"
+
+
+class VideoSearchView(APIView):
+    """
+    Full-text search over titles and descriptions: GET ?q=<words>[&limit=].
+    Results are ranked (title matches first), the last word matches as a
+    prefix for typeahead. Hot queries are served from the catalog cache.
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = " ".join(search_tokens(request.query_params.get("q", "")))
+        try:
+            limit = int(request.query_params.get("limit", 20))
+        except ValueError:
+            limit = 20
+        limit = max(1, min(limit, getattr(settings, "VIDEO_SEARCH_MAX_RESULTS", 50)))
+
+        def build():
+            videos = search_videos(query, limit)
+            return {"query": query, "results": VideoSerializer(videos, many=True, context={"request": request}).data}
+
+        return _cached_catalog_response(request, f"search:{query}:{limit}", build)
+
+
+class TranscodeMetricsView(View):
+    """
+    Prometheus metrics of the HLS pipeline (TranscodeJob records). Scrapers
+    authenticate with `Authorization: Bearer <METRICS_TOKEN>`; without a
+    configured token the endpoint is disabled.
+    """
+
+    def get(self, request):
+        token = getattr(settings, "METRICS_TOKEN", "")
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not token or not hmac.compare_digest(supplied.encode(), token.encode()):
+            raise Http404()
+        return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _upload_headers(session: UploadSession) -> dict:
+    return {"Upload-Offset": str(session.offset), "Upload-Length": str(session.size), "Cache-Control": "no-store"}
+
+
+class UploadCreateView(APIView):
+    """
+    Starts a resumable upload (staff only): POST filename, size, title,
+    description, category. The chunks are then sent to the returned location.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = UploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session = serializer.save(user=request.user)
+
+        location = request.build_absolute_uri(reverse("upload-detail", args=[session.id]))
+        return Response(serializer.data, status=201, headers={**_upload_headers(session), "Location": location})
+
+
+class UploadDetailView(APIView):
+    """
+    A resumable upload (tus-like):
+    - GET/HEAD: current offset (Upload-Offset header) to resume from.
+    - PATCH: raw chunk body at Upload-Offset, optionally verified by an
+      `Upload-Checksum: sha256 <base64>` header. The body is streamed straight
+      into the part file and never parsed or buffered.
+    - DELETE: abort and remove the partial file.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = []
+
+    def get(self, request, upload_id):
+        session = UploadSession.objects.filter(pk=upload_id, user=request.user).first()
+        if session is None:
+            raise Http404("Upload not found")
+        return Response(UploadSessionSerializer(session).data, headers=_upload_headers(session))
+
+    def patch(self, request, upload_id):
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except (KeyError, ValueError):
+            return Response({"detail": "Upload-Offset and Content-Length headers are required."}, status=400)
+
+        try:
+            checksum = parse_checksum(request.headers.get("Upload-Checksum"))
+            session = append_chunk(upload_id, request.user, offset, request.stream, length, checksum)
+        except UploadSession.DoesNotExist:
+            raise Http404("Upload not found")
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=e.status)
+        return Response(status=204, headers=_upload_headers(session))
+
+    def delete(self, request, upload_id):
+        try:
+            abort_upload(upload_id, request.user)
+        except UploadSession.DoesNotExist:
+            raise Http404("Upload not found")
+        return Response(status=204)
+
+
+class UploadFinalizeView(APIView):
+    """
+    Completes a fully transferred upload: the file becomes the source of a
+    new Video and the HLS pipeline is enqueued.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request, upload_id):
+        try:
+            video = finalize_upload(upload_id, request.user)
+        except UploadSession.DoesNotExist:
+            raise Http404("Upload not found")
+        except UploadError as e:
+            return Response({"detail": str(e)}, status=e.status)
+        return Response(VideoSerializer(video, context={"request": request}).data, status=201)
+
+
+def _playlist_response(request, user, movie_id, resolution):
+    """Build the playlist response of HLSIndexView / AsyncHLSIndexView."""
+
+    if offload_enabled() and not signing_enabled():
+        playlist_path = safe_media_path("hls", str(movie_id), resolution, "index.m3u8")
+        return media_file_response(playlist_path, 'application/vnd.apple.mpegurl', request)
+
+    body, etag = get_playlist(movie_id, resolution)
+    if signing_enabled():
+        body, etag = sign_playlist(body, etag, signed_query(user.pk, movie_id, resolution))
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/vnd.apple.mpegurl')
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=getattr(settings, "HLS_PLAYLIST_MAX_AGE", 60))
+    return response
 
 
 class HLSIndexView(APIView):
     """
     Serves the HLS playlist file (.m3u8) for a given video and resolution.
+    Playlists are served from the playlist cache with a strong ETag, so
+    players can revalidate with If-None-Match and get a 304. With an
+    offloading HLS_DELIVERY_BACKEND the front proxy sends the file instead.
+    With HLS_SIGNED_SEGMENTS every segment URI gets a short-lived signature
+    for the requesting user (see signing.py).
     """
+    authentication_classes = [MediaCookieJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, movie_id, resolution):
-        playlist_path = safe_media_path("hls", str(movie_id), resolution, "index.m3u8")
+        return _playlist_response(request, request.user, movie_id, resolution)
+
+
+class ThumbnailView(APIView):
+    """
+    Thumbnail of a video at any width: GET ?w=<px>[&fmt=avif|webp|jpeg]
+    (not ?format=, DRF uses that to pick a renderer). Without `fmt` the best
+    format the client Accepts is chosen. Pregenerated
+    sizes are served as they are, others are resized once and kept in the
+    disk-backed LRU cache (see thumbnails.resized_thumbnail).
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
 
-        if not playlist_path.exists():
-            raise Http404("Playlist not found")
+    def get(self, request, movie_id):
+        try:
+            width = int(request.query_params.get("w", 0))
+        except ValueError:
+            width = 0
+        if not 0 < width <= thumbnails.MAX_WIDTH:
+            return Response({"detail": "w must be a width in pixels."}, status=400)
 
-        return FileResponse(open(playlist_path, 'rb'), content_type='application/vnd.apple.mpegurl')
+        fmt = request.query_params.get("fmt")
+        if fmt is None:
+            fmt = thumbnails.negotiate_format(request.headers.get("Accept", ""))
+        elif fmt != "jpeg" and fmt not in thumbnails.supported_formats():
+            return Response({"detail": f"Unsupported format: {fmt}"}, status=400)
+
+        video = Video.objects.filter(pk=movie_id).first()
+        path = thumbnails.resized_thumbnail(video, width, fmt) if video else None
+        if path is None:
+            raise Http404("Thumbnail not found")
+        response = media_file_response(path, thumbnails.FORMATS[fmt][1], request)
+        if "fmt" not in request.query_params:
+            patch_vary_headers(response, ["Accept"])
+        patch_cache_control(response, private=True, max_age=86400)
+        return response
+
+
+class SpritePreviewView(APIView):
+    """
+    Serves the seek preview of a video: sprites/thumbnails.vtt and the sprite
+    sheets its cues point to (relative URLs, so they resolve to this view too).
+    """
+    authentication_classes = [MediaCookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, movie_id, name):
+        name = validate_segment_name(name)
+        path = safe_media_path("hls", str(movie_id), SPRITES_DIR, name)
+        return media_file_response(path, preview_content_type(name), request)
 
 
 class HLSChunkView(APIView):
     """
-    Serves individual HLS video segments (.ts files).
+    Serves individual HLS media files: .ts segments, or fMP4 init.mp4 and
+    .m4s segments (single-file renditions are read with byte ranges).
+    Authentication and path validation always happen here, the bytes are
+    sent according to HLS_DELIVERY_BACKEND (see utils.media_file_response),
+    with Range (206) and If-None-Match/If-Modified-Since (304) support.
+    Signed segment URLs are checked by HMAC alone, without the JWT stack.
     """
+    authentication_classes = [SignedSegmentAuthentication, MediaCookieJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, movie_id, resolution, segment):
         segment = validate_segment_name(segment)
         segment_path = safe_media_path('hls', str(movie_id), resolution, segment)
 
-        if not segment_path.exists():
-            raise Http404("Segment not found")
+        return media_file_response(segment_path, segment_content_type(segment), request)
+
+
+
+async def _aauthenticate_media(request, kwargs, allow_signed=False):
+    """
+    Authenticate an async HLS request like the sync views do: a signed
+    segment URL (if allowed) or the access token cookie.
+    Returns the user or a 403 response.
+    """
+    try:
+        result = None
+        if allow_signed:
+            result = SignedSegmentAuthentication().authenticate_signature(request.GET, kwargs)
+        if result is None:
+            result = await MediaCookieJWTAuthentication().aauthenticate(request)
+    except AuthenticationFailed as e:
+        return JsonResponse({"detail": str(e.detail)}, status=403)
+    if result is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+    return result[0]
+
+
+class AsyncHLSIndexView(View):
+    """
+    Async (ASGI) variant of HLSIndexView. The playlist lookup runs in a
+    thread, the event loop keeps serving other clients meanwhile.
+    """
+
+    async def get(self, request, movie_id, resolution):
+        user = await _aauthenticate_media(request, self.kwargs)
+        if isinstance(user, HttpResponse):
+            return user
+        return await asyncio.to_thread(_playlist_response, request, user, movie_id, resolution)
 
-        return FileResponse(open(segment_path, 'rb'), content_type='video/MP2T')
 
+class AsyncHLSChunkView(View):
+    """
+    Async (ASGI) variant of HLSChunkView. Segments are streamed as an async
+    iterator with thread-offloaded chunked reads, so a slow client only
+    holds a coroutine instead of a whole worker. Path resolution and the
+    stat of the segment run in a thread too, they touch the filesystem.
+    """
+
+    async def get(self, request, movie_id, resolution, segment):
+        user = await _aauthenticate_media(request, self.kwargs, allow_signed=True)
+        if isinstance(user, HttpResponse):
+            return user
+
+        segment = validate_segment_name(segment)
+        segment_path = await asyncio.to_thread(safe_media_path, 'hls', str(movie_id), resolution, segment)
+        return await asyncio.to_thread(media_file_response, segment_path, segment_content_type(segment), request,
+                                       async_stream=True)